@@ -2,23 +2,33 @@
 Flask Email Automation Dashboard
 Main application entry point - integrates existing email automation with modern web UI
 """
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 import os
 from werkzeug.utils import secure_filename
-import pandas as pd
-import requests
-from io import StringIO
 
 # Import our custom modules
 from config_handler import load_config, save_config
+from event_stream import progress_stream
+from upload_receiver import save_upload, UploadRejected
+from campaign_scheduler import parse_send_at
+from log_export import FORMATS, LOG_FIELDS, export_stream, export_filename
 from utils import (
     send_bulk_emails_async, 
     stop_sending, 
     get_sending_status, 
     get_email_logs, 
+    get_log_summary,
+    export_email_logs,
+    get_outcome_report,
     clear_email_logs,
-    validate_excel_columns,
-    get_file_email_count
+    process_upload_async,
+    import_google_sheet_async,
+    get_import_task,
+    resume_interrupted_jobs,
+    get_job_status,
+    get_job_metrics,
+    get_metrics_text,
+    list_jobs
 )
 
 app = Flask(__name__)
@@ -45,6 +55,9 @@ def get_config():
     # Don't send password to frontend for security
     safe_config = {k: v for k, v in config.items() if k != 'sender_password'}
     safe_config['has_password'] = bool(config.get('sender_password'))
+    if config.get('relays'):
+        safe_config['relays'] = [{k: v for k, v in relay.items() if k != 'sender_password'}
+                                 for relay in config['relays']]
     return jsonify(safe_config)
 
 @app.route('/api/config', methods=['POST'])
@@ -98,30 +111,23 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            # Validate columns
-            is_valid, missing, preview = validate_excel_columns(filepath)
-            
-            if not is_valid:
+            # Hash and check the format while writing; parsing runs in the background
+            try:
+                filepath, digest = save_upload(file.stream, app.config['UPLOAD_FOLDER'], filename)
+            except UploadRejected as e:
                 return jsonify({
                     'success': False,
-                    'message': f'Missing required columns: {", ".join(missing)}',
-                    'missing_columns': missing
+                    'message': str(e)
                 }), 400
             
-            # Get total email count
-            total_count = get_file_email_count(filepath)
-            
+            task = process_upload_async(filepath, digest)
             return jsonify({
                 'success': True,
-                'message': 'File uploaded successfully',
+                'message': 'File uploaded, processing',
+                'upload_id': task.id,
                 'filename': filename,
-                'filepath': filepath,
-                'preview': preview,
-                'total_emails': total_count
-            })
+                'status': task.status
+            }), 202
         else:
             return jsonify({
                 'success': False,
@@ -134,6 +140,17 @@ def upload_file():
             'message': f'Error uploading file: {str(e)}'
         }), 500
 
+@app.route('/api/upload/<upload_id>')
+def upload_status(upload_id):
+    """Get the state of an upload (status, and the preview/validation once parsed)"""
+    task = get_import_task(upload_id, kind='upload')
+    if task is None:
+        return jsonify({
+            'success': False,
+            'message': 'Unknown upload'
+        }), 404
+    return jsonify(dict(task, success=True))
+
 @app.route('/api/google-sheet', methods=['POST'])
 def load_google_sheet():
     """Load data from Google Sheets public link"""
@@ -147,44 +164,14 @@ def load_google_sheet():
                 'message': 'No Google Sheet URL provided'
             }), 400
         
-        # Convert Google Sheets URL to CSV export URL
-        if '/edit' in sheet_url:
-            sheet_url = sheet_url.split('/edit')[0]
-        
-        csv_url = f"{sheet_url}/export?format=csv"
-        
-        # Download the sheet
-        response = requests.get(csv_url)
-        response.raise_for_status()
-        
-        # Save as CSV file
-        filename = f"google_sheet_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        
-        # Validate columns
-        is_valid, missing, preview = validate_excel_columns(filepath)
-        
-        if not is_valid:
-            return jsonify({
-                'success': False,
-                'message': f'Missing required columns: {", ".join(missing)}',
-                'missing_columns': missing
-            }), 400
-        
-        # Get total email count
-        total_count = get_file_email_count(filepath)
-        
+        # Download and validate in the background; the client polls the task
+        task = import_google_sheet_async(sheet_url, app.config['UPLOAD_FOLDER'])
         return jsonify({
             'success': True,
-            'message': 'Google Sheet loaded successfully',
-            'filename': filename,
-            'filepath': filepath,
-            'preview': preview,
-            'total_emails': total_count
-        })
+            'message': 'Google Sheet import started',
+            'task_id': task.id,
+            'status': task.status
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -192,6 +179,17 @@ def load_google_sheet():
             'message': f'Error loading Google Sheet: {str(e)}'
         }), 500
 
+@app.route('/api/google-sheet/<task_id>')
+def google_sheet_task(task_id):
+    """Get the state of a Google Sheet import (status, and the upload result once done)"""
+    task = get_import_task(task_id, kind='google_sheet')
+    if task is None:
+        return jsonify({
+            'success': False,
+            'message': 'Unknown import task'
+        }), 404
+    return jsonify(dict(task, success=True))
+
 @app.route('/api/send', methods=['POST'])
 def send_emails():
     """Start sending emails"""
@@ -199,6 +197,8 @@ def send_emails():
         data = request.json
         filepath = data.get('filepath', '')
         sender_name = data.get('sender_name', '')
+        # By default an unfinished job for the same file resumes from its checkpoint
+        restart = bool(data.get('restart', False))
         
         if not filepath or not os.path.exists(filepath):
             return jsonify({
@@ -206,20 +206,29 @@ def send_emails():
                 'message': 'No valid file to send emails from'
             }), 400
         
-        # Check if already sending
-        status = get_sending_status()
-        if status['is_sending']:
+        # Optional start time: "2026-10-19 09:00" (read in 'timezone', default server time) or "09:00"
+        try:
+            send_at = parse_send_at(data.get('send_at'), data.get('timezone', ''))
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'message': 'Email sending already in progress'
+                'message': str(e)
             }), 400
         
-        # Start sending in background
-        send_bulk_emails_async(filepath, sender_name)
+        # Start sending on the shared send workers, alongside any other running jobs
+        try:
+            job_id = send_bulk_emails_async(filepath, sender_name, resume=not restart, send_at=send_at)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
         return jsonify({
             'success': True,
-            'message': 'Email sending started'
+            'message': 'Email sending scheduled' if send_at else 'Email sending started',
+            'job_id': job_id,
+            'send_at': send_at
         })
         
     except Exception as e:
@@ -230,7 +239,7 @@ def send_emails():
 
 @app.route('/api/stop', methods=['POST'])
 def stop_emails():
-    """Stop sending emails"""
+    """Stop every running send job"""
     try:
         stop_sending()
         return jsonify({
@@ -247,27 +256,187 @@ def stop_emails():
 def get_status():
     """Get current sending status"""
     status = get_sending_status()
-    logs = get_email_logs()
+    logs = get_log_summary(5)
     
     return jsonify({
         'is_sending': status['is_sending'],
         'should_stop': status['should_stop'],
         'total_emails': status['total_emails'],
+        'job_id': status['job_id'],
+        'active_jobs': status['active_jobs'],
         'sent_count': status['sent_count'],
         'failed_count': status['failed_count'],
-        'total_logs': len(logs),
-        'recent_logs': logs[-5:] if logs else []  # Last 5 logs
+        'retry_pending': status['retry_pending'],
+        'transport': status['transport'],
+        'attachment_cache': status['attachment_cache'],
+        'total_logs': logs['total_logs'],
+        'recent_logs': logs['recent_logs']  # Last 5 logs
     })
 
-@app.route('/api/logs', methods=['GET'])
-def get_logs():
-    """Get all email logs"""
-    logs = get_email_logs()
+@app.route('/api/stream', methods=['GET'])
+def stream_progress():
+    """
+    Server-Sent Events stream of send progress
+    Pushes changed status fields and new logs, coalesced to a few updates per second
+    Query params: job_id (follow one job), since (last log id the client has)
+    """
+    job_id = request.args.get('job_id') or None
+    since = request.args.get('since', type=int)
+    
+    def current_status():
+        if job_id:
+            return get_job_status(job_id) or {}
+        status = get_sending_status()
+        status['total_logs'] = get_log_summary(0)['total_logs']
+        return status
+    
+    def logs_since(cursor, limit):
+        return get_email_logs(since=cursor, limit=limit)
+    
+    return Response(
+        progress_stream(current_status, logs_since, since=since),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """List all send jobs"""
     return jsonify({
         'success': True,
-        'logs': logs
+        'jobs': list_jobs()
     })
 
+@app.route('/api/jobs/<job_id>/status', methods=['GET'])
+def get_job(job_id):
+    """Get the status of one send job"""
+    status = get_job_status(job_id)
+    if status is None:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/metrics', methods=['GET'])
+def get_job_metrics_summary(job_id):
+    """Messages/sec and per-phase p50/p95/p99 latency for one send job"""
+    summary = get_job_metrics(job_id)
+    if summary is None:
+        return jsonify({
+            'success': False,
+            'message': 'No metrics recorded for this job'
+        }), 404
+    return jsonify(summary)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Send-path histograms and counters in the Prometheus text format"""
+    return Response(get_metrics_text(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/jobs/<job_id>/stop', methods=['POST'])
+def stop_job(job_id):
+    """Stop one send job"""
+    if not stop_sending(job_id):
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    return jsonify({
+        'success': True,
+        'message': 'Email sending stopped'
+    })
+
+@app.route('/api/logs', methods=['GET'])
+def get_logs():
+    """
+    Get a page of email logs
+    Query params: since/before (log id cursors), status, to, limit
+    """
+    try:
+        since = request.args.get('since', type=int)
+        before = request.args.get('before', type=int)
+        limit = request.args.get('limit', default=100, type=int)
+        logs = get_email_logs(
+            since=since,
+            before=before,
+            status=request.args.get('status') or None,
+            to=request.args.get('to') or None,
+            limit=limit
+        )
+        return jsonify({
+            'success': True,
+            'logs': logs,
+            # Pass next_cursor back as ?since= to follow new logs,
+            # or prev_cursor as ?before= to page back through older ones
+            'next_cursor': logs[-1]['id'] if logs else since,
+            'prev_cursor': logs[0]['id'] if logs else before,
+            'has_more': len(logs) >= max(1, min(limit, 1000))
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error reading logs: {str(e)}'
+        }), 400
+
+def export_response(records, fields, name):
+    """
+    Stream records as a file download, in the format the query asks for:
+    format=csv (default) or ndjson, gzip=1 to compress on the fly
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        chunks = export_stream(records, fields, export_format, compress)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    return Response(
+        chunks,
+        mimetype='application/gzip' if compress else FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{export_filename(name, export_format, compress)}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/logs/export', methods=['GET'])
+def export_logs():
+    """
+    Download every email log, streamed at constant memory
+    Query params: format (csv or ndjson), gzip, status, to
+    """
+    logs = export_email_logs(status=request.args.get('status') or None,
+                             to=request.args.get('to') or None)
+    return export_response(logs, LOG_FIELDS, 'email_logs')
+
+@app.route('/api/jobs/<job_id>/report', methods=['GET'])
+def job_report(job_id):
+    """
+    Download one job's upload file with each row's outcome (Sent, Failed,
+    Pending or Skipped) added, streamed at constant memory
+    Query params: format (csv or ndjson), gzip
+    """
+    try:
+        report = get_outcome_report(job_id)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
+    if report is None:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    fields, records = report
+    return export_response(records, fields, f'job_{job_id}_report')
+
 @app.route('/api/logs/clear', methods=['POST'])
 def clear_logs():
     """Clear all email logs"""
@@ -281,10 +450,16 @@ if __name__ == '__main__':
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Pick up jobs cut off by a crash or restart (only in the reloader's child process)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        for resumed_job in resume_interrupted_jobs():
+            print(f"♻️  Resuming interrupted send job {resumed_job}")
+    
     print("=" * 60)
     print("🚀 Email Automation Dashboard Started")
     print("=" * 60)
     print("📧 Access the dashboard at: http://127.0.0.1:5000")
     print("=" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Threaded so open progress streams don't block other requests
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,126 @@
+"""
+Attachment Cache Module
+Keeps attachments read, MIME-typed and base64-encoded in memory, so a
+brochure attached to thousands of rows is only encoded once per send run
+"""
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from email import policy
+from email.message import EmailMessage
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def build_attachment_part(attachment_path):
+    """Read a file and build its encoded attachment part, same as EmailMessage.add_attachment"""
+    mime_type, _ = mimetypes.guess_type(attachment_path)
+    main_type, sub_type = (mime_type.split('/', 1)
+                           if mime_type else ('application', 'octet-stream'))
+    with open(attachment_path, 'rb') as f:
+        data = f.read()
+    part = EmailMessage(policy=policy.default)
+    part.set_content(data,
+                     maintype=main_type,
+                     subtype=sub_type,
+                     filename=os.path.basename(attachment_path))
+    if 'content-disposition' not in part:
+        part['Content-Disposition'] = 'attachment'
+    return part
+
+
+class AttachmentCache:
+    """
+    LRU cache of pre-encoded attachment parts
+    Keyed by (path, mtime, size) so an edited file is re-read automatically
+    Bounded by the total size of the encoded payloads
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._parts = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_part(self, attachment_path):
+        """Get the encoded attachment part for a path, raises OSError if it can't be read"""
+        return self.get_entry(attachment_path)[1]
+
+    def get_entry(self, attachment_path):
+        """
+        Get (key, part) for a path, key being the (path, mtime, size) the part is
+        cached under, or None when the part is too big to be cached
+        """
+        stat = os.stat(attachment_path)
+        key = (os.path.abspath(attachment_path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._parts.get(key)
+            if entry is not None:
+                self._parts.move_to_end(key)
+                self.hits += 1
+                return key, entry[0]
+            self.misses += 1
+
+        part = build_attachment_part(attachment_path)
+        size = len(part.get_payload())
+        if size > self.max_bytes:
+            # Too big to cache, still usable for this message
+            return None, part
+
+        with self._lock:
+            if key not in self._parts:
+                self._parts[key] = (part, size)
+                self.current_bytes += size
+                while self.current_bytes > self.max_bytes and self._parts:
+                    _, (_, evicted_size) = self._parts.popitem(last=False)
+                    self.current_bytes -= evicted_size
+                    self.evictions += 1
+        return key, part
+
+    def clear(self):
+        """Drop every cached part"""
+        with self._lock:
+            self._parts.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Get cache hit-rate counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._parts),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+# Shared cache used by send_single_email
+attachment_cache = AttachmentCache()
+
+
+def get_attachment_part(attachment_path, max_bytes=None):
+    """Get a cached encoded attachment part, resizing the cache if the limit changed"""
+    if max_bytes is not None and max_bytes != attachment_cache.max_bytes:
+        attachment_cache.max_bytes = max_bytes
+    return attachment_cache.get_part(attachment_path)
+
+
+def get_attachment(attachment_path, max_bytes=None):
+    """Like get_attachment_part, returns (cache key or None if too big to cache, part)"""
+    if max_bytes is not None and max_bytes != attachment_cache.max_bytes:
+        attachment_cache.max_bytes = max_bytes
+    return attachment_cache.get_entry(attachment_path)
+
+
+def get_attachment_cache_stats():
+    """Get attachment cache counters"""
+    return attachment_cache.stats()
@@ -0,0 +1,78 @@
+"""
+Recipient Batching Benchmark
+Counts the SMTP transactions a sample list needs with one transaction per
+row versus batch mode (identical messages grouped into multi-RCPT
+transactions), with and without grouping by recipient domain
+
+Usage: python benchmarks/bench_batching.py [--rows 10000] [--messages 3] [--domains 20] [--max-recipients 50]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipient_batcher import batch_rows  # noqa: E402
+
+BODY = "Hello,\n\nOur spring newsletter is out. Read it online at https://example.com/news\n\nRegards,\nThe Team\n"
+
+
+def make_rows(count, messages, domains, cc_share, seed=1):
+    """Synthetic non-personalized campaign: a few message variants, recipients spread over domains"""
+    rng = random.Random(seed)
+    domain_names = [f"mail{i}.example.com" for i in range(domains)]
+    for i in range(count):
+        variant = rng.randrange(messages)
+        yield i, {
+            "To": f"user{i}@{rng.choice(domain_names)}",
+            "CC": "manager@example.com" if rng.random() < cc_share else "",
+            "BCC": "",
+            "Subject": f"Newsletter edition {variant}",
+            "Body": BODY,
+            "Attachment": ""
+        }
+
+
+def count_transactions(units):
+    """(transactions, recipients, largest batch) for a stream of delivery units"""
+    transactions = recipients = largest = 0
+    for row_index, _ in units:
+        size = len(row_index) if isinstance(row_index, tuple) else 1
+        transactions += 1
+        recipients += size
+        largest = max(largest, size)
+    return transactions, recipients, largest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=3, help="distinct message variants")
+    parser.add_argument("--domains", type=int, default=20, help="distinct recipient domains")
+    parser.add_argument("--cc-share", type=float, default=0.05, help="share of rows with a CC (never batched)")
+    parser.add_argument("--max-recipients", type=int, default=50)
+    parser.add_argument("--window", type=int, default=1000)
+    args = parser.parse_args()
+
+    def rows():
+        return make_rows(args.rows, args.messages, args.domains, args.cc_share)
+
+    print(f"{args.rows} rows, {args.messages} message variants, {args.domains} domains, "
+          f"{args.cc_share:.0%} with CC, up to {args.max_recipients} RCPT per transaction\n")
+    print(f"{'mode':<28} {'transactions':>12} {'RCPT/txn':>9} {'largest':>8} {'reduction':>10}")
+
+    baseline, _, _ = count_transactions(rows())
+    runs = [
+        ("one transaction per row", rows()),
+        ("batch (by message)", batch_rows(rows(), args.max_recipients, args.window)),
+        ("batch (by message + domain)", batch_rows(rows(), args.max_recipients, args.window, by_domain=True)),
+    ]
+    for label, units in runs:
+        transactions, recipients, largest = count_transactions(units)
+        print(f"{label:<28} {transactions:>12} {recipients / transactions:>9.1f} {largest:>8} "
+              f"{baseline / transactions:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Startup Benchmark
+Measures cold start of the processes that should come up fast, each in a
+fresh interpreter with an empty working directory:
+- dashboard: import app and answer a first /api/status request
+- worker: import send_worker and set up a queue worker (python main.py worker)
+- parser: load what parsing an upload needs (pandas, pyarrow, the readers),
+  which the two above should no longer pay for
+
+Reports the median and best wall time of each (interpreter start included)
+and which heavy libraries ended up loaded. --importtime lists the slowest
+imports of each target (python -X importtime, cumulative)
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--importtime 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "openpyxl", "python_calamine", "requests"]
+
+TARGETS = {
+    "dashboard": (
+        "import app\n"
+        "app.app.test_client().get('/api/status')\n"
+    ),
+    "worker": (
+        "import send_worker\n"
+        "send_worker.Worker(threads=1)\n"
+    ),
+    "parser": (
+        "import upload_cache, preflight, recipient_reader\n"
+        "upload_cache._arrow()\n"
+    ),
+}
+
+REPORT = (
+    "\nimport json, sys\n"
+    "print(json.dumps([name for name in {heavy!r} if name in sys.modules]))\n"
+)
+
+
+def run_target(code, workdir, importtime=False):
+    """Run one cold start, returns (wall seconds, heavy modules loaded, stderr)"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1")
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """Top `count` (cumulative microseconds, module) from -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per target")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="show the N slowest imports")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma-separated subset of targets")
+    args = parser.parse_args()
+
+    print(f"{args.runs} cold starts per target, Python {sys.version.split()[0]}\n")
+    print(f"{'target':<10} {'median':>9} {'best':>9}  heavy modules loaded")
+    for name in args.targets.split(","):
+        code = TARGETS[name] + REPORT.format(heavy=HEAVY_MODULES)
+        times = []
+        with tempfile.TemporaryDirectory(prefix=f"startup-{name}-") as workdir:
+            # The first run only warms the OS file cache
+            run_target(code, workdir)
+            for _ in range(args.runs):
+                elapsed, heavy, _ = run_target(code, workdir)
+                times.append(elapsed)
+            print(f"{name:<10} {statistics.median(times) * 1000:>7.0f}ms {min(times) * 1000:>7.0f}ms  "
+                  f"{', '.join(heavy) or '-'}")
+            if args.importtime:
+                _, _, stderr = run_target(code, workdir, importtime=True)
+                for cumulative, module in slowest_imports(stderr, args.importtime):
+                    print(f"{'':<10} {cumulative / 1000:>7.1f}ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
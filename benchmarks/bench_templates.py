@@ -0,0 +1,104 @@
+"""
+Template Rendering Benchmark
+Compares messages/sec of the per-row EmailMessage construction used by
+send_single_email against template mode's pre-built message splicing
+
+Usage: python benchmarks/bench_templates.py [--rows 2000] [--attachment-kb 100]
+"""
+import argparse
+import io
+import mimetypes
+import os
+import sys
+import tempfile
+import time
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attachment_cache import AttachmentCache  # noqa: E402
+from message_template import get_message_template, envelope_recipients  # noqa: E402
+
+SENDER = "Campaign Team <team@example.com>"
+SUBJECT = "Hello {Name}, your {Plan} plan is ready"
+BODY = "Dear {Name},\n\nThanks for choosing the {Plan} plan.\nYour account id is {Account}.\n\nRegards,\nThe Team\n"
+
+
+def make_rows(count):
+    """Synthetic personalized rows"""
+    return [{
+        "To": f"user{i}@example.com",
+        "Name": f"User {i}",
+        "Plan": "Premium" if i % 3 else "Basic",
+        "Account": f"AC-{i:08d}"
+    } for i in range(count)]
+
+
+def serialize(msg):
+    """Flatten the way smtplib.send_message does"""
+    with io.BytesIO() as buffer:
+        BytesGenerator(buffer).flatten(msg, linesep="\r\n")
+        return buffer.getvalue()
+
+
+def build_per_row(row, attachment_path):
+    """Baseline: the EmailMessage construction from send_single_email"""
+    msg = EmailMessage()
+    msg["From"] = SENDER
+    msg["To"] = row["To"]
+    msg["Subject"] = SUBJECT.format(**row)
+    msg.set_content(BODY.format(**row))
+    if attachment_path:
+        mime_type, _ = mimetypes.guess_type(attachment_path)
+        main_type, sub_type = mime_type.split('/', 1)
+        with open(attachment_path, 'rb') as f:
+            msg.add_attachment(f.read(), maintype=main_type, subtype=sub_type,
+                               filename=os.path.basename(attachment_path))
+    return serialize(msg)
+
+
+def build_templated(row, attachment):
+    """Template mode: compiled template plus per-recipient splicing"""
+    attachment_key, attachment_part = attachment
+    template = get_message_template(SENDER, SUBJECT, BODY, attachment_part, attachment_key)
+    envelope_recipients(row["To"])
+    return template.render(row, row["To"])
+
+
+def measure(label, rows, build):
+    """Run build over every row and report messages/sec"""
+    start = time.perf_counter()
+    total_bytes = 0
+    for row in rows:
+        total_bytes += len(build(row))
+    elapsed = time.perf_counter() - start
+    rate = len(rows) / elapsed
+    print(f"{label:<42} {rate:>10.0f} msg/s  ({total_bytes / len(rows) / 1024:.1f} KB/msg)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--attachment-kb", type=int, default=100)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        attachment_path = os.path.join(tmp, "brochure.pdf")
+        with open(attachment_path, "wb") as f:
+            f.write(os.urandom(args.attachment_kb * 1024))
+        attachment = AttachmentCache().get_entry(attachment_path)
+
+        print(f"{args.rows} rows, {args.attachment_kb} KB attachment")
+        base = measure("per-row EmailMessage (no attachment)", rows, lambda r: build_per_row(r, None))
+        fast = measure("template mode (no attachment)", rows, lambda r: build_templated(r, (None, None)))
+        print(f"{'speedup':<42} {fast / base:>10.1f}x")
+        base = measure("per-row EmailMessage (with attachment)", rows, lambda r: build_per_row(r, attachment_path))
+        fast = measure("template mode (with attachment)", rows, lambda r: build_templated(r, attachment))
+        print(f"{'speedup':<42} {fast / base:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
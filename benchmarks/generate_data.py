@@ -0,0 +1,96 @@
+"""
+Synthetic Recipient Files
+Writes recipient lists in the dashboard's upload format (To, CC, BCC,
+Subject, Body, Attachment plus a couple of personalization columns) as
+CSV and xlsx, with a small share of blank, invalid and duplicate rows so
+the upload validation has real work to do
+
+Usage: python benchmarks/generate_data.py [--sizes 1k,100k,1m] [--formats csv,xlsx] [--out benchmarks/data]
+"""
+import argparse
+import csv
+import os
+import random
+
+from openpyxl import Workbook
+
+COLUMNS = ["To", "CC", "BCC", "Subject", "Body", "Attachment", "Name", "Plan"]
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+BODY = "Dear {Name},\n\nYour {Plan} plan renews next month.\n\nRegards,\nThe Team"
+
+
+def parse_size(label):
+    """'100k' -> 100000, plain numbers are taken as is"""
+    label = label.strip().lower()
+    return SIZES[label] if label in SIZES else int(label)
+
+
+def iter_rows(count, seed=1):
+    """Synthetic rows: ~1% blank To, ~1% invalid To, ~2% duplicates, ~5% with CC"""
+    rng = random.Random(seed)
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.01:
+            to = ""
+        elif roll < 0.02:
+            to = f"user{i}.example.com"
+        elif roll < 0.04 and i:
+            to = f"user{rng.randrange(i)}@example.com"
+        else:
+            to = f"user{i}@example.com"
+        yield [
+            to,
+            "manager@example.com" if rng.random() < 0.05 else "",
+            "",
+            "Your plan renewal",
+            BODY,
+            "",
+            f"User {i}",
+            rng.choice(("Basic", "Premium", "Business"))
+        ]
+
+
+def write_csv(path, count):
+    """Write `count` rows as CSV"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(iter_rows(count))
+
+
+def write_xlsx(path, count):
+    """Write `count` rows as xlsx; write_only mode streams rows instead of building the sheet in memory"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for row in iter_rows(count):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def generate(size_label, file_format, out_dir):
+    """Write one file unless it already exists, returns its path"""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"recipients_{size_label}.{file_format}")
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        (write_csv if file_format == "csv" else write_xlsx)(tmp_path, parse_size(size_label))
+        os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,100k,1m")
+    parser.add_argument("--formats", default="csv,xlsx")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args()
+
+    for size_label in args.sizes.split(","):
+        for file_format in args.formats.split(","):
+            path = generate(size_label.strip().lower(), file_format.strip(), args.out)
+            print(f"{path}  ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
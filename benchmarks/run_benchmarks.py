@@ -0,0 +1,293 @@
+"""
+Benchmark Suite
+Measures the send path, upload validation and the status/logs endpoints
+against synthetic recipient files and a local SMTP sink, and saves the
+results as JSON so runs from different commits can be compared
+
+Every scenario runs in its own child process with a fresh working
+directory (empty cache, its own config.json), so CPU time and peak RSS
+belong to that scenario alone. The SMTP sink runs in this parent process
+so its work is not counted against the send path.
+
+Scenarios:
+- validation: first upload of a file (parse, preflight, columnar snapshot)
+- send: send_bulk_emails over the sink (needs aiosmtpd)
+- endpoints: /api/status and /api/logs with a large log store
+
+Usage:
+  python benchmarks/run_benchmarks.py [--sizes 1k,100k] [--formats csv,xlsx] [--send-sizes 1k]
+                                      [--workers 8] [--latency 0.0] [--tls] [--fail-4xx 0.0] [--fail-5xx 0.0]
+                                      [--compare benchmarks/results/<previous>.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: CPU time and peak RSS are reported as null
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import generate, parse_size  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+
+# ---------------------------------------------------------------- child side
+
+def usage():
+    """(cpu seconds, peak RSS in MB) of this process so far"""
+    if resource is None:
+        return None, None
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss_mb = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return rusage.ru_utime + rusage.ru_stime, round(rss_mb, 1)
+
+
+def measured(run):
+    """Run run() and add wall time, CPU time and peak RSS to the dict it returns"""
+    cpu_before, _ = usage()
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    cpu_after, peak_rss = usage()
+    result["seconds"] = round(elapsed, 3)
+    result["cpu_seconds"] = round(cpu_after - cpu_before, 3) if cpu_before is not None else None
+    result["cpu_percent"] = round(100 * (cpu_after - cpu_before) / elapsed, 1) if cpu_before is not None else None
+    result["peak_rss_mb"] = peak_rss
+    return result
+
+
+def child_validation(args):
+    """First upload of a file: parse, preflight validation and snapshot"""
+    from upload_cache import get_manifest
+
+    def run():
+        manifest = get_manifest(args.file)
+        return {"rows": manifest["total_rows"], "valid_rows": manifest["valid_rows"]}
+
+    result = measured(run)
+    result["rows_per_second"] = round(result["rows"] / result["seconds"], 1)
+    return result
+
+
+def child_send(args):
+    """One full send job against the sink"""
+    from upload_cache import get_manifest
+    import utils
+
+    # Parse outside the measurement, the validation scenario covers it
+    get_manifest(args.file)
+
+    def run():
+        job = utils.start_send_job(args.file, resume=False)
+        job.done.wait()
+        return {"status": job.status, "messages": job.sent + job.failed, "sent": job.sent, "failed": job.failed}
+
+    result = measured(run)
+    result["messages_per_second"] = round(result["messages"] / result["seconds"], 1)
+    result["phases"] = utils.metrics.summary()["phases"]
+    return result
+
+
+def child_endpoints(args):
+    """Request rate and latency of the polling endpoints with a large log store"""
+    import app
+    import utils
+
+    for i in range(args.log_entries):
+        utils.email_logs.append({"to": f"user{i}@example.com", "subject": "Bench",
+                                 "status": "Failed" if i % 10 == 0 else "Sent", "message": "ok"})
+    utils.email_logs.flush()
+    client = app.app.test_client()
+    newest = utils.email_logs.last_id()
+    paths = {
+        "status": "/api/status",
+        "logs_newest": "/api/logs?limit=100",
+        "logs_page_back": f"/api/logs?before={newest // 2}&limit=100",
+        "logs_failed": "/api/logs?status=Failed&limit=100",
+    }
+
+    results = {}
+    for name, path in paths.items():
+        latencies = []
+
+        def run():
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.status_code
+            return {"requests": args.requests}
+
+        result = measured(run)
+        latencies.sort()
+        result["requests_per_second"] = round(args.requests / result["seconds"], 1)
+        result["p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 3)
+        result["p95_ms"] = round(latencies[int(len(latencies) * 0.95)] * 1000, 3)
+        results[name] = result
+    return {"log_entries": args.log_entries, "endpoints": results}
+
+
+CHILD_SCENARIOS = {"validation": child_validation, "send": child_send, "endpoints": child_endpoints}
+
+
+def run_child(args):
+    """Entry point of a scenario process: the cwd is already a fresh workspace"""
+    sys.path.insert(0, REPO_DIR)
+    os.makedirs(os.path.join("static", "uploads"), exist_ok=True)
+    # The app prints a line per email; keep that out of the measurement and the result pipe
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = CHILD_SCENARIOS[args.child](args)
+    print("RESULT " + json.dumps(result))
+
+
+# --------------------------------------------------------------- parent side
+
+def spawn(scenario, config, extra_args=()):
+    """Run one scenario in a fresh workspace, returns its result dict"""
+    with tempfile.TemporaryDirectory(prefix="email-bench-") as workspace:
+        with open(os.path.join(workspace, "config.json"), "w") as f:
+            json.dump(config, f)
+        command = [sys.executable, os.path.abspath(__file__), "--child", scenario] + list(extra_args)
+        completed = subprocess.run(command, cwd=workspace, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{scenario} failed:\n{completed.stderr[-2000:]}")
+
+
+def git_commit():
+    """Short hash of the checked out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def send_config(args, port):
+    """config.json pointing the app at the local sink"""
+    return {
+        "smtp_server": "127.0.0.1",
+        "smtp_port": port,
+        "sender_email": "bench@example.com",
+        "sender_password": "",
+        "sender_name": "Benchmark",
+        "starttls": args.tls,
+        "send_workers": args.workers,
+        "smtp_pool_size": args.workers,
+        "rate_per_second": 0,
+        "rate_per_minute": 0,
+        "template_mode": args.template_mode,
+        "retry_base_delay": 0.05,
+        "retry_max_delay": 0.5
+    }
+
+
+def compare(previous_path, results):
+    """Print the change in the headline numbers against an earlier results file"""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous.get('commit')} ({os.path.basename(previous_path)}):")
+    old = {(r["scenario"], r.get("file")): r for r in previous["results"]}
+    for result in results["results"]:
+        before = old.get((result["scenario"], result.get("file")))
+        if not before:
+            continue
+        for key in ("rows_per_second", "messages_per_second", "peak_rss_mb", "cpu_seconds"):
+            if result.get(key) is not None and before.get(key):
+                change = (result[key] - before[key]) / before[key] * 100
+                print(f"  {result['scenario']:<11} {result.get('file', ''):<24} {key:<20} "
+                      f"{before[key]:>10} -> {result[key]:>10}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,100k", help="file sizes for the validation scenario (1k,100k,1m)")
+    parser.add_argument("--formats", default="csv,xlsx")
+    parser.add_argument("--send-sizes", default="1k", help="file sizes for the send scenario (csv)")
+    parser.add_argument("--scenarios", default="validation,send,endpoints")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--template-mode", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.0, help="sink delay per message (seconds)")
+    parser.add_argument("--tls", action="store_true", help="use STARTTLS against the sink")
+    parser.add_argument("--fail-4xx", type=float, default=0.0, help="share of messages the sink rejects with 451")
+    parser.add_argument("--fail-5xx", type=float, default=0.0, help="share of messages the sink rejects with 550")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--log-entries", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--child", choices=sorted(CHILD_SCENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    scenarios = args.scenarios.split(",")
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: getattr(args, key) for key in
+                     ("workers", "template_mode", "latency", "tls", "fail_4xx", "fail_5xx")},
+        "results": []
+    }
+
+    def record(result):
+        results["results"].append(result)
+        print(json.dumps(result))
+
+    if "validation" in scenarios:
+        for size in args.sizes.split(","):
+            for file_format in args.formats.split(","):
+                path = generate(size.strip().lower(), file_format.strip(), DATA_DIR)
+                result = spawn("validation", {}, ["--file", path])
+                record(dict(result, scenario="validation", file=os.path.basename(path)))
+
+    if "send" in scenarios:
+        from smtp_sink import SMTPSink
+
+        for size in args.send_sizes.split(","):
+            path = generate(size.strip().lower(), "csv", DATA_DIR)
+            with SMTPSink(port=args.port, latency=args.latency, tls=args.tls,
+                          fail_4xx=args.fail_4xx, fail_5xx=args.fail_5xx, seed=1) as sink:
+                result = spawn("send", send_config(args, args.port), ["--file", path])
+                result["sink"] = sink.stats()
+            record(dict(result, scenario="send", file=os.path.basename(path), rows=parse_size(size)))
+
+    if "endpoints" in scenarios:
+        result = spawn("endpoints", {}, ["--log-entries", str(args.log_entries),
+                                         "--requests", str(args.requests)])
+        record(dict(result, scenario="endpoints"))
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"{results['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {out_path}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
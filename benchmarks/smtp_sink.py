@@ -0,0 +1,146 @@
+"""
+SMTP Sink Server
+Local aiosmtpd server that accepts and discards mail, for benchmarking the
+send path without touching a real provider
+- latency: seconds added before answering each DATA
+- tls: offer STARTTLS with a throwaway self-signed certificate
+- fail_4xx / fail_5xx: share of messages answered with 451 / 550
+
+Usage: python benchmarks/smtp_sink.py [--port 8025] [--latency 0.01] [--tls] [--fail-4xx 0.01]
+"""
+import argparse
+import asyncio
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from aiosmtpd.controller import Controller
+
+
+class SinkHandler:
+    """aiosmtpd handler counting what it receives and injecting faults"""
+
+    def __init__(self, latency=0.0, fail_4xx=0.0, fail_5xx=0.0, seed=None):
+        self.latency = latency
+        self.fail_4xx = fail_4xx
+        self.fail_5xx = fail_5xx
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.recipients = 0
+        self.bytes_received = 0
+        self.rejected_4xx = 0
+        self.rejected_5xx = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        """Answer one message: wait `latency`, then accept it or inject a failure"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        roll = self.random.random()
+        if roll < self.fail_5xx:
+            with self.lock:
+                self.rejected_5xx += 1
+            return "550 5.1.1 Injected permanent failure"
+        if roll < self.fail_5xx + self.fail_4xx:
+            with self.lock:
+                self.rejected_4xx += 1
+            return "451 4.7.1 Injected transient failure, try again later"
+        with self.lock:
+            self.messages += 1
+            self.recipients += len(envelope.rcpt_tos)
+            self.bytes_received += len(envelope.content or b"")
+        return "250 OK"
+
+    def stats(self):
+        """Counters as a JSON-serializable dict"""
+        with self.lock:
+            return {
+                "messages": self.messages,
+                "recipients": self.recipients,
+                "bytes_received": self.bytes_received,
+                "rejected_4xx": self.rejected_4xx,
+                "rejected_5xx": self.rejected_5xx
+            }
+
+
+def self_signed_context(directory):
+    """Server TLS context with a throwaway self-signed certificate (needs the openssl CLI)"""
+    cert = os.path.join(directory, "sink-cert.pem")
+    key = os.path.join(directory, "sink-key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class SMTPSink:
+    """Start/stop wrapper around an aiosmtpd Controller"""
+
+    def __init__(self, host="127.0.0.1", port=8025, latency=0.0, tls=False,
+                 fail_4xx=0.0, fail_5xx=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.handler = SinkHandler(latency, fail_4xx, fail_5xx, seed)
+        self._tempdir = None
+        self.controller = None
+
+    def start(self):
+        """Start listening in a background thread"""
+        kwargs = {}
+        if self.tls:
+            self._tempdir = tempfile.TemporaryDirectory()
+            kwargs["tls_context"] = self_signed_context(self._tempdir.name)
+        self.controller = Controller(self.handler, hostname=self.host, port=self.port,
+                                     data_size_limit=0, **kwargs)
+        self.controller.start()
+        return self
+
+    def stop(self):
+        """Stop the server and remove the certificate"""
+        if self.controller is not None:
+            self.controller.stop()
+            self.controller = None
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+            self._tempdir = None
+
+    def stats(self):
+        """What the sink has received so far"""
+        return self.handler.stats()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--fail-4xx", type=float, default=0.0)
+    parser.add_argument("--fail-5xx", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with SMTPSink(args.host, args.port, args.latency, args.tls, args.fail_4xx, args.fail_5xx) as sink:
+        print(f"SMTP sink listening on {args.host}:{args.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(5)
+                print(sink.stats())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
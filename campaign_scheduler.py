@@ -0,0 +1,183 @@
+"""
+Campaign Scheduler Module
+Holds send jobs and rows back until their send time, so a large campaign
+can be spread over hours or timed for each recipient's local morning
+- A whole job can start later (send_at on /api/send, --send-at on the CLI)
+- A row can carry its own time in a "Send At" column, read in the time zone
+  of an optional "Timezone" column (e.g. America/New_York)
+- Waiting jobs and rows sit in one heap ordered by due time: holding and
+  releasing an item cost O(log n), and the dispatcher thread sleeps until
+  the earliest due time instead of polling
+- Hourly and daily quotas are enforced by the rate limiter (QuotaWindow)
+"""
+import functools
+import heapq
+import itertools
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+SEND_AT_COLUMN = "Send At"
+TIMEZONE_COLUMN = "Timezone"
+# The wall clock can jump (NTP, daylight saving), so the dispatcher re-checks at least this often
+MAX_SLEEP = 60.0
+
+TIME_OF_DAY_RE = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+
+@functools.lru_cache(maxsize=256)
+def get_zone(name):
+    """ZoneInfo for an IANA time zone name, None for server local time; raises ValueError if unknown"""
+    if not name:
+        return None
+    if ZoneInfo is None:
+        raise ValueError("Time zones need Python 3.9 or newer")
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):
+        # ZoneInfoNotFoundError is a KeyError
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+def parse_send_at(value, timezone="", now=None):
+    """
+    Epoch seconds for a send time, or None when it is empty
+    Accepts a date and time ("2026-10-19 09:00", ISO 8601, optionally with a
+    UTC offset) or a time of day ("09:00": the next time it comes round),
+    read in `timezone` (server local time when empty) unless it has an offset
+    Raises ValueError for anything else
+    """
+    text = str(value or "").strip()
+    if not text:
+        return None
+    zone = get_zone(str(timezone or "").strip())
+    now = time.time() if now is None else now
+
+    match = TIME_OF_DAY_RE.match(text)
+    if match:
+        hour, minute, second = (int(part or 0) for part in match.groups())
+        try:
+            due = datetime.fromtimestamp(now, zone).replace(hour=hour, minute=minute, second=second,
+                                                            microsecond=0)
+        except ValueError:
+            raise ValueError(f"Invalid send time: {text}")
+        if due.timestamp() <= now:
+            due += timedelta(days=1)
+        return due.timestamp()
+
+    try:
+        due = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid send time: {text}")
+    if due.tzinfo is None and zone is not None:
+        due = due.replace(tzinfo=zone)
+    return due.timestamp()
+
+
+def unit_send_at(row_index, row, now=None):
+    """
+    Send time of a send unit (a row, or a batch whose rows share one time),
+    None when it has none; rows with a time the preflight check would have
+    rejected count as having none
+    """
+    if isinstance(row_index, tuple):
+        row = row.rows[0]
+    value = row.get(SEND_AT_COLUMN)
+    if not value:
+        return None
+    try:
+        return parse_send_at(value, row.get(TIMEZONE_COLUMN, ""), now)
+    except ValueError:
+        return None
+
+
+def compact_item(item):
+    """
+    Intern the text values of a send unit about to wait in the heap
+    Rows of a campaign mostly repeat the same Subject, Body and Timezone, so
+    a large number of waiting rows then share one copy of each
+    """
+    row_index, row = item
+    for values in (row.rows if isinstance(row_index, tuple) else [row]):
+        for key, value in values.items():
+            if isinstance(value, str):
+                values[key] = sys.intern(value)
+    return item
+
+
+class CampaignScheduler:
+    """
+    Heap of jobs and rows waiting for their send time
+    - hold(due_at, job, item) parks a row until due_at (epoch seconds);
+      item None parks the job itself
+    - a dispatcher thread sleeps until the earliest due time and hands each
+      due item to release(job, item)
+    """
+
+    def __init__(self, release):
+        self.release = release
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self.held = 0
+        self.released = 0
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="campaign-dispatcher")
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def hold(self, due_at, job, item=None):
+        """Park a row (or, with item None, a whole job) until due_at"""
+        with self._cond:
+            entry = (due_at, next(self._counter), job, item)
+            heapq.heappush(self._heap, entry)
+            self.held += 1
+            # Only a new earliest item changes how long the dispatcher has to sleep
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def _dispatch_loop(self):
+        """Wait for the earliest due item and release it"""
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    timeout = min(self._heap[0][0] - time.time(), MAX_SLEEP) if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, job, item = heapq.heappop(self._heap)
+                self.released += 1
+            try:
+                self.release(job, item)
+            except Exception as e:
+                print(f"Campaign scheduler error on job {job.id}: {e}")
+
+    def cancel(self, job_id):
+        """Drop everything a job has waiting, returns how many items were dropped"""
+        with self._cond:
+            kept = [entry for entry in self._heap if entry[2].id != job_id]
+            dropped = len(self._heap) - len(kept)
+            if dropped:
+                heapq.heapify(kept)
+                self._heap = kept
+                self._cond.notify()
+            return dropped
+
+    def stats(self):
+        """Queue counters, read without the lock holding and releasing take"""
+        heap = self._heap
+        try:
+            next_due_in = round(max(0.0, heap[0][0] - time.time()), 1)
+        except IndexError:
+            next_due_in = None
+        return {
+            "pending": len(heap),
+            "held": self.held,
+            "released": self.released,
+            "next_due_in": next_due_in
+        }
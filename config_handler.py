@@ -1,31 +1,97 @@
 """
 Configuration Handler Module
 Handles loading and saving of email configuration dynamically
+The parsed config is cached in memory and only re-read when config.json
+changes on disk, so the send path doesn't parse JSON for every email
 """
 import json
 import os
+import tempfile
+import threading
+import time
 
 CONFIG_FILE = "config.json"
 
+# How often (seconds) load_config checks config.json for outside edits
+CHECK_INTERVAL = 1.0
+
+_cache = None
+_cache_signature = None
+_cache_checked_at = 0.0
+_cache_lock = threading.Lock()
+
+def default_config():
+    """Default configuration used when config.json doesn't exist"""
+    return {
+        "smtp_server": "smtp.gmail.com",
+        "smtp_port": 587,
+        "sender_email": "",
+        "sender_password": "",
+        "sender_name": "",
+        "smtp_pool_size": 4,
+        "smtp_max_messages_per_connection": 100,
+        "smtp_keepalive_interval": 30
+    }
+
+def _file_signature():
+    """(mtime, size) of config.json, or None if it doesn't exist"""
+    try:
+        stat = os.stat(CONFIG_FILE)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
 def load_config():
-    """Load configuration from config.json file"""
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Return default configuration
-        return {
-            "smtp_server": "smtp.gmail.com",
-            "smtp_port": 587,
-            "sender_email": "",
-            "sender_password": "",
-            "sender_name": ""
-        }
+    """
+    Load configuration from config.json file
+    Returns a copy of the cached config, reloading it only when the file changed
+    """
+    global _cache, _cache_signature, _cache_checked_at
+
+    with _cache_lock:
+        now = time.monotonic()
+        if _cache is not None and now - _cache_checked_at < CHECK_INTERVAL:
+            return dict(_cache)
+
+        signature = _file_signature()
+        if _cache is None or signature != _cache_signature:
+            if signature is None:
+                # Return default configuration
+                _cache = default_config()
+            else:
+                with open(CONFIG_FILE, 'r') as f:
+                    _cache = json.load(f)
+            _cache_signature = signature
+        _cache_checked_at = now
+        return dict(_cache)
 
 def save_config(config_data):
-    """Save configuration to config.json file"""
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config_data, f, indent=4)
+    """
+    Save configuration to config.json file
+    Writes to a temp file and renames it over config.json, so readers never
+    see a half-written file, then updates the cache immediately
+    """
+    global _cache, _cache_signature, _cache_checked_at
+
+    directory = os.path.dirname(os.path.abspath(CONFIG_FILE))
+    with _cache_lock:
+        fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".json", dir=directory)
+        try:
+            # Keep the permissions of the file being replaced
+            if os.path.exists(CONFIG_FILE):
+                os.chmod(tmp_path, os.stat(CONFIG_FILE).st_mode & 0o777)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(config_data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, CONFIG_FILE)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _cache = dict(config_data)
+        _cache_signature = _file_signature()
+        _cache_checked_at = time.monotonic()
     return True
 
 def update_config(key, value):
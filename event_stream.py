@@ -0,0 +1,96 @@
+"""
+Event Stream Module
+Server-Sent Events for live send progress
+The send engine only bumps a version number when something changes; each
+connected client wakes up, waits out a short coalescing window and then gets
+one message with the counters that changed and the logs added since its last
+push, so a fast job can't flood the dashboards watching it
+"""
+import json
+import threading
+import time
+
+COALESCE_INTERVAL = 0.5
+KEEPALIVE_INTERVAL = 15.0
+MAX_LOGS_PER_PUSH = 100
+
+
+class ChangeNotifier:
+    """Version counter that stream clients can block on"""
+
+    def __init__(self):
+        self.version = 0
+        self._cond = threading.Condition()
+
+    def notify(self, *args):
+        """Record that something changed, called from the send path"""
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait_for_change(self, seen_version, timeout):
+        """Block until the version moves past seen_version or timeout, returns the current version"""
+        with self._cond:
+            if self.version == seen_version:
+                self._cond.wait(timeout)
+            return self.version
+
+
+notifier = ChangeNotifier()
+
+
+def format_event(event, data):
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def progress_stream(get_status, get_logs_since, since=None,
+                    coalesce_interval=COALESCE_INTERVAL, keepalive_interval=KEEPALIVE_INTERVAL):
+    """
+    Generator of SSE messages for one client
+    - get_status(): current status dict
+    - get_logs_since(cursor, limit): logs with id > cursor, oldest first
+    - since: last log id the client already has (None = start from now)
+    The first message carries the full status, later ones only the fields that changed
+    """
+    last_status = {}
+    cursor = since
+    seen_version = -1
+    last_push = 0.0
+
+    # Tell EventSource to reconnect quickly if the connection drops
+    yield "retry: 3000\n\n"
+
+    while True:
+        version = notifier.wait_for_change(seen_version, keepalive_interval)
+        if version == seen_version:
+            yield ": keepalive\n\n"
+            continue
+
+        # Coalesce: at most one push per interval however fast events arrive
+        wait = coalesce_interval - (time.monotonic() - last_push)
+        if wait > 0:
+            time.sleep(wait)
+        seen_version = notifier.version
+        last_push = time.monotonic()
+
+        status = get_status()
+        delta = {key: value for key, value in status.items() if last_status.get(key) != value}
+        if delta:
+            yield format_event("status", delta)
+            last_status = status
+
+        if cursor is None:
+            logs = get_logs_since(None, 1)
+            cursor = logs[-1]["id"] if logs else 0
+            continue
+        logs = get_logs_since(cursor, MAX_LOGS_PER_PUSH + 1)
+        if logs:
+            skipped = len(logs) > MAX_LOGS_PER_PUSH
+            logs = logs[:MAX_LOGS_PER_PUSH]
+            cursor = logs[-1]["id"]
+            yield format_event("logs", {"logs": logs, "cursor": cursor, "truncated": skipped})
+            if skipped:
+                # Let the client catch up from the newest page instead of replaying everything
+                newest = get_logs_since(None, 1)
+                cursor = newest[-1]["id"] if newest else cursor
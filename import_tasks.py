@@ -0,0 +1,92 @@
+"""
+Import Tasks Module
+Registry of background import tasks (Google Sheet downloads, uploads)
+A request starts a task and returns its id straight away; the client polls
+the task until it is done. Every state change also bumps the live progress
+stream so an open dashboard notices without polling
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from event_stream import notifier
+
+MAX_TASKS = 200
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class ImportTask:
+    """State of one background import"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    def update(self, status, result=None, error=None):
+        """Move the task to a new status (e.g. downloading, parsing, done, failed)"""
+        with self._lock:
+            self.status = status
+            if result is not None:
+                self.result = result
+            if error is not None:
+                self.error = error
+            self.updated_at = time.time()
+        notifier.notify()
+
+    @property
+    def finished(self):
+        """True once the task is done or has failed"""
+        return self.status in (DONE, FAILED)
+
+    def snapshot(self):
+        """The task as a JSON-serializable dict"""
+        with self._lock:
+            return {
+                "task_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "finished": self.status in (DONE, FAILED),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at
+            }
+
+
+class TaskRegistry:
+    """Bounded registry of recent tasks, the oldest finished ones are forgotten first"""
+
+    def __init__(self, max_tasks=MAX_TASKS):
+        self.max_tasks = max_tasks
+        self._tasks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, kind):
+        """Register a new pending task"""
+        task = ImportTask(kind)
+        with self._lock:
+            self._tasks[task.id] = task
+            if len(self._tasks) > self.max_tasks:
+                for task_id in [task_id for task_id, old in self._tasks.items() if old.finished]:
+                    del self._tasks[task_id]
+                    if len(self._tasks) <= self.max_tasks:
+                        break
+        return task
+
+    def get(self, task_id):
+        """Get a task by id, or None"""
+        with self._lock:
+            return self._tasks.get(task_id)
+
+
+tasks = TaskRegistry()
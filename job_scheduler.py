@@ -0,0 +1,449 @@
+"""
+Job Scheduler Module
+Runs several send jobs at once on a shared pool of send workers
+Workers take rows from the active jobs round-robin, one message at a time,
+so every running campaign gets an equal share of the global concurrency
+and rate limits
+Jobs and rows with a send time in the future wait in the campaign
+scheduler's heap and join the rotation when they are due
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from campaign_scheduler import CampaignScheduler, compact_item, unit_send_at
+from metrics import metrics
+from rate_limiter import RateLimiter
+from send_state import ShardedCounter
+
+# At most this many future-dated rows are read and parked per take_row call,
+# so a big scheduled file is parked a slice at a time between other jobs' rows
+HOLD_SLICE = 500
+
+
+class SendJob:
+    """
+    State of one send job: its row source, counters and stop flag
+    Workers coordinate through _lock; readers (snapshot) never take it:
+    sent/failed are sharded per worker thread and the rest of the status
+    is republished as a fresh dict whenever it changes
+    """
+
+    def __init__(self, job_id, filepath, sender_name, total, rows, sent=0, failed=0, send_at=None):
+        self.id = job_id
+        self.filepath = filepath
+        self.sender_name = sender_name
+        self.total = total
+        self.send_at = send_at
+        self.status = "scheduled" if send_at and send_at > time.time() else "running"
+        self.should_stop = False
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.retrying = 0
+        self.done = threading.Event()
+
+        self._sent = ShardedCounter(sent)
+        self._failed = ShardedCounter(failed)
+        self._rows = rows
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._exhausted = False
+        # Rows waiting for their send time, and the ones released but not taken yet
+        self._held = 0
+        self._ready = deque()
+        self._publish()
+
+    @property
+    def sent(self):
+        return self._sent.value
+
+    @property
+    def failed(self):
+        return self._failed.value
+
+    def _publish(self):
+        """Replace the published status (callers hold _lock, or own the job during __init__)"""
+        self._published = {
+            "job_id": self.id,
+            "filename": os.path.basename(self.filepath),
+            "filepath": self.filepath,
+            "status": self.status,
+            "is_sending": self.finished_at is None,
+            "should_stop": self.should_stop,
+            "total_emails": self.total,
+            "retry_pending": self.retrying,
+            "held": self._held,
+            "send_at": self.send_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+    def take_row(self, hold=None):
+        """
+        Get the next item to send, or None if the job has nothing to hand out
+        right now: see `exhausted` for whether it ever will again
+        Items are (row_index, row), or (tuple of row indexes, batch) for a
+        multi-recipient batch
+        hold(job, item) may park a row read from the file until its send time
+        (returning True); released rows come back through release()
+        At most HOLD_SLICE rows are parked per call: None with has_work still
+        True means the caller should come back for more
+        """
+        with self._lock:
+            if self._exhausted or self.should_stop:
+                self._exhausted = True
+                return None
+            if self._ready:
+                self._held -= 1
+                self._in_flight += 1
+                self._exhausted = self._rows is None and not self._held
+                self._publish()
+                return self._ready.popleft()
+            if self._rows is None:
+                return None
+            held = self._held
+            item = None
+            reading = True
+            try:
+                for _ in range(HOLD_SLICE):
+                    item = next(self._rows, None)
+                    if item is None:
+                        reading = False
+                        break
+                    if hold is None or not hold(self, item):
+                        break
+                    self._held += 1
+                    item = None
+            except Exception as e:
+                # A broken row source fails the job instead of killing the worker
+                self.error = str(e)
+                item = None
+                reading = False
+            if self.error or self._held != held:
+                self._publish()
+            if item is not None:
+                self._in_flight += 1
+                return item
+            if not reading:
+                # Held rows keep the job open until they have been released and sent
+                self._rows = None
+                self._exhausted = not self._held
+            return None
+
+    @property
+    def has_work(self):
+        """True if take_row can hand out (or park) something without waiting for a release"""
+        return not self._exhausted and (bool(self._ready) or self._rows is not None)
+
+    @property
+    def exhausted(self):
+        """True once the job will never hand out another item"""
+        return self._exhausted
+
+    def release(self, item):
+        """A held item is due: hand it out before reading further rows"""
+        with self._lock:
+            self._ready.append(item)
+            self._publish()
+
+    def start(self):
+        """The job's own send time has come"""
+        with self._lock:
+            if self.status == "scheduled":
+                self.status = "running"
+                self.started_at = time.time()
+                self._publish()
+
+    def row_done(self, sent=0, failed=0):
+        """
+        Record the result of an item taken with take_row
+        sent=failed=0 means the item was given back unsent (job stopped while waiting)
+        Returns True when this was the last outstanding item of an exhausted job
+        """
+        self._sent.add(sent)
+        self._failed.add(failed)
+        with self._lock:
+            self._in_flight -= 1
+            return self._exhausted and self._in_flight == 0 and self.finished_at is None
+
+    def retry_scheduled(self):
+        """A row was handed to the retry queue; the job stays open until it settles"""
+        with self._lock:
+            self.retrying += 1
+            self._publish()
+
+    def retry_done(self, sent=0, failed=0):
+        """
+        Record the final result of a retried row (sent=failed=0 if it was cancelled)
+        Returns True when this was the last thing the exhausted job was waiting for
+        """
+        self._sent.add(sent)
+        self._failed.add(failed)
+        with self._lock:
+            self.retrying -= 1
+            self._publish()
+            return self._exhausted and self._in_flight == 0 and self.finished_at is None
+
+    def try_finish(self):
+        """Mark the job finished if nothing is in flight or waiting for a retry, returns True the first time it does"""
+        with self._lock:
+            if not self._exhausted or self._in_flight or self.retrying or self.finished_at is not None:
+                return False
+            self.finished_at = time.time()
+            if self.error:
+                self.status = "failed"
+            else:
+                self.status = "stopped" if self.should_stop else "completed"
+            self._publish()
+            return True
+
+    def stop(self):
+        """Ask the workers to stop handing out rows for this job"""
+        self.should_stop = True
+        with self._lock:
+            self._publish()
+
+    def set_counts(self, sent, failed):
+        """Move the counters to absolute values (jobs counted elsewhere, e.g. by worker processes)"""
+        self._sent.add(sent - self.sent)
+        self._failed.add(failed - self.failed)
+
+    def snapshot(self):
+        """Get the job's status as a JSON-serializable dict, without blocking the workers"""
+        return dict(self._published, sent_count=self.sent, failed_count=self.failed)
+
+
+class JobScheduler:
+    """
+    Fair scheduler for concurrent send jobs
+    - `workers` threads are shared by all jobs (global concurrency limit)
+    - One RateLimiter is shared by all jobs (global rate limit and quotas)
+    - Active jobs are served round-robin, one row per turn
+    - Jobs and rows not due yet wait in the campaign scheduler, out of the rotation
+    """
+
+    def __init__(self, send_row, on_finish=None, workers=4, per_second=None, per_minute=None,
+                 per_hour=None, per_day=None, sent_since=None):
+        self.send_row = send_row
+        self.on_finish = on_finish
+        self.sent_since = sent_since
+        self.workers = 0
+        self.rate_limits = None
+        self.limiter = None
+        # Last applied (workers, per_second, per_minute, per_hour, per_day)
+        self.settings = None
+        self.campaign = CampaignScheduler(self._release)
+
+        self._jobs = OrderedDict()
+        # Copy of _jobs replaced on every change, read without taking _cond
+        self._published_jobs = {}
+        self._active = deque()
+        # Jobs a worker is reading rows from right now, out of _active meanwhile
+        self._reading = set()
+        self._cond = threading.Condition()
+        self._threads = {}
+
+        self.configure(workers, per_second, per_minute, per_hour, per_day)
+
+    def configure(self, workers, per_second=None, per_minute=None, per_hour=None, per_day=None):
+        """
+        Apply concurrency, rate limit and quota settings, starting extra workers if needed
+        Unchanged settings return right away without touching _cond, so status
+        reads that go through here never wait behind the workers
+        """
+        settings = (max(1, int(workers)), per_second, per_minute, per_hour, per_day)
+        if settings == self.settings:
+            return
+        with self._cond:
+            self.settings = settings
+            if self.rate_limits != (per_second, per_minute, per_hour, per_day):
+                self.rate_limits = (per_second, per_minute, per_hour, per_day)
+                self.limiter = RateLimiter(per_second=per_second, per_minute=per_minute, per_hour=per_hour,
+                                           per_day=per_day, sent_since=self.sent_since)
+            self.workers = settings[0]
+            # Surplus workers (index >= workers) exit the next time they go idle
+            for index in range(self.workers):
+                thread = self._threads.get(index)
+                if thread is None or not thread.is_alive():
+                    thread = threading.Thread(target=self._worker_loop, args=(index,),
+                                              name=f"send-worker-{index}")
+                    thread.daemon = True
+                    self._threads[index] = thread
+                    thread.start()
+            self._cond.notify_all()
+
+    def submit(self, job):
+        """Add a job to the rotation, or to the campaign scheduler if it starts later"""
+        with self._cond:
+            self._jobs[job.id] = job
+            self._published_jobs = dict(self._jobs)
+            if job.status == "scheduled":
+                self.campaign.hold(job.send_at, job)
+            else:
+                self._active.append(job)
+                self._cond.notify_all()
+        return job
+
+    def _hold_until_due(self, job, item):
+        """Park a row whose send time is still ahead, returns True if it was parked"""
+        due_at = unit_send_at(*item)
+        if due_at is None or due_at <= time.time():
+            return False
+        self.campaign.hold(due_at, job, compact_item(item))
+        return True
+
+    def _rotate(self, job):
+        """Put a job (back) in the rotation unless it is there or being read already (callers hold _cond)"""
+        if job not in self._reading and job not in self._active:
+            self._active.append(job)
+        self._cond.notify()
+
+    def _release(self, job, item):
+        """Campaign scheduler callback: a job or one of its rows is due, put the job (back) in the rotation"""
+        if item is None:
+            job.start()
+        else:
+            job.release(item)
+        with self._cond:
+            self._rotate(job)
+
+    def track(self, job):
+        """Register a job whose rows are sent elsewhere (worker processes); it is listed but never served"""
+        with self._cond:
+            self._jobs[job.id] = job
+            self._published_jobs = dict(self._jobs)
+        return job
+
+    def settle(self, job):
+        """Finish a tracked job once nothing is left for it anywhere"""
+        job.take_row()
+        if job.try_finish():
+            self._finish(job)
+
+    def _next_work(self, worker_index):
+        """
+        Pick the next (job, row) round-robin across active jobs, blocking while idle
+        Rows are read outside _cond, so a slow read, or a slice of future rows
+        being parked, only holds up the job being read
+        """
+        while True:
+            with self._cond:
+                while not self._active:
+                    if worker_index >= self.workers:
+                        return None, None
+                    self._cond.wait()
+                if worker_index >= self.workers:
+                    return None, None
+                job = self._active.popleft()
+                self._reading.add(job)
+            with metrics.timed("row_read"):
+                item = job.take_row(hold=self._hold_until_due)
+            with self._cond:
+                self._reading.discard(job)
+                if item is not None or job.has_work:
+                    # Back in the rotation, and let an idle worker take the next turn
+                    self._active.append(job)
+                    self._cond.notify()
+                    if item is not None:
+                        return job, item
+                    continue
+            # Only held rows left: out of the rotation until one is released
+            # Exhausted or stopped: finish once in-flight rows land
+            if job.exhausted and job.try_finish():
+                self._finish(job)
+
+    def _finish(self, job):
+        """Run the finish callback for a job outside of the worker's hot path"""
+        thread = threading.Thread(target=self._run_finish, args=(job,))
+        thread.daemon = True
+        thread.start()
+
+    def _run_finish(self, job):
+        try:
+            if self.on_finish is not None:
+                self.on_finish(job)
+        finally:
+            job.done.set()
+
+    def _worker_loop(self, worker_index):
+        while True:
+            job, item = self._next_work(worker_index)
+            if job is None:
+                return
+            row_index, row = item
+            # A batch is one transaction but still counts one rate-limit token per recipient
+            size = len(row_index) if isinstance(row_index, tuple) else 1
+            sent, failed = 0, 0
+            try:
+                with metrics.for_job(job.id):
+                    with metrics.timed("rate_wait"):
+                        allowed = all(self.limiter.acquire(cancelled=lambda: job.should_stop)
+                                      for _ in range(size))
+                    if allowed:
+                        with metrics.timed("total"):
+                            result = self.send_row(job, row_index, row)
+                        # None: the row was handed to the retry queue and settles later
+                        if isinstance(result, tuple):
+                            sent, failed = result
+                        elif result:
+                            sent = 1
+                        elif result is not None:
+                            failed = 1
+                        metrics.count_message("sent", sent)
+                        metrics.count_message("failed", failed)
+            except Exception as e:
+                print(f"Send worker error on job {job.id}: {e}")
+                sent, failed = 0, size
+            if job.row_done(sent, failed) and job.try_finish():
+                self._finish(job)
+
+    def complete_retry(self, job, sent=0, failed=0):
+        """Record a settled retry, finishing the job if it was the last thing outstanding"""
+        with metrics.for_job(job.id):
+            metrics.count_message("sent", sent)
+            metrics.count_message("failed", failed)
+        if job.retry_done(sent, failed) and job.try_finish():
+            self._finish(job)
+
+    def get_job(self, job_id):
+        """Get a job by id, or None"""
+        return self._published_jobs.get(job_id)
+
+    def list_jobs(self):
+        """All known jobs, oldest first"""
+        return list(self._published_jobs.values())
+
+    def active_jobs(self):
+        """Jobs that have not finished yet"""
+        return [job for job in self.list_jobs() if job.finished_at is None]
+
+    def stop_job(self, job_id):
+        """Stop one job, returns False if it doesn't exist"""
+        job = self.get_job(job_id)
+        if job is None:
+            return False
+        job.stop()
+        # Workers and retries waiting on the rate limiter or a used-up quota give the row back now
+        self.limiter.wake()
+        # A job waiting for its send time is outside the rotation; bring it back so it can finish
+        waiting = self.campaign.cancel(job_id)
+        with self._cond:
+            if waiting:
+                self._rotate(job)
+            self._cond.notify_all()
+        return True
+
+    def stop_all(self):
+        """Stop every active job"""
+        for job in self.active_jobs():
+            self.stop_job(job.id)
+
+    def forget_finished(self):
+        """Drop finished jobs from the in-memory registry"""
+        with self._cond:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]:
+                del self._jobs[job_id]
+            self._published_jobs = dict(self._jobs)
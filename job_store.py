@@ -0,0 +1,286 @@
+"""
+Job Store Module
+Durable send jobs backed by an append-only SQLite (WAL) journal
+Each row's outcome is checkpointed so a stopped or crashed job can resume
+without mailing the same recipients again
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from send_state import owner_alive, process_owner
+
+JOURNAL_DB = "cache/jobs.db"
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH_SIZE = 500
+# Seconds to wait for another process's write lock, and tries per batch before it is dropped
+BUSY_TIMEOUT = 30
+WRITE_ATTEMPTS = 3
+
+# Jobs in these states still have rows left to send
+RESUMABLE_STATUSES = ("running", "stopped", "interrupted", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filepath TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    sender_name TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    send_at REAL,
+    owner TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_hash ON jobs (file_hash, status);
+CREATE TABLE IF NOT EXISTS outcomes (
+    job_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    recipient TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, row_index)
+);
+"""
+
+
+class JobJournal:
+    """
+    Append-only journal of send jobs and per-row outcomes
+    Outcome writes are queued and flushed by a background thread in batches,
+    one transaction per batch, so journaling keeps up with high send rates
+    """
+
+    def __init__(self, db_path=JOURNAL_DB, flush_interval=FLUSH_INTERVAL,
+                 batch_size=FLUSH_BATCH_SIZE):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None,
+                                     timeout=BUSY_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Journals created before scheduled sends existed lack the send_at column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "send_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN send_at REAL")
+        # ... and the owner column (the host:pid of the process running the job)
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        self._db_lock = threading.Lock()
+
+        self._pending = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _writer_loop(self):
+        """Drain queued outcomes and write them in batched transactions"""
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            finally:
+                # Always settle the batch, or flush() (and the job waiting on it) would hang
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _write_batch(self, batch):
+        """
+        Write one batch of outcomes in a single transaction
+        A failed transaction is rolled back and retried; after WRITE_ATTEMPTS
+        the batch is reported and dropped so the writer keeps running
+        """
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            with self._db_lock:
+                try:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO outcomes (job_id, row_index, recipient, status, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        batch
+                    )
+                    self._conn.execute("COMMIT")
+                    return True
+                except sqlite3.Error as e:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                    print(f"Journal write failed (attempt {attempt} of {WRITE_ATTEMPTS}): {e}")
+            if attempt < WRITE_ATTEMPTS:
+                time.sleep(attempt)
+        print(f"Dropped {len(batch)} journaled outcomes that could not be written")
+        return False
+
+    def flush(self):
+        """Block until every queued outcome has been written"""
+        self._pending.join()
+
+    def create_job(self, filepath, file_hash, sender_name="", total=0, send_at=None):
+        """
+        Register a new job, owned by the calling process, and return its id
+        send_at (epoch seconds) delays its start
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, filepath, file_hash, sender_name, status, total, created_at, updated_at, send_at, "
+            "owner) VALUES (?, ?, ?, ?, 'running', ?, ?, ?, ?, ?)",
+            (job_id, filepath, file_hash, sender_name or "", total, now, now, send_at, process_owner())
+        )
+        return job_id
+
+    def set_send_at(self, job_id, send_at):
+        """Change when a job starts (None: right away)"""
+        self._execute("UPDATE jobs SET send_at = ?, updated_at = ? WHERE id = ?", (send_at, time.time(), job_id))
+
+    def set_status(self, job_id, status, total=None):
+        """Update a job's status (running, stopped, completed, failed, interrupted)"""
+        if total is None:
+            self._execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                          (status, time.time(), job_id))
+        else:
+            self._execute("UPDATE jobs SET status = ?, total = ?, updated_at = ? WHERE id = ?",
+                          (status, total, time.time(), job_id))
+
+    def claim_job(self, job_id, total=None):
+        """
+        Take a job over to resume it: it becomes running, owned by the calling process
+        Returns False if it is running in another process that is still alive
+        The update only applies if nobody else claimed the job in the meantime
+        """
+        job = self.get_job(job_id)
+        owner = process_owner()
+        if job["status"] == "running" and job["owner"] != owner and owner_alive(job["owner"]):
+            return False
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, total = COALESCE(?, total), updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (owner, total, time.time(), job_id, job["status"], job["owner"]))
+        return cursor.rowcount == 1
+
+    def record_outcome(self, job_id, row_index, recipient, status):
+        """Queue a row outcome for the next batched write"""
+        self._pending.put((job_id, row_index, recipient or "", status, time.time()))
+
+    def get_job(self, job_id):
+        """Get a job as a dict, or None"""
+        rows = self._execute(
+            "SELECT id, filepath, file_hash, sender_name, status, total, created_at, updated_at, send_at, owner "
+            "FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        keys = ("id", "filepath", "file_hash", "sender_name", "status", "total", "created_at", "updated_at",
+                "send_at", "owner")
+        return dict(zip(keys, rows[0]))
+
+    def find_resumable_job(self, file_hash):
+        """Get the most recent unfinished job for a file content hash"""
+        placeholders = ", ".join("?" for _ in RESUMABLE_STATUSES)
+        rows = self._execute(
+            f"SELECT id FROM jobs WHERE file_hash = ? AND status IN ({placeholders}) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (file_hash,) + RESUMABLE_STATUSES
+        )
+        return self.get_job(rows[0][0]) if rows else None
+
+    def mark_interrupted(self):
+        """
+        Called at startup: jobs still marked running whose owner process is
+        gone were cut off by a crash or restart
+        Jobs another live process is running (the CLI, a gunicorn peer) are left alone
+        Returns the ids of the interrupted jobs
+        """
+        rows = self._execute("SELECT id, owner FROM jobs WHERE status = 'running' ORDER BY created_at")
+        interrupted = []
+        for job_id, owner in rows:
+            if owner_alive(owner):
+                continue
+            with self._db_lock:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'interrupted', updated_at = ? WHERE id = ? AND status = 'running' "
+                    "AND owner = ?", (time.time(), job_id, owner))
+            if cursor.rowcount == 1:
+                interrupted.append(job_id)
+        return interrupted
+
+    def completed_rows(self, job_id):
+        """Set of row indexes that already have an outcome (the resume checkpoint)"""
+        self.flush()
+        rows = self._execute("SELECT row_index FROM outcomes WHERE job_id = ?", (job_id,))
+        return {row_index for (row_index,) in rows}
+
+    def recorded_outcomes(self, job_id, row_indexes):
+        """Outcome status of each of row_indexes that already has one, as {row_index: status}"""
+        self.flush()
+        row_indexes = list(row_indexes)
+        recorded = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(row_indexes), 500):
+            chunk = row_indexes[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self._execute(
+                f"SELECT row_index, status FROM outcomes WHERE job_id = ? AND row_index IN ({placeholders})",
+                [job_id] + chunk)
+            recorded.update(rows)
+        return recorded
+
+    def outcome_counts(self, job_id):
+        """Count of outcomes per status for a job"""
+        self.flush()
+        rows = self._execute(
+            "SELECT status, COUNT(*) FROM outcomes WHERE job_id = ? GROUP BY status", (job_id,))
+        return dict(rows)
+
+    def iter_outcomes(self, job_id, batch_size=1000):
+        """Yield (row_index, status, created_at) for a job in row order, read in batches"""
+        self.flush()
+        last = -1
+        while True:
+            rows = self._execute(
+                "SELECT row_index, status, created_at FROM outcomes WHERE job_id = ? AND row_index > ? "
+                "ORDER BY row_index LIMIT ?", (job_id, last, batch_size))
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def outcomes_since(self, since):
+        """Number of rows sent or failed (over all jobs) since `since` (epoch seconds), for quotas"""
+        self.flush()
+        return self._execute("SELECT COUNT(*) FROM outcomes WHERE created_at >= ?", (since,))[0][0]
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Get the shared job journal, opening it on first use"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = JobJournal()
+        return _journal
@@ -0,0 +1,125 @@
+"""
+Log Export Module
+Streams logs and per-row outcome reports as CSV or NDJSON, optionally
+gzip-compressed on the fly, for /api/logs/export and /api/jobs/<id>/report
+- Records come from generators (batched SQLite reads, the upload file read
+  in chunks) and leave as ~64KB byte chunks, so memory stays flat however
+  big the run was and the first bytes go out right away
+- The outcome report walks the original upload, the preflight snapshot and
+  the journal side by side in row order (a merge join), so no side has to
+  be loaded into memory to match rows up
+"""
+import csv
+import io
+import json
+import time
+import zlib
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+LOG_FIELDS = ["id", "timestamp", "status", "to", "subject", "message"]
+REPORT_FIELDS = ["Row", "Outcome", "Outcome At"]
+CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+
+def csv_lines(records, fields):
+    """Header line, then one CSV line per record (a dict; missing fields are left empty)"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    for record in records:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(record)
+        yield buffer.getvalue()
+
+
+def ndjson_lines(records, fields):
+    """One JSON object per line, keys in `fields` order"""
+    for record in records:
+        record = {field: record.get(field, "") for field in fields}
+        yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def encode_chunks(lines, chunk_size=CHUNK_SIZE):
+    """Join text lines into UTF-8 chunks of about chunk_size bytes"""
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(pending).encode("utf-8")
+            pending = []
+            size = 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """Compress a byte stream into a gzip stream as it goes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(records, fields, export_format="csv", compress=False):
+    """
+    Byte chunks of `records` in export_format ('csv' or 'ndjson')
+    Raises ValueError for an unknown format (before anything is read)
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {export_format} (use {' or '.join(FORMATS)})")
+    lines = csv_lines(records, fields) if export_format == "csv" else ndjson_lines(records, fields)
+    chunks = encode_chunks(lines)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(name, export_format, compress=False):
+    """Download filename for an export"""
+    return f"{name}.{export_format}" + (".gz" if compress else "")
+
+
+def report_fields(columns):
+    """Columns of an outcome report: the upload's own columns between Row and the outcome"""
+    return ["Row"] + [column for column in columns if column not in REPORT_FIELDS] + ["Outcome", "Outcome At"]
+
+
+def outcome_report(rows, valid_indexes, outcomes):
+    """
+    Join outcomes back onto the upload, one record per row of the original file
+    - rows: (row_index, row dict) of the original file, in file order
+    - valid_indexes: ascending indexes of the rows that passed preflight
+    - outcomes: ascending (row_index, status, created_at) from the journal
+    Each row gets its file row number, and Outcome: Sent / Failed, Pending
+    (queued but not sent yet) or Skipped (dropped by the preflight check)
+    """
+    valid_indexes = iter(valid_indexes)
+    outcomes = iter(outcomes)
+    next_valid = next(valid_indexes, None)
+    next_outcome = next(outcomes, None)
+    for row_index, row in rows:
+        while next_valid is not None and next_valid < row_index:
+            next_valid = next(valid_indexes, None)
+        while next_outcome is not None and next_outcome[0] < row_index:
+            next_outcome = next(outcomes, None)
+
+        record = dict(row)
+        # +2: header row, 1-based
+        record["Row"] = row_index + 2
+        record["Outcome At"] = ""
+        if next_outcome is not None and next_outcome[0] == row_index:
+            record["Outcome"] = next_outcome[1]
+            record["Outcome At"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(next_outcome[2]))
+        elif next_valid == row_index:
+            record["Outcome"] = "Pending"
+        else:
+            record["Outcome"] = "Skipped"
+        yield record
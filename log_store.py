@@ -0,0 +1,325 @@
+"""
+Log Store Module
+Bounded, indexed storage for email logs
+Recent entries live in an in-memory ring buffer; every entry is also spilled
+in batches to SQLite, indexed by status and recipient, so the logs API can
+page through any run without holding it all in memory
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from send_state import owner_alive, process_owner
+
+LOG_DB = "cache/logs.db"
+DEFAULT_BUFFER_SIZE = 1000
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH_SIZE = 500
+MAX_PAGE_SIZE = 1000
+# While other processes write to the same file, counters are re-read at most this often
+RECOUNT_INTERVAL = 1.0
+# Seconds to wait for another process's write lock, and tries per batch before it is dropped
+BUSY_TIMEOUT = 30
+WRITE_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_logs_status ON logs (status, id);
+CREATE INDEX IF NOT EXISTS idx_logs_recipient ON logs (recipient, id);
+"""
+
+COLUMNS = "id, recipient, subject, status, message, timestamp"
+
+
+def _row_to_entry(row):
+    """Turn a SQLite row back into the log dict shape the dashboard uses"""
+    return {
+        "id": row[0],
+        "to": row[1],
+        "subject": row[2],
+        "status": row[3],
+        "message": row[4],
+        "timestamp": row[5]
+    }
+
+
+class LogStore:
+    """
+    Ring buffer of recent logs plus an on-disk store of every log
+    Entries get an increasing integer id that doubles as the pagination cursor
+    SQLite assigns the ids when the entries are written, so several processes
+    (gunicorn workers, the CLI) can share one file without overwriting each
+    other; each row records the process that wrote it (its source)
+    """
+
+    def __init__(self, db_path=LOG_DB, buffer_size=DEFAULT_BUFFER_SIZE, on_append=None):
+        self.on_append = on_append
+        self.source = process_owner()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None,
+                                     timeout=BUSY_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Log files created before processes shared them lack the source column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(logs)")}
+        if "source" not in columns:
+            self._conn.execute("ALTER TABLE logs ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_source ON logs (source)")
+        self._db_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=buffer_size)
+        self._status_counts = {}
+        self._last_id = 0
+        self._count = 0
+        # Set once another process has written to the file: the ring buffer then
+        # no longer holds every new log, so reads go to disk
+        self._shared = False
+        self._data_version = None
+        self._stale = True
+        self._counted_at = time.monotonic() - RECOUNT_INTERVAL
+        self._sync()
+
+        self._pending = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _writer_loop(self):
+        """Spill queued entries to SQLite in batched transactions"""
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < FLUSH_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                written = self._write_batch(batch)
+            finally:
+                # Always settle the batch, or flush() (and every query) would wait forever
+                for _ in batch:
+                    self._pending.task_done()
+            if written and self.on_append is not None:
+                self.on_append(batch[-1])
+
+    def _write_batch(self, batch):
+        """
+        Insert one batch in a single transaction, returns True once it is stored
+        A failed transaction is rolled back and retried; after WRITE_ATTEMPTS
+        the batch is reported and dropped so the writer keeps running
+        """
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            with self._db_lock:
+                try:
+                    self._conn.execute("BEGIN")
+                    for entry in batch:
+                        entry["id"] = self._conn.execute(
+                            "INSERT INTO logs (recipient, subject, status, message, timestamp, source) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (entry["to"], entry["subject"], entry["status"], entry["message"],
+                             entry["timestamp"], self.source)
+                        ).lastrowid
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error as e:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                    print(f"Log write failed (attempt {attempt} of {WRITE_ATTEMPTS}): {e}")
+                else:
+                    # Still under _db_lock, so a recount can't see these rows and count them again
+                    with self._lock:
+                        self._buffer.extend(batch)
+                        self._count += len(batch)
+                        self._last_id = max(self._last_id, batch[-1]["id"])
+                        for entry in batch:
+                            self._status_counts[entry["status"]] = self._status_counts.get(entry["status"], 0) + 1
+                    return True
+            if attempt < WRITE_ATTEMPTS:
+                time.sleep(attempt)
+        print(f"Dropped {len(batch)} log entries that could not be written")
+        return False
+
+    def _sync(self):
+        """
+        Notice logs written by other processes and keep the counters in step
+        PRAGMA data_version moves whenever another connection commits to the
+        file; the counters are then re-read (at most every RECOUNT_INTERVAL)
+        """
+        with self._db_lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                if self._data_version is not None:
+                    self._shared = True
+                self._data_version = version
+                self._stale = True
+            if self._stale and time.monotonic() - self._counted_at >= RECOUNT_INTERVAL:
+                self._recount()
+
+    def _recount(self):
+        """Re-read the counters from disk (callers hold _db_lock)"""
+        row = self._conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM logs").fetchone()
+        status_counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM logs GROUP BY status"))
+        with self._lock:
+            self._last_id, self._count = row
+            self._status_counts = status_counts
+        self._stale = False
+        self._counted_at = time.monotonic()
+
+    def flush(self):
+        """Block until every entry has been written to disk"""
+        self._pending.join()
+
+    def append(self, log_entry):
+        """
+        Add a log entry, returns it
+        Its id is filled in once the writer has stored it (flush() waits for that)
+        """
+        entry = {
+            "to": str(log_entry.get("to", "")),
+            "subject": str(log_entry.get("subject", "")),
+            "status": str(log_entry.get("status", "")),
+            "message": str(log_entry.get("message", "")),
+            "timestamp": log_entry.get("timestamp") or time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        self._pending.put(entry)
+        return entry
+
+    def count(self):
+        """Total number of logs"""
+        self._sync()
+        with self._lock:
+            return self._count
+
+    def status_counts(self):
+        """Number of logs per status"""
+        self._sync()
+        with self._lock:
+            return dict(self._status_counts)
+
+    def last_id(self):
+        """Id of the newest log (0 when empty)"""
+        self._sync()
+        with self._lock:
+            return self._last_id
+
+    def recent(self, n=5):
+        """Newest n logs, oldest first"""
+        if n <= 0:
+            return []
+        self._sync()
+        if self._shared:
+            return self.query(limit=n)
+        with self._lock:
+            return list(self._buffer)[-n:]
+
+    def query(self, since=None, before=None, status=None, to=None, limit=100):
+        """
+        Cursor-paginated, filtered read
+        - since: entries with id > since, oldest first (follow new logs)
+        - before: entries with id < before, the newest page first (page back)
+        - neither: the newest `limit` entries
+        Results are always returned oldest first
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        # Serve the common "what's new" poll straight from the ring buffer,
+        # unless other processes write to the file too
+        self._sync()
+        if not self._shared and before is None and status is None and to is None:
+            with self._lock:
+                buffered = list(self._buffer)
+                complete = len(buffered) >= self._count
+            oldest_buffered = buffered[0]["id"] if buffered else self._last_id + 1
+            if since is None and (len(buffered) >= limit or complete):
+                return buffered[-limit:]
+            if since is not None and (complete or since >= oldest_buffered - 1):
+                return [entry for entry in buffered if entry["id"] > since][:limit]
+
+        self.flush()
+        conditions = []
+        params = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if to:
+            conditions.append("recipient = ?")
+            params.append(to)
+        if since is not None:
+            conditions.append("id > ?")
+            params.append(int(since))
+        if before is not None:
+            conditions.append("id < ?")
+            params.append(int(before))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "ASC" if since is not None else "DESC"
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT {COLUMNS} FROM logs {where} ORDER BY id {order} LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        entries = [_row_to_entry(row) for row in rows]
+        if order == "DESC":
+            entries.reverse()
+        return entries
+
+    def iter_all(self, status=None, to=None, batch_size=MAX_PAGE_SIZE):
+        """
+        Every log matching the filters, oldest first, for exports
+        Read from disk in id-ordered batches (the lock is only held per batch),
+        so memory stays flat however many logs there are; logs added after
+        the iteration started are left out
+        """
+        self.flush()
+        until = self.last_id()
+        conditions = ["id > ?", "id <= ?"]
+        filters = []
+        if status:
+            conditions.append("status = ?")
+            filters.append(status)
+        if to:
+            conditions.append("recipient = ?")
+            filters.append(to)
+        sql = f"SELECT {COLUMNS} FROM logs WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+        last = 0
+        while True:
+            with self._db_lock:
+                rows = self._conn.execute(sql, [last, until] + filters + [batch_size]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _row_to_entry(row)
+            last = rows[-1][0]
+
+    def clear(self):
+        """
+        Delete the logs of this process and of processes that have exited
+        Logs of another process that is still running are left to it
+        """
+        self.flush()
+        with self._db_lock:
+            sources = [source for (source,) in self._conn.execute("SELECT DISTINCT source FROM logs")]
+            gone = [source for source in sources if source == self.source or not owner_alive(source)]
+            if gone:
+                placeholders = ", ".join("?" for _ in gone)
+                self._conn.execute(f"DELETE FROM logs WHERE source IN ({placeholders})", gone)
+            with self._lock:
+                self._buffer.clear()
+            self._recount()
@@ -1,71 +1,72 @@
-import smtplib
-import pandas as pd
-from email.message import EmailMessage
+"""
+Email Automation CLI
+Command line entry point, using the same send engine and config.json as the dashboard
+
+  python main.py send [data.xlsx] [--sender-name NAME] [--restart]
+                      [--send-at "2026-10-19 09:00"] [--timezone Europe/London]
+      Send a file and wait until it is done (resumes an unfinished run of
+      the same file unless --restart is given); --send-at holds it until then
+
+  python main.py worker [--processes 4] [--threads 4]
+      Run send worker processes for worker mode ("worker_mode": true in
+      config.json): they take rows from the shared queue in cache/queue.db
+      and report progress back to the dashboard
+"""
+import argparse
 import os
-import mimetypes
+import sys
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-SENDER_EMAIL = "ashikulislam2070@gmail.com"
-SENDER_PASSWORD = "srao nyrz zyfk dnoq" 
 
-data = pd.read_excel("data.xlsx")
+def send_command(args):
+    """Send one file in this process"""
+    from campaign_scheduler import parse_send_at
+    from utils import send_bulk_emails
 
-def clean_field(value):
-    if pd.isna(value):
-        return ""
-    return str(value).strip()
+    if not os.path.exists(args.file):
+        print(f"File not found: {args.file}")
+        return 1
+    try:
+        send_at = parse_send_at(args.send_at, args.timezone)
+    except ValueError as e:
+        print(e)
+        return 1
+    ok = send_bulk_emails(args.file, sender_name=args.sender_name, resume=not args.restart, send_at=send_at)
+    return 0 if ok else 1
 
-def send_email(to, cc="", bcc="", subject="", body="", attachment=None):
-    msg = EmailMessage()
-    msg["From"] = SENDER_EMAIL
 
-    to = clean_field(to)
-    cc = clean_field(cc)
-    bcc = clean_field(bcc)
-    subject = clean_field(subject)
+def worker_command(args):
+    """Run queue workers until Ctrl+C"""
+    from config_handler import load_config
+    from send_worker import run_workers
 
-    if not to:
-        print("Skipped: Missing 'To' address.")
-        return
+    threads = args.threads or load_config().get("send_workers", 4)
+    run_workers(processes=args.processes, threads=threads)
+    return 0
 
-    msg["To"] = to
-    if cc:
-        msg["Cc"] = cc
-    if bcc:
-        msg["Bcc"] = bcc
-    msg["Subject"] = subject
-    msg.set_content(str(body))
 
-    if attachment and not pd.isna(attachment):
-        attachment_path = str(attachment).strip()
-        if os.path.exists(attachment_path):
-            mime_type, _ = mimetypes.guess_type(attachment_path)
-            main_type, sub_type = (mime_type.split('/', 1)
-                                   if mime_type else ('application', 'octet-stream'))
-            with open(attachment_path, 'rb') as f:
-                msg.add_attachment(f.read(),
-                                   maintype=main_type,
-                                   subtype=sub_type,
-                                   filename=os.path.basename(attachment_path))
-        else:
-            print(f"Attachment not found: {attachment_path}")
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+
+    send = commands.add_parser("send", help="send a recipient file")
+    send.add_argument("file", nargs="?", default="data.xlsx")
+    send.add_argument("--sender-name", default="")
+    send.add_argument("--restart", action="store_true", help="start over instead of resuming")
+    send.add_argument("--send-at", help='start time, "YYYY-MM-DD HH:MM" or "HH:MM"')
+    send.add_argument("--timezone", default="", help="time zone of --send-at (default: server time)")
+    send.set_defaults(run=send_command)
+
+    worker = commands.add_parser("worker", help="run send worker processes (worker mode)")
+    worker.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    worker.add_argument("--threads", type=int, help="send threads per process (default: send_workers)")
+    worker.set_defaults(run=worker_command)
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return 1
+    return args.run(args)
 
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SENDER_EMAIL, SENDER_PASSWORD)
-            smtp.send_message(msg)
-            print(f"Email sent successfully to: {to}")
-    except Exception as e:
-        print(f"Failed to send to {to}: {e}")
 
-for _, row in data.iterrows():
-    send_email(
-        to=row.get("To", ""),
-        cc=row.get("CC", ""),
-        bcc=row.get("BCC", ""),
-        subject=row.get("Subject", ""),
-        body=row.get("Body", ""),
-        attachment=row.get("Attachment", "")
-    )
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Message Template Module
+Fast per-recipient rendering for template mode
+Subject and Body may contain {Column} placeholders filled from the row.
+Everything that is the same for every recipient (From header, MIME
+structure, encoded attachment) is serialized once, and each message is
+assembled by splicing the recipient's headers and body into those bytes
+"""
+import base64
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from email import policy
+from email.utils import getaddresses
+
+HEADER_POLICY = policy.SMTP
+MAX_TEMPLATES = 256
+# Encoded attachment bytes cached templates may hold, like attachment_cache_mb
+DEFAULT_MAX_TEMPLATE_BYTES = 64 * 1024 * 1024
+MAX_LINE_LENGTH = 998
+FIELD_RE = re.compile(r"\{([^{}]+)\}")
+
+
+class CompiledText:
+    """
+    A Subject/Body string split once into literal text and {Column} fields
+    Only names that are columns of the row get filled in; any other brace
+    text (JSON, a typoed placeholder) is sent exactly as written
+    """
+
+    def __init__(self, text):
+        self.pieces = []
+        position = 0
+        for match in FIELD_RE.finditer(text):
+            if match.start() > position:
+                self.pieces.append((True, text[position:match.start()]))
+            self.pieces.append((False, match.group(1)))
+            position = match.end()
+        if position < len(text):
+            self.pieces.append((True, text[position:]))
+        self.fields = [value for is_literal, value in self.pieces if not is_literal]
+
+    def uses_any(self, columns):
+        """True if any field names one of `columns`"""
+        return any(field in columns for field in self.fields)
+
+    def render(self, values):
+        """Fill in the fields that name a column in values, leave the rest as written"""
+        if not self.fields:
+            return "".join(value for _, value in self.pieces)
+        return "".join(value if is_literal else values.get(value, "{" + value + "}")
+                       for is_literal, value in self.pieces)
+
+
+def fold_header(name, value):
+    """Fold and RFC 2047 encode a header the same way EmailMessage would"""
+    # Short ASCII values need no folding or encoding, skip the header parser
+    if value.isascii() and len(name) + len(value) < 76 and "\r" not in value and "\n" not in value:
+        return f"{name}: {value}\r\n".encode("ascii")
+    header = HEADER_POLICY.header_factory(name, value)
+    return header.fold(policy=HEADER_POLICY).encode("ascii")
+
+
+def encode_body(text):
+    """
+    Encode a text/plain body, returns (content-transfer-encoding, bytes)
+    Plain ASCII with short lines goes out as 7bit, anything else as base64
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if lines and lines[-1] != "":
+        lines.append("")
+    if text.isascii() and all(len(line) <= MAX_LINE_LENGTH for line in lines):
+        return "7bit", "\r\n".join(lines).encode("ascii")
+    encoded = base64.encodebytes("\n".join(lines).encode("utf-8"))
+    return "base64", encoded.replace(b"\n", b"\r\n")
+
+
+class MessageTemplate:
+    """
+    Pre-built message for one (From, Subject, Body, Attachment) combination
+    render() returns the full RFC 5322 bytes for one recipient
+    """
+
+    def __init__(self, from_header, subject, body, attachment_part=None):
+        self.subject = CompiledText(subject)
+        self.body = CompiledText(body)
+        self.invariant_headers = fold_header("From", from_header)
+
+        if attachment_part is not None:
+            self.boundary = "===============" + uuid.uuid4().hex + "=="
+            attachment_bytes = attachment_part.as_bytes(policy=HEADER_POLICY)
+            self.invariant_headers += (
+                b"MIME-Version: 1.0\r\n"
+                b'Content-Type: multipart/mixed; boundary="' + self.boundary.encode("ascii") + b'"\r\n'
+            )
+            self.body_prefix = b"--" + self.boundary.encode("ascii") + b"\r\n"
+            self.suffix = (b"\r\n--" + self.boundary.encode("ascii") + b"\r\n"
+                           + attachment_bytes
+                           + b"\r\n--" + self.boundary.encode("ascii") + b"--\r\n")
+        else:
+            self.boundary = None
+            self.invariant_headers += b"MIME-Version: 1.0\r\n"
+            self.body_prefix = b""
+            self.suffix = b""
+
+    def render(self, values, to, cc=""):
+        """Assemble the message bytes for one recipient"""
+        subject = self.subject.render(values)
+        body = self.body.render(values)
+        cte, body_bytes = encode_body(body)
+        if self.boundary and self.boundary.encode("ascii") in body_bytes:
+            raise ValueError("Body collides with the MIME boundary")
+
+        headers = [self.invariant_headers, fold_header("To", to)]
+        if cc:
+            headers.append(fold_header("Cc", cc))
+        headers.append(fold_header("Subject", subject))
+        body_headers = (b'Content-Type: text/plain; charset="utf-8"\r\n'
+                        b"Content-Transfer-Encoding: " + cte.encode("ascii") + b"\r\n")
+        if self.boundary:
+            # Top-level headers, then the text part inside the multipart body
+            return (b"".join(headers) + b"\r\n" + self.body_prefix
+                    + body_headers + b"\r\n" + body_bytes + self.suffix)
+        return b"".join(headers) + body_headers + b"\r\n" + body_bytes
+
+    def render_subject(self, values):
+        """Rendered subject, used for logging"""
+        return self.subject.render(values)
+
+
+def envelope_recipients(to, cc="", bcc=""):
+    """All RCPT TO addresses for a message (Bcc is never written into the headers)"""
+    return [address for _, address in getaddresses([to, cc, bcc]) if address]
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+_template_bytes = 0
+
+
+def get_message_template(from_header, subject, body, attachment_part=None, attachment_key=None,
+                         max_bytes=DEFAULT_MAX_TEMPLATE_BYTES):
+    """
+    Get a compiled template, building it once per distinct combination
+    attachment_key is the (path, mtime, size) the attachment cache keeps the
+    part under; a part without one was too big to cache, and neither is a
+    template built from it. Cached templates hold at most max_bytes of
+    attachments between them, so they can't get around the attachment cap
+    """
+    global _template_bytes
+    if attachment_part is not None and attachment_key is None:
+        return MessageTemplate(from_header, subject, body, attachment_part)
+    key = (from_header, subject, body, attachment_key)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    template = MessageTemplate(from_header, subject, body, attachment_part)
+    with _templates_lock:
+        if key not in _templates:
+            _templates[key] = template
+            _template_bytes += len(template.suffix)
+            while _templates and (len(_templates) > MAX_TEMPLATES or _template_bytes > max_bytes):
+                _, evicted = _templates.popitem(last=False)
+                _template_bytes -= len(evicted.suffix)
+    return template
@@ -0,0 +1,276 @@
+"""
+Metrics Module
+Low-overhead timing instrumentation for the send path
+Each phase of a send (SMTP connect, TLS, auth, message build, attachment
+I/O, the SMTP transaction itself, rate-limit waits) is timed into a
+fixed-bucket histogram, so recording is a perf_counter call, a bisect and
+a few additions under a lock. Histograms and counters are exported in the
+Prometheus text format on /metrics, and per-job summaries with p50/p95/p99
+estimates are available as JSON
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond message builds up to slow SMTP round trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RATE_WINDOW = 60.0
+MAX_JOB_SUMMARIES = 100
+
+PHASES = ("connect", "tls", "auth", "pool_wait", "build", "attachment", "transfer",
+          "rate_wait", "row_read", "total")
+
+
+class Histogram:
+    """Cumulative-bucket histogram, the shape Prometheus expects"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one value"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(per-bucket counts, sum, count) taken atomically"""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q, snapshot=None):
+        """Estimate a quantile by linear interpolation inside its bucket (like histogram_quantile)"""
+        counts, _, count = snapshot or self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def summary(self):
+        """count, mean and quantiles as a JSON-serializable dict"""
+        snapshot = self.snapshot()
+        _, total, count = snapshot
+        result = {"count": count, "mean": round(total / count, 6) if count else None}
+        for q in QUANTILES:
+            value = self.quantile(q, snapshot)
+            result[f"p{int(q * 100)}"] = round(value, 6) if value is not None else None
+        return result
+
+
+class RateMeter:
+    """Events per second over a sliding window, kept as one counter per second"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._seconds = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, n=1):
+        """Record n events now"""
+        second = int(time.monotonic())
+        with self._lock:
+            if self._seconds and self._seconds[-1][0] == second:
+                self._seconds[-1][1] += n
+            else:
+                self._seconds.append([second, n])
+                self._trim(second)
+
+    def _trim(self, now):
+        """Forget seconds older than the window"""
+        while self._seconds and now - self._seconds[0][0] > self.window:
+            self._seconds.popleft()
+
+    def rate(self):
+        """Events per second over the window"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if not self._seconds:
+                return 0.0
+            elapsed = max(now - self._seconds[0][0], 1.0)
+            return sum(n for _, n in self._seconds) / elapsed
+
+
+class JobMetrics:
+    """Phase histograms and counters for one send job"""
+
+    def __init__(self):
+        self.phases = {}
+        self.counts = {}
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def histogram(self, phase):
+        """The job's histogram for a phase"""
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            with self._lock:
+                histogram = self.phases.setdefault(phase, Histogram())
+        return histogram
+
+    def count(self, status, n=1):
+        """Count finished messages by status"""
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + n
+
+    def summary(self):
+        """Throughput and per-phase latency for the job"""
+        with self._lock:
+            counts = dict(self.counts)
+            phases = dict(self.phases)
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        delivered = counts.get("sent", 0) + counts.get("failed", 0)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(delivered / elapsed, 3) if elapsed > 0 else 0.0,
+            "messages": counts,
+            "phases": {phase: histogram.summary() for phase, histogram in sorted(phases.items())}
+        }
+
+
+class Metrics:
+    """Process-wide registry of send-path metrics"""
+
+    def __init__(self):
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.messages = {}
+        self.rate = RateMeter()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def job(self, job_id):
+        """Per-job metrics, created on first use (only the newest jobs are kept)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = JobMetrics()
+                while len(self._jobs) > MAX_JOB_SUMMARIES:
+                    self._jobs.popitem(last=False)
+            return job
+
+    @contextmanager
+    def for_job(self, job_id):
+        """Attribute the phases timed on this thread to a job"""
+        previous = getattr(self._local, "job", None)
+        self._local.job = self.job(job_id)
+        try:
+            yield
+        finally:
+            self._local.job = previous
+
+    def observe(self, phase, seconds):
+        """Record one phase duration"""
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            with self._lock:
+                histogram = self.phases.setdefault(phase, Histogram())
+        histogram.observe(seconds)
+        job = getattr(self._local, "job", None)
+        if job is not None:
+            job.histogram(phase).observe(seconds)
+
+    @contextmanager
+    def timed(self, phase):
+        """Time the enclosed block as one observation of `phase`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def count_message(self, status, n=1):
+        """Count finished messages by status (sent, failed, retrying)"""
+        if not n:
+            return
+        with self._lock:
+            self.messages[status] = self.messages.get(status, 0) + n
+        if status in ("sent", "failed"):
+            self.rate.mark(n)
+        job = getattr(self._local, "job", None)
+        if job is not None:
+            job.count(status, n)
+
+    def finish_job(self, job_id):
+        """Freeze a job's elapsed time once it has finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and job.finished_at is None:
+            job.finished_at = time.monotonic()
+
+    def job_summary(self, job_id):
+        """Summary for one job, or None if nothing was recorded for it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.summary() if job else None
+
+    def summary(self):
+        """Process-wide summary as JSON"""
+        with self._lock:
+            messages = dict(self.messages)
+            phases = dict(self.phases)
+        return {
+            "messages_per_second": round(self.rate.rate(), 3),
+            "messages": messages,
+            "phases": {phase: histogram.summary() for phase, histogram in phases.items() if histogram.count}
+        }
+
+    def render_prometheus(self, gauges=None):
+        """
+        Prometheus text exposition format (version 0.0.4)
+        gauges: extra {name: (help, value)} sampled by the caller at scrape time
+        """
+        lines = [
+            "# HELP email_send_phase_seconds Time spent in each phase of sending an email",
+            "# TYPE email_send_phase_seconds histogram"
+        ]
+        with self._lock:
+            phases = sorted(self.phases.items())
+            messages = sorted(self.messages.items())
+        for phase, histogram in phases:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'email_send_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'email_send_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {count}')
+            lines.append(f'email_send_phase_seconds_sum{{phase="{phase}"}} {total}')
+            lines.append(f'email_send_phase_seconds_count{{phase="{phase}"}} {count}')
+
+        lines.append("# HELP email_messages_total Emails processed, by outcome")
+        lines.append("# TYPE email_messages_total counter")
+        for status, count in messages:
+            lines.append(f'email_messages_total{{status="{status}"}} {count}')
+
+        lines.append(f"# HELP email_messages_per_second Sent and failed emails per second over the last {int(RATE_WINDOW)}s")
+        lines.append("# TYPE email_messages_per_second gauge")
+        lines.append(f"email_messages_per_second {self.rate.rate()}")
+
+        for name, (help_text, value) in sorted((gauges or {}).items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
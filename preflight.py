@@ -0,0 +1,169 @@
+"""
+Preflight Module
+Vectorized recipient validation run once at upload time
+Works on whole columns with pandas string operations: trims fields, checks
+address syntax, splits multi-address CC/BCC, drops duplicate recipients and
+checks attachment paths and send times, so the send loop only ever sees clean rows
+"""
+import os
+import re
+
+import pandas as pd
+
+from campaign_scheduler import SEND_AT_COLUMN, TIMEZONE_COLUMN, parse_send_at
+
+# Pragmatic RFC 5322 subset: local part, '@', dotted domain with a 2+ letter TLD
+EMAIL_PATTERN = (
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+)
+EMAIL_RE = re.compile(EMAIL_PATTERN)
+ADDRESS_SPLIT_RE = re.compile(r"\s*[,;]\s*")
+
+TEXT_COLUMNS = ["To", "CC", "BCC", "Subject", "Body", "Attachment"]
+ROW_COLUMN = "_row"
+MAX_SAMPLES = 20
+
+
+def new_report():
+    """Empty validation report, filled in chunk by chunk"""
+    return {
+        "total_rows": 0,
+        "valid_rows": 0,
+        "missing_to": 0,
+        "invalid_to": 0,
+        "duplicates": 0,
+        "invalid_cc_bcc": 0,
+        "invalid_send_at": 0,
+        "missing_attachments": 0,
+        "missing_attachment_paths": [],
+        "samples": []
+    }
+
+
+def _normalize_text(series):
+    """Missing values to '', everything else a trimmed string"""
+    return series.fillna("").astype(str).str.strip()
+
+
+def _clean_address_list(series):
+    """
+    Split a CC/BCC column on ',' or ';', keep valid addresses, rejoin with ', '
+    Returns (cleaned column, number of invalid addresses dropped)
+    """
+    parts = series.str.split(ADDRESS_SPLIT_RE).explode()
+    parts = parts[parts != ""]
+    valid = parts.str.fullmatch(EMAIL_PATTERN)
+    invalid_count = int((~valid).sum())
+    joined = parts[valid].groupby(level=0).agg(", ".join)
+    return joined.reindex(series.index, fill_value=""), invalid_count
+
+
+def _invalid_send_times(send_at, zones):
+    """Mask of rows whose 'Send At' (read in their 'Timezone') can't be parsed, each distinct pair parsed once"""
+    checked = {}
+    mask = []
+    for pair in zip(send_at.tolist(), zones.tolist()):
+        if pair not in checked:
+            try:
+                parse_send_at(*pair)
+                checked[pair] = False
+            except ValueError:
+                checked[pair] = True
+        mask.append(checked[pair])
+    return pd.Series(mask, index=send_at.index, dtype=bool)
+
+
+class Preflight:
+    """
+    Chunked, vectorized validator
+    Call run(chunk) for each DataFrame chunk in file order; the state carried
+    between chunks (row offset, seen recipients, attachment checks) makes
+    deduplication and row numbering work across the whole file
+    """
+
+    def __init__(self, columns):
+        self.columns = [column for column in columns if column != ROW_COLUMN]
+        self.report = new_report()
+        self.row_offset = 0
+        self.seen = set()
+        self.attachment_exists = {}
+
+    def _sample(self, rows, reason):
+        """Keep a few example row numbers per problem for the report"""
+        samples = self.report["samples"]
+        for row in rows[:max(0, MAX_SAMPLES - len(samples))]:
+            samples.append({"row": int(row) + 2, "reason": reason})  # +2: header row, 1-based
+
+    def run(self, chunk):
+        """Validate one chunk, returns the clean rows with their original row number"""
+        chunk = chunk.reset_index(drop=True)
+        count = len(chunk)
+        chunk.index = pd.RangeIndex(self.row_offset, self.row_offset + count)
+        self.row_offset += count
+        self.report["total_rows"] += count
+        if count == 0:
+            return chunk.assign(**{ROW_COLUMN: pd.Series(dtype="int64")})
+
+        for column in self.columns:
+            chunk[column] = _normalize_text(chunk[column])
+        for column in TEXT_COLUMNS:
+            if column not in chunk:
+                chunk[column] = ""
+
+        to = chunk["To"]
+        missing = to == ""
+        invalid = ~missing & ~to.str.fullmatch(EMAIL_PATTERN)
+        self.report["missing_to"] += int(missing.sum())
+        self.report["invalid_to"] += int(invalid.sum())
+        self._sample(chunk.index[missing].tolist(), "Missing 'To' address")
+        self._sample(chunk.index[invalid].tolist(), "Invalid 'To' address")
+
+        keep = ~(missing | invalid)
+        # A send time that can't be read would send the row at the wrong moment
+        if SEND_AT_COLUMN in chunk:
+            zones = chunk[TIMEZONE_COLUMN] if TIMEZONE_COLUMN in chunk else pd.Series("", index=chunk.index)
+            bad_time = keep & _invalid_send_times(chunk[SEND_AT_COLUMN], zones)
+            self.report["invalid_send_at"] += int(bad_time.sum())
+            self._sample(chunk.index[bad_time].tolist(), "Invalid 'Send At' time or time zone")
+            keep &= ~bad_time
+
+        # Dedupe on the lowercased address, within the chunk and against earlier chunks
+        # Only rows still kept count: a rejected row must not shadow a later valid one
+        key = to.str.lower()
+        # Plain set lookups: isin() would copy the whole `seen` set for every chunk
+        seen = self.seen
+        seen_before = pd.Series([value in seen for value in key.tolist()], index=key.index)
+        repeated = key[keep].duplicated().reindex(key.index, fill_value=False)
+        duplicate = keep & (repeated | seen_before)
+        self.report["duplicates"] += int(duplicate.sum())
+        self._sample(chunk.index[duplicate].tolist(), "Duplicate recipient")
+        keep &= ~duplicate
+        self.seen.update(key[keep].tolist())
+
+        for column in ("CC", "BCC"):
+            chunk[column], invalid_count = _clean_address_list(chunk[column])
+            self.report["invalid_cc_bcc"] += invalid_count
+
+        # Only unique paths hit the filesystem
+        attachments = chunk["Attachment"]
+        for path in attachments[attachments != ""].unique():
+            if path not in self.attachment_exists:
+                self.attachment_exists[path] = os.path.exists(path)
+                if not self.attachment_exists[path]:
+                    self.report["missing_attachment_paths"].append(path)
+        has_attachment = attachments != ""
+        missing_attachment = has_attachment & ~attachments.map(self.attachment_exists).fillna(False).astype(bool)
+        self.report["missing_attachments"] += int((missing_attachment & keep).sum())
+        chunk.loc[missing_attachment, "Attachment"] = ""
+
+        clean = chunk[keep].copy()
+        clean[ROW_COLUMN] = clean.index
+        self.report["valid_rows"] += len(clean)
+        return clean
+
+    def finish(self):
+        """Final report"""
+        paths = self.report["missing_attachment_paths"]
+        self.report["missing_attachment_paths"] = paths[:MAX_SAMPLES]
+        return self.report
@@ -0,0 +1,161 @@
+"""
+Rate Limiter Module
+Token-bucket rate limiting shared by the concurrent send workers
+Replaces the fixed one second sleep between emails
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Longest single wait in acquire(): quota windows run on the wall clock, which
+# can jump, and callers get a regular chance to re-check cancelled()
+MAX_WAIT = 60.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per `period` seconds, bursting up to `capacity`"""
+
+    def __init__(self, rate, period=1.0, capacity=None):
+        self.rate = float(rate)
+        self.period = float(period)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        """Add the tokens earned since the last refill"""
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate / self.period)
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.period / self.rate
+
+    def consume(self):
+        """Take one token, the caller must have checked wait_time first"""
+        self.tokens -= 1
+
+
+def window_bounds(timestamp, unit):
+    """Start and end (epoch seconds) of the calendar hour or day holding timestamp, in server local time"""
+    start = datetime.fromtimestamp(timestamp).replace(minute=0, second=0, microsecond=0)
+    if unit == "day":
+        start = start.replace(hour=0)
+        end = start + timedelta(days=1)
+    else:
+        end = start + timedelta(hours=1)
+    return start.timestamp(), end.timestamp()
+
+
+class QuotaWindow:
+    """
+    At most `limit` sends per calendar hour or day (a provider's daily cap)
+    Unlike a token bucket nothing trickles back: the whole quota returns when
+    the next window starts. Works on the wall clock, not the monotonic one
+    """
+
+    def __init__(self, limit, unit="day", used=0):
+        self.limit = int(limit)
+        self.unit = unit
+        self.start, self.end = window_bounds(time.time(), unit)
+        self.used = used
+
+    def wait_time(self, now):
+        """Seconds until the quota allows a send (0 if it does now); `now` is ignored"""
+        wall = time.time()
+        if not self.start <= wall < self.end:
+            self.start, self.end = window_bounds(wall, self.unit)
+            self.used = 0
+        if self.used < self.limit:
+            return 0.0
+        return self.end - wall
+
+    def consume(self):
+        """Count one send against the current window"""
+        self.used += 1
+
+    def stats(self):
+        """Usage of the current window"""
+        return {
+            "limit": self.limit,
+            "used": self.used,
+            "resets_in": round(max(0.0, self.end - time.time()))
+        }
+
+
+class RateLimiter:
+    """
+    Combined per-second and per-minute limiter, with optional hourly and daily quotas
+    A limit of 0 (or None) disables that bucket
+    sent_since(epoch seconds) returns how many messages already went out since
+    then, so a restart or a settings change doesn't hand out a quota twice
+    """
+
+    def __init__(self, per_second=None, per_minute=None, per_hour=None, per_day=None, sent_since=None):
+        self.buckets = []
+        if per_second:
+            self.buckets.append(TokenBucket(per_second, 1.0))
+        if per_minute:
+            # Allow at most one second's worth of burst against the minute bucket
+            self.buckets.append(TokenBucket(per_minute, 60.0, capacity=max(1.0, per_minute / 60.0)))
+        self.quotas = {}
+        for unit, limit in (("hour", per_hour), ("day", per_day)):
+            if limit:
+                quota = QuotaWindow(limit, unit)
+                if sent_since is not None:
+                    quota.used = sent_since(quota.start)
+                self.quotas[unit] = quota
+                self.buckets.append(quota)
+        self._lock = threading.Lock()
+        # Waiting acquire() calls sleep here; wake() bumps the generation and notifies
+        self._wakeup = threading.Condition()
+        self._generation = 0
+
+    def try_acquire(self):
+        """Take a token from every bucket, returns seconds to wait if not possible yet"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max([bucket.wait_time(now) for bucket in self.buckets] or [0.0])
+            if wait > 0:
+                return wait
+            for bucket in self.buckets:
+                bucket.consume()
+            return 0.0
+
+    def acquire(self, cancelled=None, max_wait=MAX_WAIT):
+        """
+        Block until a send is allowed
+        Returns False if `cancelled()` became true while waiting
+        Sleeps on a condition until the next token is due (for a used-up quota,
+        until its window resets) instead of polling; wake() cuts the wait short
+        so a stop is seen right away, and cancelled() is re-checked at least
+        every max_wait seconds
+        """
+        while True:
+            generation = self._generation
+            if cancelled is not None and cancelled():
+                return False
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            with self._wakeup:
+                # A wake() since cancelled() was checked means it must be checked again
+                if generation == self._generation:
+                    self._wakeup.wait(min(wait, max_wait))
+
+    def wake(self):
+        """Wake every waiting acquire() to re-check cancelled(), e.g. after a stop request"""
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def quota_stats(self):
+        """
+        Usage of the hourly/daily quotas, keyed by 'hour' and 'day'
+        Read without the lock the send workers take: a count can be one send behind
+        """
+        return {unit: quota.stats() for unit, quota in self.quotas.items()}
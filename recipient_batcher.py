@@ -0,0 +1,105 @@
+"""
+Recipient Batcher Module
+Groups rows that would produce the same message into one SMTP transaction
+When a campaign is not personalized, every row with the same Subject, Body
+and Attachment gets byte-identical content, so it can be delivered once with
+several RCPT TO commands instead of one MAIL/RCPT/DATA round per row.
+Grouping can also be split by recipient domain, so each transaction only
+targets one receiving mail server
+"""
+from collections import OrderedDict
+
+DEFAULT_MAX_RECIPIENTS = 50
+DEFAULT_WINDOW = 1000
+
+# Header shown to batched recipients, who must not see each other's addresses
+BATCH_TO_HEADER = "undisclosed-recipients:;"
+
+
+class RecipientBatch:
+    """Rows sharing one message, delivered in a single transaction"""
+
+    def __init__(self, key):
+        self.key = key
+        self.row_indexes = []
+        self.rows = []
+
+    def add(self, row_index, row):
+        self.row_indexes.append(row_index)
+        self.rows.append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def recipients(self):
+        """Envelope recipients, one per row"""
+        return [row.get("To", "") for row in self.rows]
+
+
+def recipient_domain(address):
+    """Lowercased domain part of an address"""
+    return address.rpartition("@")[2].lower()
+
+
+def batch_key(row, by_domain=False):
+    """
+    Key that is equal for rows producing identical messages
+    Rows with CC or BCC are never batched: their headers differ per row
+    Scheduled rows only batch with rows due at the same time
+    """
+    if row.get("CC") or row.get("BCC"):
+        return None
+    key = (row.get("Subject", ""), row.get("Body", ""), row.get("Attachment", ""))
+    if row.get("Send At"):
+        key += (row.get("Send At"), row.get("Timezone", ""))
+    if by_domain:
+        key += (recipient_domain(row.get("To", "")),)
+    return key
+
+
+def batch_rows(rows, max_recipients=DEFAULT_MAX_RECIPIENTS, window=DEFAULT_WINDOW,
+               by_domain=False, batchable=None):
+    """
+    Regroup a stream of (row_index, row) into delivery units
+    - Unbatchable rows, and groups that end up with a single row, come out
+      unchanged as (row_index, row)
+    - Groups come out as (tuple of row indexes, RecipientBatch)
+    Only `window` rows are held back at a time, so memory stays bounded; a
+    group is emitted as soon as it reaches max_recipients, and the oldest
+    groups are flushed when the window is full
+    batchable(row) can veto batching, e.g. for rows with personalized placeholders
+    """
+    max_recipients = max(1, int(max_recipients))
+    window = max(max_recipients, int(window))
+    groups = OrderedDict()
+    buffered = 0
+
+    def emit(batch):
+        if len(batch) == 1:
+            return batch.row_indexes[0], batch.rows[0]
+        return tuple(batch.row_indexes), batch
+
+    for row_index, row in rows:
+        key = batch_key(row, by_domain) if max_recipients > 1 else None
+        if key is None or (batchable is not None and not batchable(row)):
+            yield row_index, row
+            continue
+
+        batch = groups.get(key)
+        if batch is None:
+            batch = groups[key] = RecipientBatch(key)
+        batch.add(row_index, row)
+        buffered += 1
+
+        if len(batch) >= max_recipients:
+            del groups[key]
+            buffered -= len(batch)
+            yield emit(batch)
+        while buffered >= window:
+            _, oldest = groups.popitem(last=False)
+            buffered -= len(oldest)
+            yield emit(oldest)
+
+    for batch in groups.values():
+        yield emit(batch)
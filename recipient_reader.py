@@ -0,0 +1,110 @@
+"""
+Recipient Reader Module
+Streams recipient rows out of Excel/CSV files without loading the whole
+file into a DataFrame, so memory stays flat regardless of list size
+Spreadsheets are read with python-calamine (Rust) when it is installed,
+which is several times faster than openpyxl and also covers legacy .xls
+"""
+import pandas as pd
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+CSV_CHUNK_SIZE = 5000
+
+
+def is_csv(file_path):
+    """Check if the file should be parsed as CSV"""
+    return file_path.lower().endswith('.csv')
+
+
+def is_xlsx(file_path):
+    """Check if the file can be streamed (openpyxl read-only mode, or calamine which also reads .xls)"""
+    extensions = ('.xlsx', '.xlsm', '.xls') if CalamineWorkbook is not None else ('.xlsx', '.xlsm')
+    return file_path.lower().endswith(extensions)
+
+
+def _header_names(values):
+    """Turn a raw header row into column names the way pandas would"""
+    columns = []
+    for i, value in enumerate(values):
+        if value is None or str(value).strip() == '':
+            columns.append(f"Unnamed: {i}")
+        else:
+            columns.append(str(value))
+    return columns
+
+
+def _calamine_value(value):
+    """Match openpyxl's cell values: empty cells are None, whole numbers are ints"""
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_calamine_rows(file_path):
+    """Yield raw value tuples from the first sheet with calamine, skipping blank rows"""
+    sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+    # calamine drops leading empty columns; pad them back so column positions match openpyxl
+    padding = (None,) * sheet.start[1] if sheet.start else ()
+    for values in sheet.iter_rows():
+        values = padding + tuple(_calamine_value(value) for value in values)
+        if any(value is not None for value in values):
+            yield values
+
+
+def _iter_xlsx_rows(file_path):
+    """Yield raw value tuples from the first sheet, skipping blank rows"""
+    if CalamineWorkbook is not None:
+        yield from _iter_calamine_rows(file_path)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for values in sheet.iter_rows(values_only=True):
+            if any(value is not None for value in values):
+                yield values
+    finally:
+        workbook.close()
+
+
+def _frames_from_rows(rows, columns, chunksize):
+    """Group raw value tuples into DataFrames, without building a dict per row"""
+    width = len(columns)
+    batch = []
+    for values in rows:
+        if len(values) != width:
+            values = tuple(values[:width]) + (None,) * (width - len(values))
+        batch.append(values)
+        if len(batch) >= chunksize:
+            yield pd.DataFrame(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns)
+
+
+def read_frames(file_path, chunksize=CSV_CHUNK_SIZE):
+    """
+    Read a file in one pass as (columns, iterator of DataFrame chunks)
+    Spreadsheets are opened once, since every open parses the whole sheet
+    """
+    if is_csv(file_path):
+        columns = pd.read_csv(file_path, nrows=0).columns.tolist()
+        return columns, iter(pd.read_csv(file_path, chunksize=chunksize))
+    if is_xlsx(file_path):
+        rows = _iter_xlsx_rows(file_path)
+        header = next(rows, None)
+        if header is None:
+            return [], iter(())
+        columns = _header_names(header)
+        return columns, _frames_from_rows(rows, columns, chunksize)
+    data = pd.read_excel(file_path)
+    return data.columns.tolist(), (data.iloc[i:i + chunksize] for i in range(0, len(data), chunksize))
+
@@ -0,0 +1,148 @@
+"""
+Retry Queue Module
+Delayed retries for transient SMTP failures
+Reply codes are classified as transient (4xx, dropped connections: worth
+another try later, e.g. greylisting or provider throttling) or permanent
+(5xx: retrying won't help). Transient failures wait in a heap ordered by
+due time and are re-sent with jittered exponential backoff by a small
+pool of retry threads, separate from the main send workers
+"""
+import heapq
+import itertools
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 30.0
+DEFAULT_MAX_DELAY = 1800.0
+DEFAULT_WORKERS = 2
+
+
+def is_transient_code(code):
+    """4xx SMTP replies are transient, everything else is final"""
+    return 400 <= int(code) < 500
+
+
+def classify_error(error):
+    """'transient' or 'permanent' for an exception raised while sending"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return "transient" if codes and all(is_transient_code(code) for code in codes) else "permanent"
+    if isinstance(error, smtplib.SMTPResponseException):
+        return "transient" if is_transient_code(error.smtp_code) else "permanent"
+    if isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)):
+        return "transient"
+    if isinstance(error, smtplib.SMTPException):
+        return "permanent"
+    # Socket-level errors (DNS, refused, reset) are worth another try
+    return "transient" if isinstance(error, OSError) else "permanent"
+
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """
+    Delay before retry number `attempt` (1-based)
+    Exponential backoff with "equal jitter": half the capped delay is fixed,
+    the other half random, so retries for many rows don't all land at once
+    """
+    capped = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return capped / 2 + random.uniform(0, capped / 2)
+
+
+class RetryEntry:
+    """One row waiting for its next attempt"""
+
+    def __init__(self, job, row_index, row, attempt, error):
+        self.job = job
+        self.row_index = row_index
+        self.row = row
+        self.attempt = attempt
+        self.error = error
+        self.due_at = 0.0
+
+
+class RetryQueue:
+    """
+    Heap of rows waiting to be re-sent
+    - schedule(entry, delay) queues a row; a dispatcher thread sleeps until
+      the earliest due time and hands due rows to the retry workers
+    - resend(entry) does the actual send and is responsible for scheduling
+      the next attempt or recording the final outcome
+    - on_cancel(entry) is called for rows dropped by cancel()
+    """
+
+    def __init__(self, resend, on_cancel=None, workers=DEFAULT_WORKERS):
+        self.resend = resend
+        self.on_cancel = on_cancel
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)),
+                                            thread_name_prefix="retry-worker")
+        self._running = 0
+        self.scheduled = 0
+        self.retried = 0
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="retry-dispatcher")
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def schedule(self, entry, delay):
+        """Queue a row to be re-sent after `delay` seconds"""
+        entry.due_at = time.monotonic() + delay
+        with self._cond:
+            heapq.heappush(self._heap, (entry.due_at, next(self._counter), entry))
+            self.scheduled += 1
+            self._cond.notify()
+
+    def _dispatch_loop(self):
+        """Wait for the earliest due row and hand it to a retry worker"""
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, entry = heapq.heappop(self._heap)
+                self._running += 1
+            self._executor.submit(self._run, entry)
+
+    def _run(self, entry):
+        try:
+            self.resend(entry)
+        except Exception as e:
+            print(f"Retry worker error on job {entry.job.id}: {e}")
+        finally:
+            with self._cond:
+                self._running -= 1
+                self.retried += 1
+
+    def cancel(self, job_id=None):
+        """Drop the waiting rows of one job (or of every job), returns how many were dropped"""
+        with self._cond:
+            dropped = [item[2] for item in self._heap if job_id is None or item[2].job.id == job_id]
+            self._heap = [item for item in self._heap if job_id is not None and item[2].job.id != job_id]
+            heapq.heapify(self._heap)
+        for entry in dropped:
+            if self.on_cancel is not None:
+                self.on_cancel(entry)
+        return len(dropped)
+
+    def pending(self, job_id=None):
+        """Rows waiting for a retry or being retried right now"""
+        with self._cond:
+            if job_id is None:
+                return len(self._heap) + self._running
+            return sum(1 for item in self._heap if item[2].job.id == job_id)
+
+    def stats(self):
+        """Queue counters"""
+        with self._cond:
+            return {
+                "pending": len(self._heap),
+                "running": self._running,
+                "scheduled": self.scheduled,
+                "retried": self.retried,
+                "next_due_in": round(max(0.0, self._heap[0][0] - time.monotonic()), 1) if self._heap else None
+            }
@@ -0,0 +1,248 @@
+"""
+Send State Module
+Progress counters the send workers write and the dashboard reads, without
+the two ever waiting on each other
+- ShardedCounter: one slot per worker thread; increments touch only the
+  caller's own slot, reads sum the slots
+- StatusBoard: a small memory-mapped file (cache/status.mmap) where each
+  process publishes its send totals a few times a second, so any process
+  (e.g. several gunicorn workers, or send worker processes) can read the
+  combined progress. Each slot is written under a sequence number
+  (seqlock): readers retry instead of locking
+- process_owner / owner_alive: which process wrote a shared record (a log,
+  a journaled job), and whether that process is still running
+"""
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+
+STATUS_BOARD_PATH = "cache/status.mmap"
+PUBLISH_INTERVAL = 0.5
+# A slot not refreshed for this long belongs to a process that has gone away
+STALE_AFTER = 10.0
+
+BOARD_SLOTS = 64
+# seq, pid, active_jobs, total, sent, failed, retry_pending, updated_at
+SLOT_FORMAT = struct.Struct("<qqqqqqqd")
+BOARD_MAGIC = 0x53454E44535441  # "SENDSTA"
+HEADER_FORMAT = struct.Struct("<qq")  # magic, slot count
+FIELDS = ("active_jobs", "total", "sent", "failed", "retry_pending")
+# Windows: OpenProcess access right, GetExitCodeProcess code of a running process, access denied
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+
+def process_owner():
+    """Owner tag of the calling process, as host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def pid_alive(pid):
+    """True if a process with this pid is running on this host"""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_alive(owner):
+    """
+    True if the process behind an owner tag may still be running
+    Processes on other hosts can't be checked and count as running;
+    an empty tag (records written before owners were kept) counts as gone
+    """
+    host, _, pid = (owner or "").rpartition(":")
+    if not host or not pid.isdigit():
+        return False
+    if host != socket.gethostname():
+        return True
+    return pid_alive(int(pid))
+
+
+class ShardedCounter:
+    """
+    Counter with one slot per thread
+    Each slot has a single writer (its thread), so add() needs no lock;
+    value sums all slots and may be a moment behind a concurrent add()
+    """
+
+    def __init__(self, initial=0):
+        self._base = initial
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        """Add n from the calling thread"""
+        if not n:
+            return
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [0]
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        shard[0] += n
+
+    @property
+    def value(self):
+        """Current total across all threads"""
+        return self._base + sum(shard[0] for shard in list(self._shards))
+
+
+class StatusBoard:
+    """Per-process send totals in a shared memory-mapped file"""
+
+    def __init__(self, path=STATUS_BOARD_PATH, slots=BOARD_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.pid = os.getpid()
+        self._slot = None
+        self._seq = 0
+        self._map = self._open()
+
+    def _open(self):
+        size = HEADER_FORMAT.size + self.slots * SLOT_FORMAT.size
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            board = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, slots = HEADER_FORMAT.unpack_from(board, 0)
+        if magic != BOARD_MAGIC or slots != self.slots:
+            board[:] = bytes(size)
+            HEADER_FORMAT.pack_into(board, 0, BOARD_MAGIC, self.slots)
+        return board
+
+    def _offset(self, slot):
+        return HEADER_FORMAT.size + slot * SLOT_FORMAT.size
+
+    def _read_slot(self, slot, attempts=5):
+        """Consistent copy of one slot, or None if a writer kept it busy"""
+        offset = self._offset(slot)
+        for _ in range(attempts):
+            values = SLOT_FORMAT.unpack_from(self._map, offset)
+            if values[0] % 2 == 0 and SLOT_FORMAT.unpack_from(self._map, offset)[0] == values[0]:
+                return values
+        return None
+
+    def _claim_slot(self):
+        """
+        Take a free or stale slot, starting from one derived from the pid
+        A slot is free when it has never been used or its owner stopped refreshing it
+        """
+        now = time.time()
+        for i in range(self.slots):
+            slot = (self.pid + i) % self.slots
+            values = self._read_slot(slot)
+            if values is None:
+                continue
+            _, pid, *_, updated_at = values
+            if pid in (0, self.pid) or now - updated_at > STALE_AFTER:
+                self._seq = values[0]
+                return slot
+        return None
+
+    def publish(self, totals):
+        """Write this process's totals (dict with FIELDS) to its slot"""
+        if self._slot is not None:
+            # Two processes can race for the same free slot; the one that lost moves on
+            values = self._read_slot(self._slot)
+            if values is not None and values[1] not in (0, self.pid):
+                self._slot = None
+        if self._slot is None:
+            self._slot = self._claim_slot()
+            if self._slot is None:
+                return False
+        offset = self._offset(self._slot)
+        # Odd sequence = write in progress; readers retry until it is even again
+        self._seq += 1
+        struct.pack_into("<q", self._map, offset, self._seq)
+        SLOT_FORMAT.pack_into(self._map, offset, self._seq, self.pid,
+                              *(int(totals.get(field, 0)) for field in FIELDS), time.time())
+        self._seq += 1
+        struct.pack_into("<q", self._map, offset, self._seq)
+        return True
+
+    def read_others(self):
+        """Totals published by other live processes, one dict per process"""
+        now = time.time()
+        others = []
+        for slot in range(self.slots):
+            if slot == self._slot:
+                continue
+            values = self._read_slot(slot)
+            if values is None:
+                continue
+            _, pid, *counts, updated_at = values
+            if pid and pid != self.pid and now - updated_at <= STALE_AFTER:
+                entry = dict(zip(FIELDS, counts))
+                entry["pid"] = pid
+                others.append(entry)
+        return others
+
+    def close(self):
+        """Unmap the board file"""
+        self._map.close()
+
+
+class StatusPublisher:
+    """Background thread copying this process's totals to the status board"""
+
+    def __init__(self, get_totals, board=None, interval=PUBLISH_INTERVAL):
+        self.get_totals = get_totals
+        self.board = board
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start publishing (idempotent); does nothing when the board can't be opened"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.board is None:
+                try:
+                    self.board = StatusBoard()
+                except (OSError, ValueError) as e:
+                    print(f"Shared status board unavailable: {e}")
+                    return
+            self._thread = threading.Thread(target=self._run, name="status-publisher")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.board.publish(self.get_totals())
+            except Exception as e:
+                print(f"Status publish failed: {e}")
+            time.sleep(self.interval)
+
+    def others(self):
+        """Totals of the other processes, [] until publishing has started"""
+        return self.board.read_others() if self.board is not None else []
@@ -0,0 +1,259 @@
+"""
+Send Worker Module
+Worker processes that take send shards from the work queue (worker mode)
+Each process runs a few send threads on its own SMTP pool and rate limiter,
+so MIME building, attachment encoding and TLS are spread over several cores
+instead of competing with the dashboard for one GIL
+- Rows already journaled (a shard taken over from a dead worker) are skipped
+- Transient failures go back on the queue as delayed single-row shards
+- Log entries are forwarded to the dashboard through the queue
+Start with: python main.py worker --processes 4
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from config_handler import load_config
+from job_scheduler import SendJob
+from job_store import get_journal
+from metrics import metrics
+from rate_limiter import RateLimiter
+from work_queue import WorkQueue, decode_unit, encode_unit, unit_indexes
+
+IDLE_POLL_INTERVAL = 0.5
+REPORT_INTERVAL = 1.0
+STATUS_CHECK_INTERVAL = 1.0
+LOG_FLUSH_INTERVAL = 0.5
+
+
+class QueuedJob(SendJob):
+    """A job as seen by a worker process: its stop flag follows the queue status"""
+
+    def __init__(self, queue, job_id, filepath, sender_name, total):
+        super().__init__(job_id, filepath, sender_name, total, iter(()))
+        self.queue = queue
+        self._checked_at = 0.0
+
+    def refresh(self):
+        """Re-read the queue status at most once per STATUS_CHECK_INTERVAL"""
+        now = time.monotonic()
+        if now - self._checked_at >= STATUS_CHECK_INTERVAL:
+            self._checked_at = now
+            if self.queue.job_status(self.id) != "running":
+                self.should_stop = True
+        return not self.should_stop
+
+    def defer_retry(self, row_index, row, attempt, delay):
+        """Retry hook used by utils.schedule_retry: put the row back on the queue"""
+        self.queue.defer(self.id, encode_unit(row_index, row), attempt, delay)
+
+
+class QueuedLogSink:
+    """Stands in for the email log store in a worker: entries are forwarded to the dashboard"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def flush(self):
+        """Send buffered entries to the queue"""
+        with self._lock:
+            entries, self._entries = self._entries, []
+        self.queue.add_events(entries)
+
+
+class Worker:
+    """One worker process: `threads` send threads sharing a queue connection and rate limiter"""
+
+    def __init__(self, threads=4, processes=1, queue=None):
+        import utils
+
+        self.utils = utils
+        self.threads = max(1, int(threads))
+        self.queue = queue or WorkQueue()
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+
+        config = load_config()
+        # The configured rates and quotas are for the whole deployment; each process gets its share
+        per_second = config.get("rate_per_second", 1)
+        per_minute = config.get("rate_per_minute", 0)
+        per_hour = config.get("quota_per_hour", 0)
+        per_day = config.get("quota_per_day", 0)
+        self.limiter = RateLimiter(per_second=per_second / processes if per_second else per_second,
+                                   per_minute=per_minute / processes if per_minute else per_minute,
+                                   per_hour=max(1, per_hour // processes) if per_hour else per_hour,
+                                   per_day=max(1, per_day // processes) if per_day else per_day,
+                                   sent_since=lambda since: get_journal().outcomes_since(since) // processes)
+
+        # Logs go to the dashboard through the queue instead of this process's own store
+        self.logs = QueuedLogSink(self.queue)
+        utils.email_logs = self.logs
+
+    def _job(self, info):
+        """Get the QueuedJob for a claimed shard's job"""
+        with self._jobs_lock:
+            job = self._jobs.get(info["job_id"])
+            if job is None or job.should_stop:
+                job = QueuedJob(self.queue, info["job_id"], info["filepath"],
+                                info["sender_name"], info["total"])
+                self._jobs[job.id] = job
+            return job
+
+    def run(self):
+        """Run the send threads until stop() is called"""
+        print(f"Worker {self.name} started with {self.threads} send threads")
+        threads = [threading.Thread(target=self._send_loop, args=(index,), name=f"queue-worker-{index}")
+                   for index in range(self.threads)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            while not self.stopping.wait(LOG_FLUSH_INTERVAL):
+                self.logs.flush()
+        except KeyboardInterrupt:
+            self.stop()
+        for thread in threads:
+            thread.join()
+        get_journal().flush()
+        self.logs.flush()
+        self.utils.close_transport()
+        print(f"Worker {self.name} stopped")
+
+    def stop(self):
+        """Finish the current row in every thread, hand unsent rows back and exit"""
+        self.stopping.set()
+        self.limiter.wake()
+
+    def _send_loop(self, index):
+        worker_id = f"{self.name}:{index}"
+        while not self.stopping.is_set():
+            claimed = self.queue.claim(worker_id)
+            if claimed is None:
+                self.stopping.wait(IDLE_POLL_INTERVAL)
+                continue
+            shard_id, info, attempt, units = claimed
+            try:
+                self._run_shard(worker_id, shard_id, self._job(info), attempt, units)
+            except Exception as e:
+                # The shard stays claimed and is picked up again once its lease runs out
+                print(f"Worker {worker_id} failed on shard {shard_id}: {e}")
+
+    def _run_shard(self, worker_id, shard_id, job, attempt, units):
+        """Send a shard's units, reporting progress back to the queue as it goes"""
+        # Rows with an outcome were sent by a worker that died before reporting them
+        recorded = get_journal().recorded_outcomes(job.id, [i for unit in units for i in unit_indexes(unit)])
+        remaining = []
+        sent = failed = 0
+        for unit in units:
+            statuses = [recorded.get(i) for i in unit_indexes(unit)]
+            if None in statuses:
+                remaining.append(unit)
+            else:
+                sent += statuses.count("Sent")
+                failed += len(statuses) - statuses.count("Sent")
+        reported_at = time.monotonic()
+        # The lease is renewed by every report, and while waiting on the limiter (a
+        # used-up quota can take hours) so no other worker takes the shard over meanwhile
+        renew_every = self.queue.lease_seconds / 3
+        lease = {"renewed_at": reported_at, "lost": False}
+
+        def cancelled():
+            """Stop waiting on the limiter if stopping or the shard was lost, renewing the lease meanwhile"""
+            if self.stopping.is_set() or not job.refresh():
+                return True
+            if time.monotonic() - lease["renewed_at"] >= renew_every:
+                if not self.queue.renew(shard_id, worker_id):
+                    lease["lost"] = True
+                    return True
+                lease["renewed_at"] = time.monotonic()
+            return False
+
+        while remaining:
+            if self.stopping.is_set() or not job.refresh():
+                get_journal().flush()
+                self.queue.report(shard_id, worker_id, job.id, remaining, sent, failed, release=True)
+                return
+            row_index, row = decode_unit(remaining[0])
+            size = len(row_index) if isinstance(row_index, tuple) else 1
+            with metrics.for_job(job.id):
+                with metrics.timed("rate_wait"):
+                    allowed = all(self.limiter.acquire(cancelled=cancelled, max_wait=renew_every)
+                                  for _ in range(size))
+                if lease["lost"]:
+                    # Unsent: remaining[0] now belongs to the worker that took the shard over
+                    get_journal().flush()
+                    print(f"Worker {worker_id} lost shard {shard_id}, leaving it to its new owner")
+                    return
+                if not allowed:
+                    continue
+                with metrics.timed("total"):
+                    if isinstance(row_index, tuple):
+                        result = self.utils.send_batch(job, row_index, row)
+                    else:
+                        result = self.utils.deliver_row(job, row_index, row, attempt)
+            # None: the row went back on the queue as a delayed retry
+            if isinstance(result, tuple):
+                sent += result[0]
+                failed += result[1]
+            elif result:
+                sent += 1
+            elif result is not None:
+                failed += 1
+            remaining.pop(0)
+
+            if time.monotonic() - reported_at >= REPORT_INTERVAL:
+                # Outcomes are journaled before the rows leave the shard
+                get_journal().flush()
+                if not self.queue.report(shard_id, worker_id, job.id, remaining, sent, failed):
+                    print(f"Worker {worker_id} lost shard {shard_id}, leaving it to its new owner")
+                    return
+                sent = failed = 0
+                reported_at = lease["renewed_at"] = time.monotonic()
+
+        get_journal().flush()
+        self.queue.report(shard_id, worker_id, job.id, remaining, sent, failed)
+
+
+def worker_main(threads, processes):
+    """Entry point of one worker process"""
+    worker = Worker(threads=threads, processes=processes)
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+    worker.run()
+
+
+def run_workers(processes=1, threads=4):
+    """Start `processes` worker processes and wait for them (Ctrl+C stops them cleanly)"""
+    if processes <= 1:
+        worker_main(threads, 1)
+        return
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=worker_main, args=(threads, processes), name=f"send-worker-{i}")
+                for i in range(processes)]
+    for child in children:
+        child.start()
+
+    def stop_children(*args):
+        # SIGTERM makes each child hand its shards back before exiting
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, stop_children)
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        stop_children()
+        for child in children:
+            child.join()
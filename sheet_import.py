@@ -0,0 +1,133 @@
+"""
+Sheet Import Module
+Downloads public Google Sheets as CSV for the dashboard
+- Downloads stream to disk in chunks over a pooled requests.Session,
+  hashing the bytes as they arrive
+- Repeat imports send If-None-Match / If-Modified-Since, so an unchanged
+  sheet costs a 304 and reuses the file already on disk
+- Files are named by content hash, so identical exports share one file
+  (and one cached parse) instead of piling up timestamped copies
+- requests is imported when the first fetcher is created, not at app startup
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from upload_cache import remember_file_hash
+
+SHEET_INDEX = "cache/sheets.json"
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = (10, 60)  # (connect, read) seconds
+
+
+def sheet_csv_url(sheet_url):
+    """Convert a Google Sheets share/edit link to its CSV export URL"""
+    if '/edit' in sheet_url:
+        sheet_url = sheet_url.split('/edit')[0]
+    return f"{sheet_url}/export?format=csv"
+
+
+class SheetFetcher:
+    """
+    Conditional, streaming sheet downloader
+    Keeps a small index (export URL -> ETag, Last-Modified, local file) in
+    cache/sheets.json so validators survive restarts
+    """
+
+    def __init__(self, upload_folder, index_path=SHEET_INDEX, session=None):
+        self.upload_folder = upload_folder
+        self.index_path = index_path
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        """Write the index atomically (temp file + rename)"""
+        directory = os.path.dirname(self.index_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".sheets-", suffix=".json", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _url_lock(self, url):
+        """One download per sheet at a time; different sheets download in parallel"""
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def fetch(self, sheet_url):
+        """
+        Download a sheet unless the cached copy is still current
+        Returns (filepath, changed) where changed is False when the cached file was reused
+        """
+        csv_url = sheet_csv_url(sheet_url)
+        with self._url_lock(csv_url):
+            with self._lock:
+                entry = self._index.get(csv_url)
+            if entry and not os.path.exists(entry["filepath"]):
+                entry = None
+
+            headers = {}
+            if entry and entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry and entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+            with self.session.get(csv_url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code == 304 and entry:
+                    return entry["filepath"], False
+                response.raise_for_status()
+                filepath, digest = self._stream_to_disk(response)
+
+            with self._lock:
+                self._index[csv_url] = {
+                    "filepath": filepath,
+                    "hash": digest,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+                self._save_index()
+            return filepath, not entry or entry.get("hash") != digest
+
+    def _stream_to_disk(self, response):
+        """Write the body in chunks while hashing it, returns (content-addressed path, sha256)"""
+        os.makedirs(self.upload_folder, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(prefix=".sheet-", suffix=".part", dir=self.upload_folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        hexdigest = digest.hexdigest()
+        filepath = os.path.join(self.upload_folder, f"google_sheet_{hexdigest[:16]}.csv")
+        if os.path.exists(filepath):
+            # Same content as an earlier import: keep the existing file (and its cached parse)
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, filepath)
+        remember_file_hash(filepath, hexdigest)
+        return filepath, hexdigest
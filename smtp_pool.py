@@ -0,0 +1,276 @@
+"""
+SMTP Connection Pool Module
+Keeps authenticated SMTP sessions open between messages so a bulk send
+pays for the TCP connect, STARTTLS handshake and login once per session
+instead of once per email
+Also serves LMTP sessions for delivery into a local mail store
+"""
+import smtplib
+import threading
+import time
+
+from metrics import metrics
+
+
+class SMTPDeliveryUncertain(smtplib.SMTPException):
+    """
+    The connection dropped after the message data was handed to the server
+    The server may already have queued it, so it is not safe to send again
+    """
+
+
+class DataTracking:
+    """Records whether DATA was started, so a dropped session can tell if the message may have gone out"""
+
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+class TrackedSMTP(DataTracking, smtplib.SMTP):
+    """SMTP session that records when DATA starts"""
+
+
+class TrackedLMTP(DataTracking, smtplib.LMTP):
+    """LMTP session that records when DATA starts"""
+
+
+class PooledConnection:
+    """A single authenticated SMTP session owned by the pool"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+    def is_alive(self):
+        """Check the session with a NOOP, returns False if the server dropped it"""
+        try:
+            code, _ = self.smtp.noop()
+            return code == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self):
+        """Close the session, ignoring errors from an already dead connection"""
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Pool of long-lived, authenticated SMTP sessions
+    - Reuses idle sessions across messages (pool hit) and opens new ones on demand (pool miss)
+    - Sends NOOP keepalives to idle sessions from a background thread
+    - Reconnects automatically when the server has dropped a session
+    - Recycles a session after max_messages messages
+    """
+
+    def __init__(self, server, port, username, password, max_size=4,
+                 max_messages=100, keepalive_interval=30, timeout=60,
+                 protocol="smtp", starttls=True):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max(1, int(max_size))
+        self.max_messages = max(1, int(max_messages))
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.protocol = protocol
+        self.starttls = starttls
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._closed = False
+        self._keepalive_thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.recycled = 0
+        self.transactions = 0
+        self.recipients = 0
+
+    def _connect(self):
+        """Open, secure and authenticate a new SMTP (or LMTP) session"""
+        with metrics.timed("connect"):
+            if self.protocol == "lmtp":
+                smtp = TrackedLMTP(self.server, self.port, timeout=self.timeout)
+            else:
+                smtp = TrackedSMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                with metrics.timed("tls"):
+                    smtp.starttls()
+            if self.username and self.password:
+                with metrics.timed("auth"):
+                    smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        return PooledConnection(smtp)
+
+    def _start_keepalive(self):
+        """Start the background NOOP thread the first time a session is opened"""
+        if self._keepalive_thread is not None or not self.keepalive_interval:
+            return
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop)
+        self._keepalive_thread.daemon = True
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        """Periodically NOOP idle sessions and drop the ones the server closed"""
+        while not self._closed:
+            time.sleep(self.keepalive_interval)
+            self.keepalive()
+
+    def keepalive(self):
+        """Send a NOOP on every session idle for longer than keepalive_interval"""
+        now = time.time()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        alive = []
+        for conn in idle:
+            if now - conn.last_used < self.keepalive_interval or conn.is_alive():
+                alive.append(conn)
+            else:
+                conn.close()
+        with self._lock:
+            if self._closed:
+                for conn in alive:
+                    conn.close()
+            else:
+                self._idle.extend(alive)
+
+    def acquire(self):
+        """Get an authenticated session, reusing an idle one when possible"""
+        with metrics.timed("pool_wait"):
+            self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    break
+                # Sessions idle past the keepalive interval may have been dropped
+                if time.time() - conn.last_used < self.keepalive_interval or conn.is_alive():
+                    with self._lock:
+                        self.hits += 1
+                    return conn
+                conn.close()
+                with self._lock:
+                    self.reconnects += 1
+
+            with self._lock:
+                self.misses += 1
+            conn = self._connect()
+            self._start_keepalive()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a session to the pool, closing it if broken or worn out"""
+        try:
+            conn.last_used = time.time()
+            recycle = conn.messages_sent >= self.max_messages
+            if discard or recycle or self._closed:
+                if recycle and not discard:
+                    with self._lock:
+                        self.recycled += 1
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def _count_transaction(self, recipients):
+        with self._lock:
+            self.transactions += 1
+            self.recipients += recipients
+
+    def _send(self, send, recipients=1):
+        """
+        Run send(smtp) over a pooled session
+        Retries once on a fresh session if the server dropped the pooled one
+        before the message was submitted (during MAIL/RCPT); a drop once DATA
+        has started raises SMTPDeliveryUncertain instead, since the server may
+        already have the message and a resend could deliver it twice
+        """
+        for attempt in range(2):
+            conn = self.acquire()
+            conn.smtp.data_started = False
+            try:
+                result = send(conn.smtp)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The session is still usable after a per-message rejection
+                conn.messages_sent += 1
+                self.release(conn)
+                self._count_transaction(recipients)
+                raise
+            except OSError as e:
+                self.release(conn, discard=True)
+                if conn.smtp.data_started:
+                    raise SMTPDeliveryUncertain(
+                        f"Connection lost after the message was submitted, it may have been delivered: {e}"
+                    ) from e
+                if not isinstance(e, (smtplib.SMTPServerDisconnected, ConnectionError)):
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                if attempt == 1:
+                    raise
+                continue
+            except Exception:
+                self.release(conn, discard=True)
+                raise
+            conn.messages_sent += 1
+            self.release(conn)
+            self._count_transaction(recipients)
+            return result
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Send an EmailMessage over a pooled session"""
+        recipients = len(to_addrs) if isinstance(to_addrs, (list, tuple)) else 1
+        return self._send(lambda smtp: smtp.send_message(msg, from_addr, to_addrs), recipients)
+
+    def sendmail(self, from_addr, to_addrs, data):
+        """Send pre-rendered message bytes over a pooled session"""
+        recipients = len(to_addrs) if isinstance(to_addrs, (list, tuple)) else 1
+        return self._send(lambda smtp: smtp.sendmail(from_addr, to_addrs, data), recipients)
+
+    def close(self):
+        """Close every idle session and stop the keepalive thread"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Get pool hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "reconnects": self.reconnects,
+                "recycled": self.recycled,
+                "transactions": self.transactions,
+                "recipients": self.recipients,
+                "idle_connections": len(self._idle),
+                "max_size": self.max_size
+            }
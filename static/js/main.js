@@ -5,7 +5,11 @@
 
 // Global variables
 let currentFile = null;
+let currentJobId = null;
 let statusCheckInterval = null;
+let progressStream = null;
+let streamStatus = {};
+let logsCursor = null;
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
@@ -128,17 +132,9 @@ function handleFileUpload(file) {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            currentFile = data.filepath;
-            document.getElementById('fileName').textContent = data.filename;
-            displayDataPreview(data.preview);
-            document.getElementById('filePreview').style.display = 'block';
-            document.getElementById('uploadArea').style.display = 'none';
-            
-            // Update send section with actual total from file
-            document.getElementById('dataSourceInfo').textContent = data.filename;
-            document.getElementById('totalEmails').textContent = data.total_emails || data.preview.length;
-            
-            showToast('File uploaded successfully!', 'success');
+            // Parsing and validation run in the background; poll until they finish
+            showToast('Processing file...', 'info');
+            pollImportTask(`/api/upload/${data.upload_id}`, showUploadedFile, 'Error uploading file: ');
         } else {
             showToast(data.message, 'error');
         }
@@ -148,6 +144,50 @@ function handleFileUpload(file) {
     });
 }
 
+/**
+ * Show a processed upload
+ */
+function showUploadedFile(data) {
+    currentFile = data.filepath;
+    document.getElementById('fileName').textContent = data.filename;
+    displayDataPreview(data.preview);
+    document.getElementById('filePreview').style.display = 'block';
+    document.getElementById('uploadArea').style.display = 'none';
+    
+    // Update send section with actual total from file
+    document.getElementById('dataSourceInfo').textContent = data.filename;
+    document.getElementById('totalEmails').textContent = data.total_emails || data.preview.length;
+    
+    showToast('File uploaded successfully!', 'success');
+    showValidationSummary(data.validation);
+}
+
+/**
+ * Poll a background upload/import task until it is done, then hand its result to onDone
+ */
+function pollImportTask(url, onDone, errorPrefix) {
+    fetch(url)
+    .then(response => response.json())
+    .then(task => {
+        if (!task.success) {
+            showToast(task.message, 'error');
+            return;
+        }
+        if (!task.finished) {
+            setTimeout(() => pollImportTask(url, onDone, errorPrefix), 500);
+            return;
+        }
+        if (task.status === 'done' && task.result) {
+            onDone(task.result);
+        } else {
+            showToast(task.error, 'error');
+        }
+    })
+    .catch(error => {
+        showToast(errorPrefix + error.message, 'error');
+    });
+}
+
 /**
  * Clear uploaded file
  */
@@ -216,15 +256,8 @@ function loadGoogleSheet() {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            currentFile = data.filepath;
-            displayDataPreview(data.preview);
-            document.getElementById('sheetPreview').style.display = 'block';
-            
-            // Update send section with actual total from file
-            document.getElementById('dataSourceInfo').textContent = 'Google Sheet';
-            document.getElementById('totalEmails').textContent = data.total_emails || data.preview.length;
-            
-            showToast('Google Sheet loaded successfully!', 'success');
+            // The import runs in the background; poll until it finishes
+            pollImportTask(`/api/google-sheet/${data.task_id}`, showGoogleSheet, 'Error loading Google Sheet: ');
         } else {
             showToast(data.message, 'error');
         }
@@ -234,6 +267,22 @@ function loadGoogleSheet() {
     });
 }
 
+/**
+ * Show a loaded Google Sheet
+ */
+function showGoogleSheet(data) {
+    currentFile = data.filepath;
+    displayDataPreview(data.preview);
+    document.getElementById('sheetPreview').style.display = 'block';
+    
+    // Update send section with actual total from file
+    document.getElementById('dataSourceInfo').textContent = 'Google Sheet';
+    document.getElementById('totalEmails').textContent = data.total_emails || data.preview.length;
+    
+    showToast(data.message, 'success');
+    showValidationSummary(data.validation);
+}
+
 /**
  * Configuration Form
  */
@@ -335,6 +384,9 @@ function startSending() {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
+            currentJobId = data.job_id;
+            startStatusPolling(); // Follow the new job
+
             document.getElementById('startSendBtn').style.display = 'none';
             document.getElementById('stopSendBtn').style.display = 'inline-flex';
             document.getElementById('sendProgress').style.display = 'block';
@@ -354,7 +406,9 @@ function startSending() {
  * Stop sending emails
  */
 function stopSending() {
-    fetch('/api/stop', {
+    // Stop only the job started from this page, other campaigns keep running
+    const stopUrl = currentJobId ? `/api/jobs/${currentJobId}/stop` : '/api/stop';
+    fetch(stopUrl, {
         method: 'POST'
     })
     .then(response => response.json())
@@ -374,67 +428,120 @@ function stopSending() {
 }
 
 /**
- * Start polling for status updates
+ * Start live status updates
+ * Uses the /api/stream Server-Sent Events feed, falls back to polling
  */
 function startStatusPolling() {
-    statusCheckInterval = setInterval(checkStatus, 2000); // Check every 2 seconds
+    if (statusCheckInterval) {
+        clearInterval(statusCheckInterval);
+        statusCheckInterval = null;
+    }
+    if (progressStream) {
+        progressStream.close();
+        progressStream = null;
+    }
+
+    if (!window.EventSource) {
+        startPollingFallback();
+        return;
+    }
+
+    const params = new URLSearchParams();
+    if (currentJobId) params.set('job_id', currentJobId);
+    if (logsCursor !== null) params.set('since', logsCursor);
+    streamStatus = {};
+    progressStream = new EventSource('/api/stream?' + params.toString());
+
+    // Status events only carry the fields that changed since the last push
+    progressStream.addEventListener('status', (event) => {
+        Object.assign(streamStatus, JSON.parse(event.data));
+        applyStatus(streamStatus);
+    });
+
+    progressStream.addEventListener('logs', (event) => {
+        const data = JSON.parse(event.data);
+        // Skip entries already rendered by loadLogs()
+        appendLogs(data.logs.filter(log => logsCursor === null || log.id > logsCursor));
+        logsCursor = Math.max(logsCursor || 0, data.cursor);
+    });
+
+    progressStream.onerror = () => {
+        // The browser retries on its own; give up after the stream is closed for good
+        if (progressStream && progressStream.readyState === EventSource.CLOSED) {
+            progressStream = null;
+            startPollingFallback();
+        }
+    };
+}
+
+/**
+ * Poll /api/status every 2 seconds when streaming isn't available
+ */
+function startPollingFallback() {
+    if (!statusCheckInterval) {
+        statusCheckInterval = setInterval(checkStatus, 2000); // Check every 2 seconds
+    }
 }
 
 /**
  * Check sending status
  */
 function checkStatus() {
-    fetch('/api/status')
+    const statusUrl = currentJobId ? `/api/jobs/${currentJobId}/status` : '/api/status';
+    fetch(statusUrl)
     .then(response => response.json())
-    .then(data => {
-        // Update total emails if we have it
-        if (data.total_emails > 0) {
-            document.getElementById('totalEmails').textContent = data.total_emails;
-        }
+    .then(data => applyStatus(data))
+    .catch(error => {
+        console.error('Status check error:', error);
+    });
+}
+
+/**
+ * Update the send section from a status object
+ */
+function applyStatus(data) {
+    // Update total emails if we have it
+    if (data.total_emails > 0) {
+        document.getElementById('totalEmails').textContent = data.total_emails;
+    }
+    
+    // Update sent and failed counts from backend
+    if (data.sent_count !== undefined) {
+        document.getElementById('sentCount').textContent = data.sent_count;
+    }
+    if (data.failed_count !== undefined) {
+        document.getElementById('failedCount').textContent = data.failed_count;
+    }
+    
+    if (data.is_sending) {
+        updateStatusIndicator('sending');
+        updateSendingProgress(data);
+        document.getElementById('sendProgress').style.display = 'block';
         
-        // Update sent and failed counts from backend
-        if (data.sent_count !== undefined) {
-            document.getElementById('sentCount').textContent = data.sent_count;
-        }
-        if (data.failed_count !== undefined) {
-            document.getElementById('failedCount').textContent = data.failed_count;
-        }
+        // Mark that we're in an active sending session
+        window.wasJustSending = true;
+    } else {
+        updateStatusIndicator('ready');
+        document.getElementById('startSendBtn').style.display = 'inline-flex';
+        document.getElementById('stopSendBtn').style.display = 'none';
         
-        if (data.is_sending) {
-            updateStatusIndicator('sending');
-            updateSendingProgress(data);
-            document.getElementById('sendProgress').style.display = 'block';
-            
-            // Mark that we're in an active sending session
-            window.wasJustSending = true;
-        } else {
-            updateStatusIndicator('ready');
-            document.getElementById('startSendBtn').style.display = 'inline-flex';
-            document.getElementById('stopSendBtn').style.display = 'none';
-            
-            // Check if sending just completed (transition from sending to not sending)
-            const totalEmails = data.total_emails || parseInt(document.getElementById('totalEmails').textContent) || 0;
-            const processed = data.sent_count + data.failed_count;
-            
-            // Show completion notification ONLY when we just finished sending (wasJustSending === true)
-            // and we have completed all emails
-            if (window.wasJustSending && totalEmails > 0 && processed === totalEmails && processed > 0) {
-                window.wasJustSending = false; // Reset flag immediately
-                showCompletionNotification(data.sent_count, data.failed_count, totalEmails);
-            }
-            
-            // Hide progress when not sending and no emails processed
-            if (data.sent_count === 0 && data.failed_count === 0) {
-                document.getElementById('sendProgress').style.display = 'none';
-                window.wasJustSending = false; // Reset flag when counters are cleared
-            }
+        // Check if sending just completed (transition from sending to not sending)
+        const totalEmails = data.total_emails || parseInt(document.getElementById('totalEmails').textContent) || 0;
+        const processed = data.sent_count + data.failed_count;
+        
+        // Show completion notification ONLY when we just finished sending (wasJustSending === true)
+        // and we have completed all emails
+        if (window.wasJustSending && totalEmails > 0 && processed === totalEmails && processed > 0) {
+            window.wasJustSending = false; // Reset flag immediately
+            showCompletionNotification(data.sent_count, data.failed_count, totalEmails);
         }
         
-        // Don't update logs from status check - rely on backend counts
-    })
-    .catch(error => {
-        console.error('Status check error:', error);
-    });
+        // Hide progress when not sending and no emails processed
+        if (data.sent_count === 0 && data.failed_count === 0) {
+            document.getElementById('sendProgress').style.display = 'none';
+            window.wasJustSending = false; // Reset flag when counters are cleared
+        }
+    }
 }
 
 /**
@@ -472,10 +579,14 @@ function updateLogCounts(logs) {
  * Load and display all logs
  */
 function loadLogs() {
-    fetch('/api/logs')
+    // Only the newest page is rendered, older logs are paged with ?before=
+    fetch('/api/logs?limit=500')
     .then(response => response.json())
     .then(data => {
         if (data.success) {
+            if (data.next_cursor !== null && data.next_cursor !== undefined) {
+                logsCursor = data.next_cursor;
+            }
             displayLogs(data.logs);
         }
     })
@@ -484,6 +595,30 @@ function loadLogs() {
     });
 }
 
+/**
+ * Add streamed logs to the top of the logs list
+ */
+function appendLogs(logs) {
+    const logsContainer = document.getElementById('logsContainer');
+    if (!logs || logs.length === 0 || !logsContainer) {
+        return;
+    }
+
+    const emptyState = logsContainer.querySelector('.empty-state');
+    if (emptyState) {
+        emptyState.remove();
+    }
+
+    logs.forEach(log => {
+        logsContainer.insertAdjacentHTML('afterbegin', renderLogEntry(log));
+    });
+
+    // Keep the rendered list bounded like the server-side ring buffer
+    while (logsContainer.children.length > 500) {
+        logsContainer.lastElementChild.remove();
+    }
+}
+
 /**
  * Display logs
  */
@@ -497,8 +632,18 @@ function displayLogs(logs) {
 
     let html = '';
     logs.reverse().forEach(log => {
-        const statusClass = log.status.toLowerCase();
-        html += `
+        html += renderLogEntry(log);
+    });
+    
+    logsContainer.innerHTML = html;
+}
+
+/**
+ * Render one log entry
+ */
+function renderLogEntry(log) {
+    const statusClass = log.status.toLowerCase();
+    return `
             <div class="log-entry ${statusClass}">
                 <div class="log-header">
                     <span class="log-to">${log.to}</span>
@@ -510,9 +655,6 @@ function displayLogs(logs) {
                 </div>
             </div>
         `;
-    });
-    
-    logsContainer.innerHTML = html;
 }
 
 /**
@@ -562,6 +704,25 @@ function updateStatusIndicator(status) {
     }
 }
 
+/**
+ * Show the preflight result: only valid, de-duplicated rows will be sent
+ */
+function showValidationSummary(validation) {
+    if (!validation) return;
+    
+    document.getElementById('totalEmails').textContent = validation.valid_rows;
+    const skipped = validation.total_rows - validation.valid_rows;
+    if (skipped > 0 || validation.missing_attachments > 0) {
+        const parts = [];
+        if (validation.missing_to) parts.push(`${validation.missing_to} missing 'To'`);
+        if (validation.invalid_to) parts.push(`${validation.invalid_to} invalid 'To'`);
+        if (validation.invalid_send_at) parts.push(`${validation.invalid_send_at} invalid 'Send At'`);
+        if (validation.duplicates) parts.push(`${validation.duplicates} duplicates`);
+        if (validation.missing_attachments) parts.push(`${validation.missing_attachments} missing attachments`);
+        showToast(`${validation.valid_rows} of ${validation.total_rows} rows will be sent (${parts.join(', ')})`, 'warning');
+    }
+}
+
 /**
  * Show toast notification with liquid glass effect
  */
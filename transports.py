@@ -0,0 +1,384 @@
+"""
+Transports Module
+Pluggable outbound delivery and multi-relay load balancing
+A transport is anything with send_message(msg, from_addr, to_addrs),
+sendmail(from_addr, to_addrs, data), close() and stats():
+- smtp / lmtp: a pooled SMTPConnectionPool session
+- pickup: writes each message as a file into a pickup directory for a local MTA
+- null: accepts and discards messages, for benchmarks and dry runs
+Several transports (accounts or relays) can be combined in a RelayBalancer,
+which spreads messages by weight or by current load, enforces each relay's
+own rate limit and fails over to another relay when one returns 4xx errors
+"""
+import io
+import os
+import re
+import smtplib
+import threading
+import time
+import uuid
+from email import policy
+from email.generator import BytesGenerator
+from email.parser import BytesHeaderParser
+from email.utils import formataddr, getaddresses, parseaddr
+
+from message_template import fold_header
+from rate_limiter import RateLimiter
+from smtp_pool import SMTPConnectionPool, SMTPDeliveryUncertain
+
+TRANSPORT_TYPES = ("smtp", "lmtp", "pickup", "null")
+STRATEGIES = ("weighted", "least_loaded")
+
+# Relay settings; a change to any of them rebuilds the balancer
+RELAY_KEYS = (
+    "name", "transport", "weight", "smtp_server", "smtp_port", "sender_email", "sender_password",
+    "starttls", "smtp_pool_size", "smtp_max_messages_per_connection", "smtp_keepalive_interval",
+    "relay_rate_per_second", "relay_rate_per_minute", "pickup_directory", "latency"
+)
+
+# A relay that fails with a 4xx/connection error sits out for a growing cooldown
+FAILOVER_BASE_COOLDOWN = 5.0
+FAILOVER_MAX_COOLDOWN = 300.0
+
+FROM_HEADER_RE = re.compile(rb"^From:[^\r\n]*\r\n(?:[ \t][^\r\n]*\r\n)*", re.IGNORECASE | re.MULTILINE)
+
+
+def serialize_message(msg):
+    """Flatten an EmailMessage with CRLF line endings, the way smtplib does"""
+    with io.BytesIO() as buffer:
+        BytesGenerator(buffer).flatten(msg, linesep="\r\n")
+        return buffer.getvalue()
+
+
+def message_recipients(msg):
+    """Envelope recipients smtplib would derive from To/Cc/Bcc"""
+    values = [value for field in ("To", "Cc", "Bcc") for value in msg.get_all(field, [])]
+    return [address for _, address in getaddresses(values) if address]
+
+
+def with_sender(from_value, sender_email):
+    """The same From display name, with another account's address"""
+    name = parseaddr(str(from_value or ""))[0]
+    return formataddr((name, sender_email)) if name else sender_email
+
+
+def replace_from_header(data, sender_email):
+    """Put another sender address into the From header of pre-rendered message bytes"""
+    header_end = data.find(b"\r\n\r\n")
+    head, rest = (data, b"") if header_end < 0 else (data[:header_end + 2], data[header_end + 2:])
+    from_value = BytesHeaderParser(policy=policy.SMTP).parsebytes(head).get("From", "")
+    folded = fold_header("From", with_sender(from_value, sender_email))
+    return FROM_HEADER_RE.sub(lambda _: folded, head, count=1) + rest
+
+
+class PickupDirectoryTransport:
+    """
+    Drop each message into a pickup directory, one .eml file per message
+    The envelope is written as leading X-Sender/X-Receiver lines (the
+    IIS/Exchange pickup format); files appear atomically via rename
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.bytes_written = 0
+
+    def sendmail(self, from_addr, to_addrs, data):
+        """Write pre-rendered message bytes with their envelope"""
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        envelope = f"X-Sender: {from_addr}\r\n".encode("utf-8")
+        envelope += b"".join(f"X-Receiver: {address}\r\n".encode("utf-8") for address in to_addrs)
+        name = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex}.eml"
+        tmp_path = os.path.join(self.directory, "." + name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(envelope + data)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        with self._lock:
+            self.messages += 1
+            self.bytes_written += len(envelope) + len(data)
+        return {}
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Write an EmailMessage, deriving the envelope from its headers like smtplib"""
+        if from_addr is None:
+            from_addr = parseaddr(msg.get("Sender") or msg.get("From", ""))[1]
+        if to_addrs is None:
+            to_addrs = message_recipients(msg)
+        # Bcc is an envelope-only field and must not be written into the file
+        bcc = msg.get_all("Bcc")
+        if bcc:
+            del msg["Bcc"]
+        try:
+            return self.sendmail(from_addr, to_addrs, serialize_message(msg))
+        finally:
+            for value in bcc or []:
+                msg["Bcc"] = value
+
+    def close(self):
+        """Nothing to close"""
+
+    def stats(self):
+        """Files written"""
+        with self._lock:
+            return {"messages": self.messages, "bytes_written": self.bytes_written,
+                    "directory": self.directory}
+
+
+class NullTransport:
+    """Accept and discard every message, optionally waiting `latency` seconds per send"""
+
+    def __init__(self, latency=0.0):
+        self.latency = float(latency or 0)
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.recipients = 0
+        self.bytes_sent = 0
+
+    def sendmail(self, from_addr, to_addrs, data):
+        """Count and drop pre-rendered message bytes"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.messages += 1
+            self.recipients += 1 if isinstance(to_addrs, str) else len(to_addrs)
+            self.bytes_sent += len(data)
+        return {}
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Serialize (so benchmarks still pay for it), count and drop an EmailMessage"""
+        if to_addrs is None:
+            to_addrs = message_recipients(msg)
+        return self.sendmail(from_addr, to_addrs, serialize_message(msg))
+
+    def close(self):
+        """Nothing to close"""
+
+    def stats(self):
+        """Messages accepted"""
+        with self._lock:
+            return {"messages": self.messages, "recipients": self.recipients,
+                    "bytes_sent": self.bytes_sent}
+
+
+def build_transport(relay_config):
+    """Create the transport described by one relay entry of the config"""
+    kind = relay_config.get("transport", "smtp")
+    if kind in ("smtp", "lmtp"):
+        return SMTPConnectionPool(
+            relay_config.get("smtp_server", "smtp.gmail.com" if kind == "smtp" else "localhost"),
+            relay_config.get("smtp_port", 587 if kind == "smtp" else smtplib.LMTP_PORT),
+            relay_config.get("sender_email", ""),
+            relay_config.get("sender_password", ""),
+            max_size=relay_config.get("smtp_pool_size", 4),
+            max_messages=relay_config.get("smtp_max_messages_per_connection", 100),
+            keepalive_interval=relay_config.get("smtp_keepalive_interval", 30),
+            protocol=kind,
+            starttls=relay_config.get("starttls", kind == "smtp")
+        )
+    if kind == "pickup":
+        return PickupDirectoryTransport(relay_config.get("pickup_directory", "cache/pickup"))
+    if kind == "null":
+        return NullTransport(relay_config.get("latency", 0))
+    raise ValueError(f"Unknown transport '{kind}', expected one of {', '.join(TRANSPORT_TYPES)}")
+
+
+def is_failover_error(error):
+    """
+    Errors that say "this relay, not this message": 4xx replies, bad logins and
+    connections dropped before the message was submitted
+    A drop after DATA started never fails over: the relay may have the message
+    """
+    if isinstance(error, SMTPDeliveryUncertain):
+        return False
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPServerDisconnected,
+                          smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        # e.g. SMTPRecipientsRefused: the relay answered, the recipients were the problem
+        return False
+    return isinstance(error, OSError)
+
+
+class Relay:
+    """One outbound account or relay: its transport, weight, rate limit and health"""
+
+    def __init__(self, name, transport, sender_email="", weight=1, per_second=None, per_minute=None):
+        self.name = name
+        self.transport = transport
+        self.sender_email = sender_email
+        self.weight = max(1, int(weight))
+        self.limiter = RateLimiter(per_second=per_second, per_minute=per_minute)
+        self.in_flight = 0
+        self.current_weight = 0
+        self.sent = 0
+        self.failures = 0
+        self.failovers = 0
+        self.cooldown_until = 0.0
+
+
+class RelayBalancer:
+    """
+    Spread messages over several relays
+    - weighted: smooth weighted round-robin (a weight 2 relay gets twice the messages)
+    - least_loaded: the relay with the fewest messages in flight per unit of weight
+    A relay whose rate limit is exhausted is skipped for this message; a relay
+    that fails with a 4xx reply or a dropped connection is put on cooldown
+    and the message is retried on the next relay, unless the connection
+    dropped after the message data was sent (it may already be delivered)
+    """
+
+    def __init__(self, relays, strategy="weighted"):
+        if not relays:
+            raise ValueError("At least one relay is required")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown relay strategy '{strategy}', expected one of {', '.join(STRATEGIES)}")
+        self.relays = relays
+        self.strategy = strategy
+        self._lock = threading.Lock()
+
+    def _candidates(self, exclude):
+        """Healthy relays not tried yet for this message, in order of preference"""
+        now = time.monotonic()
+        healthy = [relay for relay in self.relays
+                   if relay not in exclude and relay.cooldown_until <= now]
+        if not healthy:
+            # Everything is cooling down: fall back to the relay that recovers first
+            remaining = [relay for relay in self.relays if relay not in exclude]
+            return sorted(remaining, key=lambda relay: relay.cooldown_until)[:1]
+        if self.strategy == "least_loaded":
+            return sorted(healthy, key=lambda relay: relay.in_flight / relay.weight)
+        total = sum(relay.weight for relay in healthy)
+        for relay in healthy:
+            relay.current_weight += relay.weight
+        ordered = sorted(healthy, key=lambda relay: relay.current_weight, reverse=True)
+        ordered[0].current_weight -= total
+        return ordered
+
+    def _acquire(self, exclude):
+        """Pick a relay with rate-limit budget left, waiting while all of them are throttled"""
+        while True:
+            with self._lock:
+                candidates = self._candidates(exclude)
+                if not candidates:
+                    return None
+                waits = []
+                for relay in candidates:
+                    wait = relay.limiter.try_acquire()
+                    if wait <= 0:
+                        relay.in_flight += 1
+                        return relay
+                    waits.append(wait)
+            time.sleep(min(min(waits), 0.25))
+
+    def _release(self, relay, error=None):
+        """Record how a send on relay ended, starting a cooldown on relay-level errors"""
+        with self._lock:
+            relay.in_flight -= 1
+            if error is None:
+                relay.sent += 1
+                relay.failures = 0
+            elif is_failover_error(error) or isinstance(error, SMTPDeliveryUncertain):
+                relay.failures += 1
+                relay.failovers += 1
+                cooldown = min(FAILOVER_BASE_COOLDOWN * 2 ** (relay.failures - 1), FAILOVER_MAX_COOLDOWN)
+                relay.cooldown_until = time.monotonic() + cooldown
+
+    def _deliver(self, send):
+        """Run send(relay) on the preferred relay, failing over on relay-level errors"""
+        tried = []
+        last_error = None
+        while True:
+            relay = self._acquire(tried)
+            if relay is None:
+                raise last_error
+            tried.append(relay)
+            try:
+                result = send(relay)
+            except Exception as e:
+                self._release(relay, e)
+                if not is_failover_error(e):
+                    raise
+                print(f"Relay '{relay.name}' failed ({e}), trying another relay")
+                last_error = e
+                continue
+            self._release(relay)
+            return result
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Send an EmailMessage, using the chosen relay's own sender address if it has one"""
+        def send(relay):
+            if relay.sender_email and relay.sender_email != parseaddr(str(msg.get("From", "")))[1]:
+                msg.replace_header("From", with_sender(msg.get("From"), relay.sender_email))
+                return relay.transport.send_message(msg, relay.sender_email, to_addrs)
+            return relay.transport.send_message(msg, from_addr, to_addrs)
+        return self._deliver(send)
+
+    def sendmail(self, from_addr, to_addrs, data):
+        """Send pre-rendered message bytes, using the chosen relay's own sender address if it has one"""
+        def send(relay):
+            if relay.sender_email and relay.sender_email != from_addr:
+                relay_data = replace_from_header(data, relay.sender_email)
+                return relay.transport.sendmail(relay.sender_email, to_addrs, relay_data)
+            return relay.transport.sendmail(from_addr, to_addrs, data)
+        return self._deliver(send)
+
+    def close(self):
+        """Close every relay's transport"""
+        for relay in self.relays:
+            relay.transport.close()
+
+    def stats(self):
+        """Per-relay counters and health"""
+        now = time.monotonic()
+        with self._lock:
+            relays = [{
+                "name": relay.name,
+                "weight": relay.weight,
+                "in_flight": relay.in_flight,
+                "sent": relay.sent,
+                "failovers": relay.failovers,
+                "cooling_down": max(0.0, round(relay.cooldown_until - now, 1)),
+                "transport": relay.transport.stats()
+            } for relay in self.relays]
+        return {"strategy": self.strategy, "relays": relays}
+
+
+def relay_configs(config):
+    """
+    The relay entries from the config
+    Without a "relays" list the top-level SMTP settings form the only relay
+    Relay entries inherit any setting they don't override from the top level
+    """
+    entries = config.get("relays") or [{}]
+    base = {key: value for key, value in config.items() if key != "relays"}
+    return [dict(base, **entry) for entry in entries]
+
+
+def relay_signature(config):
+    """Hashable summary of every setting build_balancer depends on"""
+    relays = tuple(tuple(str(entry.get(key, "")) for key in RELAY_KEYS) for entry in relay_configs(config))
+    return (config.get("relay_strategy", "weighted"), bool(config.get("relays")), relays)
+
+
+def build_balancer(config):
+    """Create a RelayBalancer from the config"""
+    relays = []
+    for index, entry in enumerate(relay_configs(config)):
+        kind = entry.get("transport", "smtp")
+        relays.append(Relay(
+            entry.get("name") or f"{kind}-{index + 1}",
+            build_transport(entry),
+            # Only rewrite the sender for relays that set their own account
+            sender_email=entry.get("sender_email", "") if config.get("relays") and kind in ("smtp", "lmtp") else "",
+            weight=entry.get("weight", 1),
+            per_second=entry.get("relay_rate_per_second", 0),
+            per_minute=entry.get("relay_rate_per_minute", 0)
+        ))
+    return RelayBalancer(relays, config.get("relay_strategy", "weighted"))
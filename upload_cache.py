@@ -0,0 +1,341 @@
+"""
+Upload Cache Module
+Remembers what we learned from parsing an uploaded file (columns, row count,
+preview and a normalized Parquet snapshot) keyed by a hash of its content,
+so validation, counting and sending don't re-parse the same file
+pandas (through the reader and preflight) and pyarrow are only imported
+when a file is parsed or a snapshot read, so processes that never touch an
+upload (a send worker, a status-only request) start without them
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = "cache/uploads"
+# Bump when the manifest/snapshot layout changes so old cache entries are rebuilt
+MANIFEST_VERSION = 3
+MAX_MEMORY_ENTRIES = 64
+MAX_DISK_BYTES = 512 * 1024 * 1024
+SNAPSHOT_BATCH_SIZE = 5000
+PREVIEW_ROWS = 5
+# Snapshot column with each row's index in the original file (preflight.ROW_COLUMN),
+# repeated here so reading a snapshot doesn't import preflight and pandas
+SNAPSHOT_ROW_COLUMN = "_row"
+
+# (pyarrow, pyarrow.parquet) once loaded, (None, None) if pyarrow isn't installed
+_arrow_modules = None
+
+
+def _arrow():
+    """pyarrow and pyarrow.parquet, imported on first use"""
+    global _arrow_modules
+    if _arrow_modules is None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            _arrow_modules = (pa, pq)
+        except ImportError:
+            _arrow_modules = (None, None)
+    return _arrow_modules
+
+
+def file_hash(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of the file content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _normalize(value):
+    """Store every cell as a string, missing values become ''"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value != value:
+        return ''
+    return str(value)
+
+
+class UploadCache:
+    """
+    Content-addressed cache of parsed upload manifests
+    - In memory: LRU of manifests bounded by entry count
+    - On disk: manifest JSON + Parquet snapshot per hash, LRU-evicted by total size
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_entries=MAX_MEMORY_ENTRIES,
+                 max_disk_bytes=MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._manifests = OrderedDict()
+        self._path_hashes = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _manifest_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _snapshot_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.parquet")
+
+    def hash_for(self, file_path):
+        """Content hash of a file, memoized by (size, mtime) so unchanged files aren't re-read"""
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._path_hashes.get(key)
+            if cached and cached[0] == signature:
+                return cached[1]
+        digest = file_hash(file_path)
+        with self._lock:
+            self._path_hashes[key] = (signature, digest)
+        return digest
+
+    def remember_hash(self, file_path, digest):
+        """Record a hash computed while the file was being written, so it isn't read again"""
+        stat = os.stat(file_path)
+        with self._lock:
+            self._path_hashes[os.path.abspath(file_path)] = ((stat.st_size, stat.st_mtime_ns), digest)
+
+    def _build_lock(self, digest):
+        """One build per content hash at a time; different files build in parallel"""
+        with self._lock:
+            return self._build_locks.setdefault(digest, threading.Lock())
+
+    def _remember(self, digest, manifest):
+        """Insert into the in-memory LRU"""
+        with self._lock:
+            self._manifests[digest] = manifest
+            self._manifests.move_to_end(digest)
+            while len(self._manifests) > self.max_memory_entries:
+                self._manifests.popitem(last=False)
+
+    def _load_from_disk(self, digest):
+        """Load a manifest saved by a previous upload, touching it for LRU"""
+        path = self._manifest_path(digest)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        os.utime(path)
+        snapshot = manifest.get("snapshot")
+        if snapshot and os.path.exists(snapshot):
+            os.utime(snapshot)
+        else:
+            manifest["snapshot"] = None
+        return manifest
+
+    def cached_manifest(self, digest):
+        """Get the manifest for a content hash from memory or disk, or None on a miss"""
+        with self._lock:
+            manifest = self._manifests.get(digest)
+            if manifest is not None:
+                self._manifests.move_to_end(digest)
+                self.hits += 1
+                return manifest
+
+        manifest = self._load_from_disk(digest)
+        if manifest is not None:
+            with self._lock:
+                self.hits += 1
+            self._remember(digest, manifest)
+        return manifest
+
+    def adopt(self, file_path, digest, manifest):
+        """Take over a manifest built by another process (see prepare_manifest)"""
+        self.remember_hash(file_path, digest)
+        with self._lock:
+            self.misses += 1
+        self._remember(digest, manifest)
+
+    def get_manifest(self, file_path):
+        """Get the manifest for a file, parsing it only on a cache miss"""
+        digest = self.hash_for(file_path)
+        manifest = self.cached_manifest(digest)
+        if manifest is not None:
+            return manifest
+
+        with self._build_lock(digest):
+            # Another thread (or process) may have published it while we waited
+            manifest = self.cached_manifest(digest)
+            if manifest is not None:
+                return manifest
+            with self._lock:
+                self.misses += 1
+            manifest = self._build_manifest(file_path, digest)
+            self._remember(digest, manifest)
+        return manifest
+
+    def _build_manifest(self, file_path, digest):
+        """
+        Parse the file once: read columns, run the preflight validation and
+        write the clean rows to the snapshot together
+        Snapshot and manifest are written to temp files of their own and renamed
+        into place, so concurrent builds of the same file (say in two pool
+        processes) never trip over each other and readers never see half a file
+        """
+        from preflight import Preflight, TEXT_COLUMNS, ROW_COLUMN
+        from recipient_reader import read_frames
+
+        pa, pq = _arrow()
+        columns, chunks = read_frames(file_path, SNAPSHOT_BATCH_SIZE)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        snapshot_path = self._snapshot_path(digest) if pa is not None and columns else None
+        snapshot_columns = columns + [column for column in TEXT_COLUMNS if column not in columns]
+        writer = None
+        tmp_path = None
+        preview = []
+        preflight = Preflight(columns)
+
+        try:
+            if snapshot_path:
+                schema = pa.schema([(column, pa.string()) for column in snapshot_columns]
+                                   + [(ROW_COLUMN, pa.int64())])
+                fd, tmp_path = tempfile.mkstemp(prefix=f".{digest}-", suffix=".parquet.tmp",
+                                                dir=self.cache_dir)
+                os.close(fd)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            for chunk in chunks:
+                if len(preview) < PREVIEW_ROWS:
+                    for record in chunk.head(PREVIEW_ROWS - len(preview)).to_dict('records'):
+                        preview.append({column: _normalize(record.get(column)) for column in columns})
+                clean = preflight.run(chunk)
+                if writer is not None and len(clean):
+                    writer.write_table(pa.Table.from_pandas(clean[snapshot_columns + [ROW_COLUMN]],
+                                                            schema=writer.schema, preserve_index=False))
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(tmp_path, snapshot_path)
+                tmp_path = None
+        except Exception:
+            if writer is not None:
+                writer.close()
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        report = preflight.finish()
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "hash": digest,
+            "filename": os.path.basename(file_path),
+            "columns": columns,
+            "total_rows": report["total_rows"],
+            "valid_rows": report["valid_rows"],
+            "report": report,
+            "preview": preview,
+            "snapshot": snapshot_path
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{digest}-", suffix=".json.tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self._manifest_path(digest))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict_disk()
+        return manifest
+
+    def _evict_disk(self):
+        """Drop least recently used cache files until the directory fits max_disk_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            digest = os.path.splitext(os.path.basename(path))[0]
+            with self._lock:
+                self._manifests.pop(digest, None)
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def iter_rows(self, file_path):
+        """
+        Yield (row_index, row) for every row that passed the preflight checks
+        Reads the clean Parquet snapshot when one exists, otherwise streams the
+        original file through the same preflight on the fly
+        row_index is the row's position in the original file
+        """
+        manifest = self.get_manifest(file_path)
+        snapshot = manifest.get("snapshot")
+        if snapshot and os.path.exists(snapshot):
+            _, pq = _arrow()
+            # Memory-mapped: pages come straight from the OS cache instead of a read() copy
+            for batch in pq.ParquetFile(snapshot, memory_map=True).iter_batches(batch_size=SNAPSHOT_BATCH_SIZE):
+                for row in batch.to_pylist():
+                    yield row[SNAPSHOT_ROW_COLUMN], row
+        else:
+            from preflight import Preflight, ROW_COLUMN
+            from recipient_reader import read_frames
+
+            preflight = Preflight(manifest["columns"])
+            _, chunks = read_frames(file_path, SNAPSHOT_BATCH_SIZE)
+            for chunk in chunks:
+                for row in preflight.run(chunk).to_dict('records'):
+                    yield row[ROW_COLUMN], row
+
+    def stats(self):
+        """Get cache hit/miss counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._manifests)
+            }
+
+
+# Shared cache used by the Flask routes and the send loop
+upload_cache = UploadCache()
+
+
+def get_manifest(file_path):
+    """Get the cached manifest for an uploaded file"""
+    return upload_cache.get_manifest(file_path)
+
+
+def prepare_manifest(file_path, digest):
+    """
+    Parse a file and write its manifest and snapshot to the cache directory
+    Entry point for the upload process pool: runs in a worker process, the
+    app process picks the result up with upload_cache.adopt()
+    """
+    upload_cache.remember_hash(file_path, digest)
+    return upload_cache.get_manifest(file_path)
+
+
+def remember_file_hash(file_path, digest):
+    """Seed the hash memo for a file hashed while it was streamed to disk"""
+    upload_cache.remember_hash(file_path, digest)
+
+
+def iter_cached_recipients(file_path):
+    """Yield (row_index, row) for every valid recipient row, preferring the cached snapshot"""
+    return upload_cache.iter_rows(file_path)
@@ -0,0 +1,68 @@
+"""
+Upload Receiver Module
+Writes an uploaded file to disk in chunks, hashing it and checking its
+format on the way, so the content is read exactly once before parsing
+- The first chunk is sniffed: xlsx must be a zip, xls an OLE2 container
+  and csv plain text, otherwise the upload is rejected before parsing
+- The sha256 computed here is handed to the upload cache, which then
+  doesn't read the file again to key its manifest
+"""
+import hashlib
+import os
+import tempfile
+
+from upload_cache import remember_file_hash
+
+CHUNK_SIZE = 64 * 1024
+
+ZIP_MAGIC = b"PK\x03\x04"
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+class UploadRejected(ValueError):
+    """The uploaded content doesn't match what its extension claims"""
+
+
+def sniff_format(head):
+    """Guess the format from the first bytes of a file: 'xlsx', 'xls' or 'csv'"""
+    if head.startswith(ZIP_MAGIC):
+        return "xlsx"
+    if head.startswith(OLE2_MAGIC):
+        return "xls"
+    if b"\x00" in head:
+        # Binary content, but not a spreadsheet container we can read
+        return None
+    return "csv"
+
+
+def save_upload(stream, upload_folder, filename):
+    """
+    Stream an upload to upload_folder/filename
+    Returns (filepath, sha256 hex digest); raises UploadRejected when the
+    content doesn't match the extension
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    extension = filename.rsplit('.', 1)[-1].lower()
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=upload_folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            head = stream.read(CHUNK_SIZE)
+            detected = sniff_format(head)
+            if detected != extension:
+                raise UploadRejected(f"File content does not look like a .{extension} file"
+                                     + (f" (looks like .{detected})" if detected else ""))
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                f.write(chunk)
+                chunk = stream.read(CHUNK_SIZE)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    filepath = os.path.join(upload_folder, filename)
+    os.replace(tmp_path, filepath)
+    hexdigest = digest.hexdigest()
+    remember_file_hash(filepath, hexdigest)
+    return filepath, hexdigest
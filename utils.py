@@ -4,46 +4,136 @@ Contains all email sending logic from the original main.py
 Preserves exact functionality while making it reusable for Flask
 """
 import smtplib
-import pandas as pd
 from email.message import EmailMessage
 import os
-import mimetypes
 from config_handler import load_config
+from transports import build_balancer, relay_signature
+from upload_cache import get_manifest, iter_cached_recipients, prepare_manifest, upload_cache, SNAPSHOT_BATCH_SIZE
+from log_export import outcome_report, report_fields
+from job_store import get_journal
+from job_scheduler import JobScheduler, SendJob
+from campaign_scheduler import unit_send_at
+from attachment_cache import get_attachment, get_attachment_part, get_attachment_cache_stats
+from message_template import get_message_template, envelope_recipients, CompiledText
+from recipient_batcher import batch_rows, BATCH_TO_HEADER
+from retry_queue import RetryQueue, RetryEntry, classify_error, is_transient_code, backoff_delay
+from log_store import LogStore
+from event_stream import notifier
+from metrics import metrics
+from send_state import StatusPublisher
+from work_queue import WorkQueue
+from import_tasks import tasks, DONE, FAILED
+from sheet_import import SheetFetcher
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 import threading
 import time
 
-# Global variables for tracking email sending status
-email_logs = []
-is_sending = False
-should_stop = False
-total_emails = 0
-sent_count = 0
-failed_count = 0
-current_data_file = None
+# Email logs: recent entries in a ring buffer, everything spilled to disk
+# Every new log wakes the live progress stream (/api/stream)
+email_logs = LogStore(buffer_size=int(load_config().get("log_buffer_size", 1000)),
+                      on_append=notifier.notify)
+
+# Shared scheduler running every send job, created on first use
+scheduler = None
+scheduler_lock = threading.Lock()
+
+# This process's send totals, published to the shared status board so other
+# processes (e.g. other gunicorn workers) can show them
+status_publisher = None
+status_publisher_lock = threading.Lock()
+
+# Worker mode: rows go to a shared queue consumed by `python main.py worker`
+# processes; this process only tracks the jobs and relays their logs
+work_queue = None
+queued_jobs = {}
+work_queue_lock = threading.Lock()
+QUEUE_POLL_INTERVAL = 0.5
+
+# Delayed retries for transient SMTP failures, created on first use
+retry_queue = None
+retry_queue_lock = threading.Lock()
+
+# Shared outbound transport (relay balancer), rebuilt when the relay settings change
+transport = None
+transport_key = None
+transport_lock = threading.Lock()
+
+# Background uploads and Google Sheet imports, so neither holds a request thread
+sheet_fetcher = None
+import_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="import")
+import_lock = threading.Lock()
+
+# Parsing and validation of uploads run in worker processes, so openpyxl's
+# pure-Python parsing never holds the GIL against the send threads
+parse_pool = None
+parse_pool_lock = threading.Lock()
+# Parses in flight (digest -> Future), so a file uploaded twice, or sent while
+# it is still being parsed, is only parsed once
+parse_futures = {}
+parse_futures_lock = threading.Lock()
+# Imported once by the fork server, so parse workers start with them loaded
+PARSE_PRELOAD = ["upload_cache", "preflight", "recipient_reader", "pyarrow.parquet"]
+
+def is_missing(value):
+    """True for an empty cell: None or NaN (what pd.isna reports, without importing pandas)"""
+    return value is None or (isinstance(value, float) and value != value)
 
 def clean_field(value):
     """Clean and validate field values"""
-    if pd.isna(value):
+    if is_missing(value):
         return ""
     return str(value).strip()
 
-def send_single_email(to, cc="", bcc="", subject="", body="", attachment=None, sender_name=""):
+def get_transport(config):
+    """
+    Get the shared outbound transport for the current configuration
+    A balancer over the configured relays; without a "relays" list it wraps
+    the single SMTP account from the top-level settings
+    """
+    global transport, transport_key
+    
+    key = relay_signature(config)
+    with transport_lock:
+        if transport is None or transport_key != key:
+            if transport is not None:
+                transport.close()
+            transport = build_balancer(config)
+            transport_key = key
+        return transport
+
+def close_transport():
+    """Close all pooled SMTP sessions and other transport resources"""
+    global transport, transport_key
+    with transport_lock:
+        if transport is not None:
+            transport.close()
+        transport = None
+        transport_key = None
+
+def get_transport_stats():
+    """Get per-relay counters, including SMTP pool hit/miss counters"""
+    with transport_lock:
+        if transport is None:
+            return {}
+        return transport.stats()
+
+def send_single_email(to, cc="", bcc="", subject="", body="", attachment=None, sender_name="",
+                      on_transient=None):
     """
     Send a single email using SMTP
     This preserves the exact logic from original main.py
+    on_transient(error) may take over a transient failure (e.g. queue a retry);
+    when it returns True the send returns None instead of logging a failure
     """
-    global email_logs, sent_count, failed_count
-    
     # Load configuration dynamically
     config = load_config()
-    SMTP_SERVER = config.get("smtp_server", "smtp.gmail.com")
-    SMTP_PORT = config.get("smtp_port", 587)
     SENDER_EMAIL = config.get("sender_email", "")
-    SENDER_PASSWORD = config.get("sender_password", "")
     
     if not sender_name:
         sender_name = config.get("sender_name", "")
     
+    build_started = time.perf_counter()
     msg = EmailMessage()
     
     # Set sender with name if provided
@@ -76,19 +166,17 @@ def send_single_email(to, cc="", bcc="", subject="", body="", attachment=None, s
         msg["Bcc"] = bcc
     msg["Subject"] = subject
     msg.set_content(str(body))
+    metrics.observe("build", time.perf_counter() - build_started)
 
     # Handle attachments
-    if attachment and not pd.isna(attachment):
+    if attachment and not is_missing(attachment):
         attachment_path = str(attachment).strip()
         if os.path.exists(attachment_path):
-            mime_type, _ = mimetypes.guess_type(attachment_path)
-            main_type, sub_type = (mime_type.split('/', 1)
-                                   if mime_type else ('application', 'octet-stream'))
-            with open(attachment_path, 'rb') as f:
-                msg.add_attachment(f.read(),
-                                   maintype=main_type,
-                                   subtype=sub_type,
-                                   filename=os.path.basename(attachment_path))
+            # Reuse the already encoded part when many rows share the same file
+            max_bytes = int(config.get("attachment_cache_mb", 64)) * 1024 * 1024
+            with metrics.timed("attachment"):
+                msg.make_mixed()
+                msg.attach(get_attachment_part(attachment_path, max_bytes))
         else:
             log_entry = {
                 "to": to,
@@ -101,24 +189,24 @@ def send_single_email(to, cc="", bcc="", subject="", body="", attachment=None, s
             print(f"Attachment not found: {attachment_path}")
 
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SENDER_EMAIL, SENDER_PASSWORD)
-            smtp.send_message(msg)
-            
-            log_entry = {
-                "to": to,
-                "subject": subject,
-                "status": "Sent",
-                "message": "Email sent successfully",
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            email_logs.append(log_entry)
-            sent_count += 1
-            print(f"Email sent successfully to: {to}")
-            return True
-            
+        # Reuse a pooled, already authenticated session on the chosen relay
+        with metrics.timed("transfer"):
+            get_transport(config).send_message(msg)
+        
+        log_entry = {
+            "to": to,
+            "subject": subject,
+            "status": "Sent",
+            "message": "Email sent successfully",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        email_logs.append(log_entry)
+        print(f"Email sent successfully to: {to}")
+        return True
+        
     except Exception as e:
+        if on_transient is not None and classify_error(e) == "transient" and on_transient(e):
+            return None
         log_entry = {
             "to": to,
             "subject": subject,
@@ -127,75 +215,507 @@ def send_single_email(to, cc="", bcc="", subject="", body="", attachment=None, s
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }
         email_logs.append(log_entry)
-        failed_count += 1
         print(f"Failed to send to {to}: {e}")
         return False
 
-def send_bulk_emails(data_file_path, sender_name=""):
+def send_templated_email(row, sender_name="", on_transient=None):
     """
-    Send bulk emails from Excel/CSV file
-    This is the main automation function from original main.py
+    Send one row in template mode
+    {Column} placeholders in Subject and Body are filled from the row, and the
+    message bytes are spliced from a template compiled once per Subject/Body pair
+    on_transient works as in send_single_email
     """
-    global is_sending, should_stop, email_logs, total_emails, sent_count, failed_count, current_data_file
+    config = load_config()
+    SENDER_EMAIL = config.get("sender_email", "")
     
-    is_sending = True
-    should_stop = False
-    sent_count = 0
-    failed_count = 0
-    current_data_file = data_file_path
+    if not sender_name:
+        sender_name = config.get("sender_name", "")
+    from_header = f"{sender_name} <{SENDER_EMAIL}>" if sender_name else SENDER_EMAIL
     
-    try:
-        # Read the data file
-        if data_file_path.endswith('.csv'):
-            data = pd.read_csv(data_file_path)
+    values = {str(key): clean_field(value) for key, value in row.items()}
+    to = values.get("To", "")
+    cc = values.get("CC", "")
+    bcc = values.get("BCC", "")
+    
+    if not to:
+        log_entry = {
+            "to": "N/A",
+            "subject": values.get("Subject", ""),
+            "status": "Failed",
+            "message": "Missing 'To' address",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        email_logs.append(log_entry)
+        print("Skipped: Missing 'To' address.")
+        return False
+    
+    attachment_part = attachment_key = None
+    max_bytes = int(config.get("attachment_cache_mb", 64)) * 1024 * 1024
+    attachment_path = values.get("Attachment", "")
+    if attachment_path:
+        if os.path.exists(attachment_path):
+            with metrics.timed("attachment"):
+                attachment_key, attachment_part = get_attachment(attachment_path, max_bytes)
         else:
-            data = pd.read_excel(data_file_path)
-        
-        # Set total emails count
-        total_emails = len(data)
-        
-        # Send emails row by row
-        for index, row in data.iterrows():
-            if should_stop:
-                log_entry = {
-                    "to": "N/A",
-                    "subject": "Bulk Send",
-                    "status": "Stopped",
-                    "message": f"Email sending stopped by user at {sent_count + failed_count}/{total_emails}",
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-                email_logs.append(log_entry)
-                break
-                
-            send_single_email(
-                to=row.get("To", ""),
-                cc=row.get("CC", ""),
-                bcc=row.get("BCC", ""),
-                subject=row.get("Subject", ""),
-                body=row.get("Body", ""),
-                attachment=row.get("Attachment", ""),
-                sender_name=sender_name
-            )
-            
-            # Small delay to avoid rate limiting
-            time.sleep(1)
-        
-        # Auto-stop when all emails are sent
-        is_sending = False
-        
-        # Add completion log
-        if not should_stop:
             log_entry = {
-                "to": "N/A",
-                "subject": "Bulk Send Complete",
-                "status": "Sent",
-                "message": f"Completed: {sent_count} sent, {failed_count} failed out of {total_emails} total",
+                "to": to,
+                "subject": values.get("Subject", ""),
+                "status": "Warning",
+                "message": f"Attachment not found: {attachment_path}",
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             }
             email_logs.append(log_entry)
+            print(f"Attachment not found: {attachment_path}")
+    
+    # Until the template renders, failures are logged with the raw Subject
+    subject = values.get("Subject", "")
+    
+    try:
+        with metrics.timed("build"):
+            template = get_message_template(from_header, values.get("Subject", ""), values.get("Body", ""),
+                                            attachment_part, attachment_key, max_bytes)
+            subject = template.render_subject(values)
+            data = template.render(values, to, cc)
+        with metrics.timed("transfer"):
+            get_transport(config).sendmail(SENDER_EMAIL, envelope_recipients(to, cc, bcc), data)
         
+        log_entry = {
+            "to": to,
+            "subject": subject,
+            "status": "Sent",
+            "message": "Email sent successfully",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        email_logs.append(log_entry)
+        print(f"Email sent successfully to: {to}")
         return True
         
+    except Exception as e:
+        if on_transient is not None and classify_error(e) == "transient" and on_transient(e):
+            return None
+        log_entry = {
+            "to": to,
+            "subject": subject,
+            "status": "Failed",
+            "message": str(e),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        email_logs.append(log_entry)
+        print(f"Failed to send to {to}: {e}")
+        return False
+
+def send_batch(job, row_indexes, batch):
+    """
+    Deliver one identical message to every row of a batch in a single SMTP
+    transaction (one MAIL FROM, a RCPT TO per recipient, one DATA)
+    Recipients only see the undisclosed-recipients header, never each other
+    Returns (sent, failed) and checkpoints every row in the job journal
+    """
+    config = load_config()
+    SENDER_EMAIL = config.get("sender_email", "")
+    sender_name = job.sender_name or config.get("sender_name", "")
+    from_header = f"{sender_name} <{SENDER_EMAIL}>" if sender_name else SENDER_EMAIL
+    
+    first = batch.rows[0]
+    recipients = [clean_field(address) for address in batch.recipients]
+    attachment_part = attachment_key = None
+    max_bytes = int(config.get("attachment_cache_mb", 64)) * 1024 * 1024
+    attachment_path = clean_field(first.get("Attachment", ""))
+    if attachment_path and os.path.exists(attachment_path):
+        with metrics.timed("attachment"):
+            attachment_key, attachment_part = get_attachment(attachment_path, max_bytes)
+    
+    build_started = time.perf_counter()
+    if config.get("template_mode", False):
+        template = get_message_template(from_header, clean_field(first.get("Subject", "")),
+                                        clean_field(first.get("Body", "")), attachment_part, attachment_key,
+                                        max_bytes)
+        subject = template.render_subject({})
+        send = lambda pool: pool.sendmail(SENDER_EMAIL, recipients, template.render({}, BATCH_TO_HEADER))
+    else:
+        subject = clean_field(first.get("Subject", ""))
+        msg = EmailMessage()
+        msg["From"] = from_header
+        msg["To"] = BATCH_TO_HEADER
+        msg["Subject"] = subject
+        msg.set_content(str(first.get("Body", "")))
+        if attachment_part is not None:
+            msg.make_mixed()
+            msg.attach(attachment_part)
+        send = lambda pool: pool.send_message(msg, SENDER_EMAIL, recipients)
+    metrics.observe("build", time.perf_counter() - build_started)
+    
+    try:
+        with metrics.timed("transfer"):
+            refused = send(get_transport(config)) or {}
+    except smtplib.SMTPRecipientsRefused as e:
+        refused = e.recipients
+    except Exception as e:
+        refused = {address: e for address in recipients}
+    
+    journal = get_journal()
+    sent = failed = 0
+    for row_index, row, to in zip(row_indexes, batch.rows, recipients):
+        if to in refused:
+            # Refusals are (code, message) pairs, a failed transaction is the exception itself
+            reason = refused[to]
+            transient = (is_transient_code(reason[0]) if isinstance(reason, tuple)
+                         else classify_error(reason) == "transient")
+            if transient and schedule_retry(job, row_index, row, 0, reason, subject):
+                continue
+            failed += 1
+            status, message = "Failed", str(refused[to])
+            print(f"Failed to send to {to}: {message}")
+        else:
+            sent += 1
+            status, message = "Sent", f"Email sent successfully (batch of {len(recipients)})"
+            print(f"Email sent successfully to: {to}")
+        email_logs.append({
+            "to": to,
+            "subject": subject,
+            "status": status,
+            "message": message,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+        journal.record_outcome(job.id, row_index, to, status)
+    return sent, failed
+
+def get_retry_queue():
+    """Get the shared retry queue"""
+    global retry_queue
+    with retry_queue_lock:
+        if retry_queue is None:
+            retry_queue = RetryQueue(retry_row, on_cancel=lambda entry: get_scheduler().complete_retry(entry.job),
+                                     workers=load_config().get("retry_workers", 2))
+        return retry_queue
+
+def schedule_retry(job, row_index, row, attempt, error, subject=None):
+    """
+    Queue a transiently failed row for another attempt with jittered exponential backoff
+    attempt is the number of retries already made for the row
+    Returns False when retries are disabled, used up, or the job is stopping
+    """
+    config = load_config()
+    max_attempts = int(config.get("retry_max_attempts", 5))
+    if attempt >= max_attempts or job.should_stop:
+        return False
+    delay = backoff_delay(attempt + 1,
+                          float(config.get("retry_base_delay", 30)),
+                          float(config.get("retry_max_delay", 1800)))
+    metrics.count_message("retrying")
+    if getattr(job, "defer_retry", None) is not None:
+        # Worker mode: the row goes back on the shared work queue
+        job.defer_retry(row_index, row, attempt + 1, delay)
+    else:
+        job.retry_scheduled()
+        get_retry_queue().schedule(RetryEntry(job, row_index, row, attempt + 1, str(error)), delay)
+    
+    to = clean_field(row.get("To", ""))
+    log_entry = {
+        "to": to,
+        "subject": subject if subject is not None else clean_field(row.get("Subject", "")),
+        "status": "Retrying",
+        "message": f"{error} - retry {attempt + 1}/{max_attempts} in {delay:.0f}s",
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    email_logs.append(log_entry)
+    print(f"Transient failure for {to}, retry {attempt + 1}/{max_attempts} in {delay:.0f}s: {error}")
+    return True
+
+def deliver_row(job, row_index, row, attempt=0):
+    """
+    Send one recipient row and checkpoint its outcome in the job journal
+    Returns None if a transient failure was handed to the retry queue
+    """
+    on_transient = lambda error: schedule_retry(job, row_index, row, attempt, error)
+    if load_config().get("template_mode", False):
+        success = send_templated_email(row, job.sender_name, on_transient=on_transient)
+    else:
+        success = send_single_email(
+            to=row.get("To", ""),
+            cc=row.get("CC", ""),
+            bcc=row.get("BCC", ""),
+            subject=row.get("Subject", ""),
+            body=row.get("Body", ""),
+            attachment=row.get("Attachment", ""),
+            sender_name=job.sender_name,
+            on_transient=on_transient
+        )
+    if success is None:
+        return None
+    get_journal().record_outcome(job.id, row_index, clean_field(row.get("To", "")),
+                                 "Sent" if success else "Failed")
+    return success
+
+def send_row(job, row_index, row):
+    """Send one row (or a multi-recipient batch) for the scheduler"""
+    if isinstance(row_index, tuple):
+        return send_batch(job, row_index, row)
+    return deliver_row(job, row_index, row)
+
+def retry_row(entry):
+    """
+    Re-send a row from the retry queue, on a retry thread
+    Shares the global rate limit with the send workers without occupying one
+    """
+    job = entry.job
+    sched = get_scheduler()
+    success = None
+    try:
+        with metrics.for_job(job.id):
+            with metrics.timed("rate_wait"):
+                allowed = sched.limiter.acquire(cancelled=lambda: job.should_stop)
+            if allowed:
+                with metrics.timed("total"):
+                    success = deliver_row(job, entry.row_index, entry.row, entry.attempt)
+    except Exception as e:
+        print(f"Retry failed for job {job.id}: {e}")
+        success = False
+    sched.complete_retry(job, sent=1 if success else 0, failed=1 if success is False else 0)
+
+def finish_job(job):
+    """Checkpoint the final job status and log how the run ended"""
+    journal = get_journal()
+    journal.flush()
+    journal.set_status(job.id, job.status)
+    metrics.finish_job(job.id)
+    
+    if job.status == "failed":
+        log_entry = {
+            "to": "N/A",
+            "subject": "Bulk Send",
+            "status": "Failed",
+            "message": f"Error reading file: {job.error}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    elif job.status == "stopped":
+        log_entry = {
+            "to": "N/A",
+            "subject": "Bulk Send",
+            "status": "Stopped",
+            "message": f"Email sending stopped by user at {job.sent + job.failed}/{job.total}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    else:
+        log_entry = {
+            "to": "N/A",
+            "subject": "Bulk Send Complete",
+            "status": "Sent",
+            "message": f"Completed: {job.sent} sent, {job.failed} failed out of {job.total} total",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    email_logs.append(log_entry)
+    
+    # Release pooled SMTP sessions once no job needs them
+    if not get_scheduler().active_jobs():
+        close_transport()
+
+def get_scheduler():
+    """Get the shared job scheduler, applying the current concurrency and rate settings"""
+    global scheduler
+    
+    config = load_config()
+    get_status_publisher()
+    workers = config.get("send_workers", 4)
+    per_second = config.get("rate_per_second", 1)
+    per_minute = config.get("rate_per_minute", 0)
+    per_hour = config.get("quota_per_hour", 0)
+    per_day = config.get("quota_per_day", 0)
+    with scheduler_lock:
+        if scheduler is None:
+            # Quotas start from what the journal says already went out in the current hour/day
+            scheduler = JobScheduler(send_row, on_finish=finish_job, workers=workers,
+                                     per_second=per_second, per_minute=per_minute,
+                                     per_hour=per_hour, per_day=per_day,
+                                     sent_since=lambda since: get_journal().outcomes_since(since))
+        else:
+            scheduler.configure(workers, per_second, per_minute, per_hour, per_day)
+        return scheduler
+
+def pending_rows(data_file_path, done_rows):
+    """Yield (row_index, row) for every valid row without a journaled outcome"""
+    for row_index, row in iter_cached_recipients(data_file_path):
+        if row_index not in done_rows:
+            yield row_index, row
+
+def is_personalized(row):
+    """True if the row's Subject or Body uses {Column} placeholders (template mode only)"""
+    columns = {str(key) for key in row}
+    return any("{" in text and CompiledText(text).uses_any(columns)
+               for text in (str(row.get("Subject", "")), str(row.get("Body", ""))))
+
+def send_units(data_file_path, done_rows, config):
+    """
+    Rows to hand to the scheduler: one row per message, or with batch_mode on,
+    identical messages grouped into multi-recipient batches
+    """
+    rows = pending_rows(data_file_path, done_rows)
+    if not config.get("batch_mode", False):
+        return rows
+    template_mode = config.get("template_mode", False)
+    return batch_rows(
+        rows,
+        max_recipients=config.get("batch_max_recipients", 50),
+        window=config.get("batch_window", 1000),
+        by_domain=config.get("batch_group_by_domain", False),
+        batchable=(lambda row: not is_personalized(row)) if template_mode else None
+    )
+
+def log_preflight_summary(report):
+    """Log the rows the preflight check dropped before a new job starts"""
+    skipped = report["total_rows"] - report["valid_rows"]
+    if not skipped and not report["missing_attachments"] and not report["invalid_cc_bcc"]:
+        return
+    log_entry = {
+        "to": "N/A",
+        "subject": "Preflight",
+        "status": "Warning",
+        "message": (f"Skipped {skipped} of {report['total_rows']} rows "
+                    f"({report['missing_to']} missing 'To', {report['invalid_to']} invalid 'To', "
+                    f"{report.get('invalid_send_at', 0)} invalid 'Send At', "
+                    f"{report['duplicates']} duplicates); "
+                    f"{report['missing_attachments']} attachments not found, "
+                    f"{report['invalid_cc_bcc']} invalid CC/BCC addresses dropped"),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    email_logs.append(log_entry)
+
+def start_send_job(data_file_path, sender_name="", resume=True, send_at=None):
+    """
+    Create (or resume) a send job for a file and hand it to the scheduler
+    If an unfinished job exists for the same file content it is resumed,
+    skipping every row that already has an outcome in the journal
+    send_at (epoch seconds) holds the job back until then; a resumed job
+    keeps the time it was scheduled for unless a new one is given
+    Raises ValueError if the same file is already being sent
+    """
+    journal = get_journal()
+    sched = get_scheduler()
+    
+    # Row count comes from the cached manifest, the rows themselves are streamed
+    # Rows rejected by the preflight check at upload time are never queued
+    # (a file still being parsed is waited for, not parsed a second time)
+    manifest = parse_upload(data_file_path, upload_cache.hash_for(data_file_path))
+    total = manifest["valid_rows"]
+    
+    for active in sched.active_jobs():
+        if get_manifest(active.filepath)["hash"] == manifest["hash"]:
+            raise ValueError(f"This file is already being sent by job {active.id}")
+    
+    resumable = journal.find_resumable_job(manifest["hash"]) if resume else None
+    if resumable:
+        job_id = resumable["id"]
+        # Running in another live process (the CLI, a gunicorn peer): resuming it would mail twice
+        if not journal.claim_job(job_id, total):
+            raise ValueError(f"This file is already being sent by job {job_id} in another process")
+        if send_at is not None:
+            journal.set_send_at(job_id, send_at)
+        else:
+            send_at = resumable.get("send_at")
+        done_rows = journal.completed_rows(job_id)
+        counts = journal.outcome_counts(job_id)
+        log_entry = {
+            "to": "N/A",
+            "subject": "Bulk Send",
+            "status": "Resumed",
+            "message": f"Resuming job {job_id} from checkpoint: {len(done_rows)}/{total} already processed",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        email_logs.append(log_entry)
+    else:
+        job_id = journal.create_job(data_file_path, manifest["hash"], sender_name, total, send_at=send_at)
+        done_rows = set()
+        counts = {}
+        log_preflight_summary(manifest["report"])
+    
+    if send_at and send_at > time.time():
+        log_entry = {
+            "to": "N/A",
+            "subject": "Bulk Send",
+            "status": "Scheduled",
+            "message": f"Job {job_id} scheduled for {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(send_at))}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        email_logs.append(log_entry)
+    
+    config = load_config()
+    sent, failed = counts.get("Sent", 0), counts.get("Failed", 0)
+    if config.get("worker_mode", False):
+        queue = get_work_queue()
+        if queue.has_job(job_id):
+            # Shards left over from the earlier run carry only the unsent rows
+            queue.set_job_status(job_id, "running")
+        else:
+            # Scheduled jobs and rows become claimable at their send time
+            queue.enqueue_job(job_id, data_file_path, sender_name, total,
+                              send_units(data_file_path, done_rows, config),
+                              shard_size=config.get("queue_shard_size", 100), sent=sent, failed=failed,
+                              start_at=send_at or 0, due_at=unit_send_at)
+        job = SendJob(job_id, data_file_path, sender_name, total, iter(()), sent=sent, failed=failed)
+        with work_queue_lock:
+            queued_jobs[job_id] = job
+        sched.track(job)
+    else:
+        job = SendJob(job_id, data_file_path, sender_name, total,
+                      send_units(data_file_path, done_rows, config), sent=sent, failed=failed, send_at=send_at)
+        sched.submit(job)
+    notifier.notify()
+    return job
+
+def get_work_queue():
+    """Get the shared work queue, starting the thread that follows its jobs on first use"""
+    global work_queue
+    with work_queue_lock:
+        if work_queue is None:
+            work_queue = WorkQueue()
+            thread = threading.Thread(target=watch_work_queue, name="work-queue-monitor")
+            thread.daemon = True
+            thread.start()
+        return work_queue
+
+def watch_work_queue():
+    """
+    Relay worker progress to the dashboard: worker logs go into the email log
+    (and so the live stream), counters into the tracked jobs, stop requests
+    out to the workers; a job finishes once no shard is left for it
+    """
+    while True:
+        time.sleep(QUEUE_POLL_INTERVAL)
+        try:
+            for entry in work_queue.drain_events():
+                email_logs.append(entry)
+            with work_queue_lock:
+                jobs = list(queued_jobs.values())
+            for job in jobs:
+                progress = work_queue.job_progress(job.id)
+                if progress is None:
+                    continue
+                if job.should_stop and progress["status"] == "running":
+                    work_queue.set_job_status(job.id, "stopped")
+                if (job.sent, job.failed) != (progress["sent"], progress["failed"]):
+                    job.set_counts(progress["sent"], progress["failed"])
+                    notifier.notify()
+                if progress["claimed_shards"]:
+                    continue
+                if progress["pending_shards"] and not job.should_stop:
+                    continue
+                if not job.should_stop:
+                    work_queue.set_job_status(job.id, "completed")
+                with work_queue_lock:
+                    queued_jobs.pop(job.id, None)
+                get_scheduler().settle(job)
+                notifier.notify()
+        except Exception as e:
+            print(f"Work queue monitor error: {e}")
+
+def send_bulk_emails(data_file_path, sender_name="", resume=True, send_at=None):
+    """
+    Send bulk emails from Excel/CSV file
+    This is the main automation function from original main.py
+    Blocks until the job has finished
+    """
+    try:
+        job = start_send_job(data_file_path, sender_name, resume, send_at)
     except Exception as e:
         log_entry = {
             "to": "N/A",
@@ -205,83 +725,240 @@ def send_bulk_emails(data_file_path, sender_name=""):
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }
         email_logs.append(log_entry)
-        is_sending = False
         return False
+    job.done.wait()
+    return job.status == "completed"
+
+def send_bulk_emails_async(data_file_path, sender_name="", resume=True, send_at=None):
+    """
+    Start sending bulk emails on the shared send workers without blocking Flask
+    (or schedule them for send_at, epoch seconds)
+    Returns the job id
+    """
+    return start_send_job(data_file_path, sender_name, resume, send_at).id
+
+def resume_interrupted_jobs():
+    """
+    Resume every job that was cut off by a crash or restart
+    Jobs stopped by the user are only resumed when they press Start again
+    """
+    journal = get_journal()
+    resumed = []
+    for job_id in journal.mark_interrupted():
+        job = journal.get_job(job_id)
+        if not job or not os.path.exists(job["filepath"]):
+            continue
+        # A different file uploaded under the same name must not be sent in the job's place
+        if upload_cache.hash_for(job["filepath"]) != job["file_hash"]:
+            log_entry = {
+                "to": "N/A",
+                "subject": "Bulk Send",
+                "status": "Warning",
+                "message": f"Not resuming job {job_id}: {os.path.basename(job['filepath'])} has changed since it was sent",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            email_logs.append(log_entry)
+            print(f"Not resuming job {job_id}: {job['filepath']} has changed")
+            continue
+        try:
+            resumed.append(send_bulk_emails_async(job["filepath"], job["sender_name"]))
+        except ValueError:
+            # Another interrupted job for the same file content is already running
+            continue
+    return resumed
+
+def stop_sending(job_id=None):
+    """Stop one send job, or every running job when no id is given"""
+    sched = get_scheduler()
+    if job_id is None:
+        sched.stop_all()
+        stopped = True
+    else:
+        stopped = sched.stop_job(job_id)
+    # Rows waiting for a retry stay unsent, so a resumed job picks them up again
+    get_retry_queue().cancel(job_id)
+    notifier.notify()
+    return stopped
+
+def get_job_status(job_id):
+    """Get the status of one send job, or None if it is unknown"""
+    job = get_scheduler().get_job(job_id)
+    return job.snapshot() if job else None
 
-def send_bulk_emails_async(data_file_path, sender_name=""):
+def list_jobs():
+    """Get the status of every job known to this process"""
+    return [job.snapshot() for job in get_scheduler().list_jobs()]
+
+def local_send_totals():
     """
-    Send bulk emails in background thread to avoid blocking Flask
+    Counters of this process's send jobs: summed over the running jobs, or
+    taken from the most recently finished job when nothing is running
     """
-    thread = threading.Thread(target=send_bulk_emails, args=(data_file_path, sender_name))
-    thread.daemon = True
-    thread.start()
-    return thread
+    jobs = list_jobs()
+    active = [job for job in jobs if job["is_sending"]]
+    visible = active or jobs[-1:]
+    return {
+        "active_jobs": len(active),
+        "should_stop": any(job["should_stop"] for job in active),
+        "job_id": visible[-1]["job_id"] if visible else None,
+        "total": sum(job["total_emails"] for job in visible),
+        "sent": sum(job["sent_count"] for job in visible),
+        "failed": sum(job["failed_count"] for job in visible),
+        "retry_pending": sum(job["retry_pending"] for job in visible)
+    }
 
-def stop_sending():
-    """Stop the email sending process"""
-    global should_stop
-    should_stop = True
+def get_status_publisher():
+    """Get the shared status board publisher, started on first use unless shared_status is off"""
+    global status_publisher
+    with status_publisher_lock:
+        if status_publisher is None:
+            status_publisher = StatusPublisher(local_send_totals)
+            if load_config().get("shared_status", True):
+                status_publisher.start()
+        return status_publisher
 
 def get_sending_status():
-    """Get current sending status"""
+    """
+    Get current sending status
+    Combines this process's jobs with the totals other processes publish on
+    the shared status board; running jobs win over finished ones. Nothing
+    here waits on a lock the send workers hold
+    """
+    local = local_send_totals()
+    others = get_status_publisher().others()
+    sched = get_scheduler()
+    running = [totals for totals in [local] + others if totals["active_jobs"]]
+    if running:
+        shown = running
+    elif local["job_id"] is None and others:
+        shown = [max(others, key=lambda totals: totals["total"])]
+    else:
+        shown = [local]
     return {
-        "is_sending": is_sending,
-        "should_stop": should_stop,
-        "total_emails": total_emails,
-        "sent_count": sent_count,
-        "failed_count": failed_count
+        "is_sending": bool(running),
+        "should_stop": local["should_stop"],
+        "total_emails": sum(totals["total"] for totals in shown),
+        "job_id": local["job_id"],
+        "active_jobs": sum(totals["active_jobs"] for totals in shown),
+        "sent_count": sum(totals["sent"] for totals in shown),
+        "failed_count": sum(totals["failed"] for totals in shown),
+        "retry_pending": sum(totals["retry_pending"] for totals in shown),
+        "processes": 1 + len(others),
+        "quotas": sched.limiter.quota_stats(),
+        "campaign": sched.campaign.stats(),
+        "transport": get_transport_stats(),
+        "attachment_cache": get_attachment_cache_stats()
     }
 
-def get_email_logs():
-    """Get all email logs"""
-    return email_logs
+def get_job_metrics(job_id):
+    """Throughput and per-phase latency summary for one job, or None if unknown"""
+    return metrics.job_summary(job_id)
+
+def get_metrics_text():
+    """All send-path metrics in the Prometheus text format, plus live gauges"""
+    status = get_sending_status()
+    return metrics.render_prometheus({
+        "email_active_jobs": ("Send jobs currently running", status["active_jobs"]),
+        "email_retry_pending": ("Rows waiting for a retry", retry_queue.pending() if retry_queue else 0),
+        "email_logs_total": ("Log entries stored", email_logs.count())
+    })
+
+def get_email_logs(since=None, before=None, status=None, to=None, limit=100):
+    """Get a page of email logs, see LogStore.query for the cursor semantics"""
+    return email_logs.query(since=since, before=before, status=status, to=to, limit=limit)
+
+def get_log_summary(recent=5):
+    """Total log count and the newest few entries, without touching disk"""
+    return {
+        "total_logs": email_logs.count(),
+        "last_id": email_logs.last_id(),
+        "recent_logs": email_logs.recent(recent)
+    }
+
+def export_email_logs(status=None, to=None):
+    """Every email log matching the filters, oldest first, streamed from disk"""
+    return email_logs.iter_all(status=status, to=to)
+
+def iter_upload_rows(file_path, chunksize=SNAPSHOT_BATCH_SIZE):
+    """
+    Every row of the original file (valid or not) as it was read, with its row index
+    Returns (columns, generator of (row_index, row))
+    """
+    from recipient_reader import read_frames
+
+    columns, chunks = read_frames(file_path, chunksize)
+    
+    def rows():
+        row_index = 0
+        for chunk in chunks:
+            chunk = chunk.astype(object).where(chunk.notna(), "")
+            for row in chunk.to_dict('records'):
+                yield row_index, row
+                row_index += 1
+    return columns, rows()
+
+def get_outcome_report(job_id):
+    """
+    Per-row outcome report of a job: every row of its upload file with the
+    outcome journaled for it
+    Returns (fields, generator of records), None if the job is unknown;
+    raises ValueError if the file is gone or no longer the one that was sent
+    """
+    journal = get_journal()
+    job = journal.get_job(job_id)
+    if job is None:
+        return None
+    filepath = job["filepath"]
+    if not os.path.exists(filepath) or get_manifest(filepath)["hash"] != job["file_hash"]:
+        raise ValueError(f"The file sent by job {job_id} is no longer available unchanged")
+    columns, rows = iter_upload_rows(filepath)
+    valid_indexes = (row_index for row_index, _ in iter_cached_recipients(filepath))
+    return report_fields(columns), outcome_report(rows, valid_indexes, journal.iter_outcomes(job_id))
 
 def clear_email_logs():
-    """Clear all email logs"""
-    global email_logs, sent_count, failed_count
-    email_logs = []
-    sent_count = 0
-    failed_count = 0
+    """
+    Clear the email logs and forget finished jobs
+    Logs written by other processes that are still running are kept
+    """
+    email_logs.clear()
+    get_scheduler().forget_finished()
     return True
 
 def get_file_email_count(file_path):
     """Get total number of emails in a file"""
     try:
-        if file_path.endswith('.csv'):
-            data = pd.read_csv(file_path)
-        else:
-            data = pd.read_excel(file_path)
-        return len(data)
+        return get_manifest(file_path)["total_rows"]
     except Exception as e:
         return 0
 
+def get_validation_report(file_path):
+    """Get the preflight report for a file (row counts, dropped rows, sample problems)"""
+    try:
+        return get_manifest(file_path)["report"]
+    except Exception as e:
+        return None
+
 def validate_excel_columns(file_path):
     """
     Validate that the Excel/CSV file has required columns
     Returns (is_valid, missing_columns, preview_data)
+    The file is parsed once and the result cached by content hash
     """
     required_columns = ["To", "Subject", "Body"]
     optional_columns = ["CC", "BCC", "Attachment"]
     
     try:
-        if file_path.endswith('.csv'):
-            data = pd.read_csv(file_path)
-        else:
-            data = pd.read_excel(file_path)
-        
-        columns = data.columns.tolist()
+        manifest = get_manifest(file_path)
+        columns, preview_data = manifest["columns"], manifest["preview"]
         missing = [col for col in required_columns if col not in columns]
         
-        # Get preview (first 5 rows) and replace NaN with empty string
-        preview_data = data.head(5).fillna('').to_dict('records')
-        
         # Clean the preview data to ensure JSON serialization
         preview = []
         for row in preview_data:
             clean_row = {}
             for key, value in row.items():
                 # Convert all values to strings and handle NaN
-                if pd.isna(value) or value == '':
+                if is_missing(value) or value == '':
                     clean_row[key] = ''
                 else:
                     clean_row[key] = str(value)
@@ -294,3 +971,127 @@ def validate_excel_columns(file_path):
             
     except Exception as e:
         return False, [f"Error: {str(e)}"], []
+
+def inspect_upload(filepath, message='File uploaded successfully'):
+    """
+    Validate an uploaded file and build the response payload for the dashboard
+    Returns a dict with 'success' and either the preview/validation or the missing columns
+    """
+    is_valid, missing, preview = validate_excel_columns(filepath)
+    if not is_valid:
+        return {
+            'success': False,
+            'message': f'Missing required columns: {", ".join(missing)}',
+            'missing_columns': missing
+        }
+    return {
+        'success': True,
+        'message': message,
+        'filename': os.path.basename(filepath),
+        'filepath': filepath,
+        'preview': preview,
+        'total_emails': get_file_email_count(filepath),
+        'validation': get_validation_report(filepath)
+    }
+
+def get_parse_pool():
+    """Get the shared upload parsing process pool, created on first use"""
+    global parse_pool
+    with parse_pool_lock:
+        if parse_pool is None:
+            workers = max(1, int(load_config().get("parse_workers", 2)))
+            # Never a plain fork: forking a process that runs SMTP and Flask threads can copy held locks
+            # forkserver (POSIX): workers fork from a clean server that has pandas and the
+            # readers loaded, instead of each importing them again; spawn elsewhere
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(PARSE_PRELOAD)
+            else:
+                context = multiprocessing.get_context("spawn")
+            parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return parse_pool
+
+def parse_upload(filepath, digest):
+    """
+    Get a file's manifest, parsing it in the process pool on a miss
+    Callers that find a parse of the same content already running wait for it
+    instead of starting another
+    """
+    manifest = upload_cache.cached_manifest(digest)
+    if manifest is not None:
+        return manifest
+    with parse_futures_lock:
+        future = parse_futures.get(digest)
+        owner = future is None
+        if owner:
+            future = get_parse_pool().submit(prepare_manifest, filepath, digest)
+            parse_futures[digest] = future
+    try:
+        manifest = future.result()
+        if owner:
+            upload_cache.adopt(filepath, digest, manifest)
+        else:
+            upload_cache.remember_hash(filepath, digest)
+    finally:
+        if owner:
+            with parse_futures_lock:
+                parse_futures.pop(digest, None)
+    return manifest
+
+def process_upload(task, filepath, digest):
+    """Parse and validate a saved upload, recording progress on the task"""
+    try:
+        task.update("parsing")
+        parse_upload(filepath, digest)
+        result = inspect_upload(filepath)
+        if result['success']:
+            task.update(DONE, result=result)
+        else:
+            task.update(FAILED, result=result, error=result['message'])
+    except Exception as e:
+        print(f"Upload processing failed: {str(e)}")
+        task.update(FAILED, error=f'Error uploading file: {str(e)}')
+
+def process_upload_async(filepath, digest):
+    """Start parsing an upload in the background, returns its task"""
+    task = tasks.create("upload")
+    import_executor.submit(process_upload, task, filepath, digest)
+    return task
+
+def get_sheet_fetcher(upload_folder):
+    """Get the shared sheet downloader (keeps its HTTP connections and ETags between imports)"""
+    global sheet_fetcher
+    with import_lock:
+        if sheet_fetcher is None:
+            sheet_fetcher = SheetFetcher(upload_folder)
+        return sheet_fetcher
+
+def import_google_sheet(task, sheet_url, upload_folder):
+    """Download, parse and validate a Google Sheet, recording progress on the task"""
+    try:
+        task.update("downloading")
+        filepath, changed = get_sheet_fetcher(upload_folder).fetch(sheet_url)
+        task.update("parsing")
+        parse_upload(filepath, upload_cache.hash_for(filepath))
+        result = inspect_upload(filepath, 'Google Sheet loaded successfully' if changed
+                                else 'Google Sheet unchanged, using the cached copy')
+        if result['success']:
+            task.update(DONE, result=result)
+        else:
+            task.update(FAILED, result=result, error=result['message'])
+    except Exception as e:
+        print(f"Google Sheet import failed: {str(e)}")
+        task.update(FAILED, error=f'Error loading Google Sheet: {str(e)}')
+
+def import_google_sheet_async(sheet_url, upload_folder):
+    """Start a Google Sheet import in the background, returns its task"""
+    task = tasks.create("google_sheet")
+    import_executor.submit(import_google_sheet, task, sheet_url, upload_folder)
+    return task
+
+def get_import_task(task_id, kind=None):
+    """Get the state of a background upload/import, or None if unknown"""
+    task = tasks.get(task_id)
+    if task is None or (kind and task.kind != kind):
+        return None
+    return task.snapshot()
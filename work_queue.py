@@ -0,0 +1,263 @@
+"""
+Work Queue Module
+SQLite (WAL) queue that hands a send job's rows to separate worker processes
+(`python main.py worker`)
+- A job's rows are split into shards of up to `shard_size` units
+- A worker claims a shard in a BEGIN IMMEDIATE transaction, so each shard
+  belongs to exactly one worker; the claim is a lease that another worker can
+  take over if the owner dies without reporting back
+- Progress is reported in the same transaction that shrinks the shard to its
+  unsent units, so counters are never applied twice
+- Log entries produced by workers are queued here too and drained by the
+  dashboard process, which shows them like its own
+- Scheduled jobs and rows wait as shards that only become claimable at their
+  send time (available_at, indexed), so workers never see them early
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUEUE_DB = "cache/queue.db"
+DEFAULT_SHARD_SIZE = 100
+LEASE_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_jobs (
+    job_id TEXT PRIMARY KEY,
+    filepath TEXT NOT NULL,
+    sender_name TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    units TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempt INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_shards_status ON shards (status, available_at, id);
+CREATE INDEX IF NOT EXISTS idx_shards_job ON shards (job_id, status);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    entry TEXT NOT NULL
+);
+"""
+
+
+def encode_unit(row_index, row):
+    """A send unit as JSON-friendly data: a row, or a multi-recipient batch"""
+    if isinstance(row_index, tuple):
+        return {"batch": row.key, "indexes": list(row_index), "rows": row.rows}
+    return {"index": row_index, "row": row}
+
+
+def decode_unit(unit):
+    """Turn a stored unit back into (row_index, row) as the send path expects"""
+    if "batch" in unit:
+        from recipient_batcher import RecipientBatch
+
+        key = unit["batch"]
+        batch = RecipientBatch(tuple(key) if isinstance(key, list) else key)
+        for row_index, row in zip(unit["indexes"], unit["rows"]):
+            batch.add(row_index, row)
+        return tuple(unit["indexes"]), batch
+    return unit["index"], unit["row"]
+
+
+def unit_indexes(unit):
+    """Row indexes covered by a stored unit"""
+    return unit["indexes"] if "batch" in unit else [unit["index"]]
+
+
+class WorkQueue:
+    """Shared queue of send shards, safe to use from several processes at once"""
+
+    def __init__(self, db_path=QUEUE_DB, lease_seconds=LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, work):
+        """Run work(conn) inside BEGIN IMMEDIATE, which takes the database write lock up front"""
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    # ------------------------------------------------------------ dashboard side
+
+    def has_job(self, job_id):
+        """True if the job was already sharded onto the queue"""
+        return bool(self._execute("SELECT 1 FROM queue_jobs WHERE job_id = ?", (job_id,)))
+
+    def enqueue_job(self, job_id, filepath, sender_name, total, units, shard_size=DEFAULT_SHARD_SIZE,
+                    sent=0, failed=0, start_at=0, due_at=None):
+        """
+        Shard a job's units onto the queue, returns the number of shards
+        Shards become claimable at start_at (epoch seconds), or later for
+        units whose due_at(row_index, row) is later; a shard only holds units
+        due at the same time
+        """
+        def work(conn):
+            now = time.time()
+            conn.execute(
+                "INSERT INTO queue_jobs (job_id, filepath, sender_name, status, total, sent, failed, "
+                "created_at, updated_at) VALUES (?, ?, ?, 'running', ?, ?, ?, ?, ?)",
+                (job_id, filepath, sender_name or "", total, sent, failed, now, now))
+            count = 0
+            shard = []
+            shard_available_at = start_at
+
+            def insert(units, available_at):
+                conn.execute("INSERT INTO shards (job_id, units, available_at) VALUES (?, ?, ?)",
+                             (job_id, json.dumps(units), available_at))
+
+            for row_index, row in units:
+                available_at = max(start_at, (due_at(row_index, row) if due_at is not None else None) or 0)
+                if shard and (len(shard) >= shard_size or available_at != shard_available_at):
+                    insert(shard, shard_available_at)
+                    count += 1
+                    shard = []
+                shard_available_at = available_at
+                shard.append(encode_unit(row_index, row))
+            if shard:
+                insert(shard, shard_available_at)
+                count += 1
+            return count
+        return self._transaction(work)
+
+    def set_job_status(self, job_id, status):
+        """Set a job's queue status (running, stopped); workers only claim running jobs"""
+        self._execute("UPDATE queue_jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                      (status, time.time(), job_id))
+
+    def job_progress(self, job_id):
+        """Counters and shard states of a job, or None if it isn't queued"""
+        rows = self._execute("SELECT status, total, sent, failed FROM queue_jobs WHERE job_id = ?", (job_id,))
+        if not rows:
+            return None
+        status, total, sent, failed = rows[0]
+        shards = dict(self._execute(
+            "SELECT status, COUNT(*) FROM shards WHERE job_id = ? GROUP BY status", (job_id,)))
+        return {
+            "status": status,
+            "total": total,
+            "sent": sent,
+            "failed": failed,
+            "pending_shards": shards.get("pending", 0),
+            "claimed_shards": shards.get("claimed", 0)
+        }
+
+    def drain_events(self, limit=1000):
+        """Take log entries reported by workers, oldest first"""
+        def work(conn):
+            rows = conn.execute("SELECT id, entry FROM events ORDER BY id LIMIT ?", (limit,)).fetchall()
+            if rows:
+                conn.execute("DELETE FROM events WHERE id <= ?", (rows[-1][0],))
+            return [json.loads(entry) for _, entry in rows]
+        return self._transaction(work)
+
+    # --------------------------------------------------------------- worker side
+
+    def claim(self, worker_id):
+        """
+        Claim the next shard of a running job for worker_id
+        Returns (shard_id, job dict, attempt, units) or None when there is nothing to do
+        Shards whose lease expired (the worker died) are claimed again
+        """
+        def work(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT s.id, s.units, s.attempt, j.job_id, j.filepath, j.sender_name, j.total "
+                "FROM shards s JOIN queue_jobs j ON j.job_id = s.job_id "
+                "WHERE j.status = 'running' AND s.available_at <= ? "
+                "AND (s.status = 'pending' OR (s.status = 'claimed' AND s.lease_until < ?)) "
+                "ORDER BY s.available_at, s.id LIMIT 1",
+                (now, now)).fetchone()
+            if row is None:
+                return None
+            shard_id, units, attempt, job_id, filepath, sender_name, total = row
+            conn.execute("UPDATE shards SET status = 'claimed', worker = ?, lease_until = ? WHERE id = ?",
+                         (worker_id, now + self.lease_seconds, shard_id))
+            job = {"job_id": job_id, "filepath": filepath, "sender_name": sender_name, "total": total}
+            return shard_id, job, attempt, json.loads(units)
+        return self._transaction(work)
+
+    def report(self, shard_id, worker_id, job_id, remaining, sent=0, failed=0, release=False):
+        """
+        Record progress on a claimed shard: counters go to the job, the shard
+        shrinks to its `remaining` units (deleted once empty), and the lease is
+        renewed. release=True hands the remaining units back (job stopped)
+        Returns False if the worker lost the shard, in which case nothing is applied
+        """
+        def work(conn):
+            owned = conn.execute("SELECT 1 FROM shards WHERE id = ? AND status = 'claimed' AND worker = ?",
+                                 (shard_id, worker_id)).fetchone()
+            if not owned:
+                return False
+            now = time.time()
+            if remaining:
+                status = "pending" if release else "claimed"
+                conn.execute("UPDATE shards SET units = ?, status = ?, lease_until = ? WHERE id = ?",
+                             (json.dumps(remaining), status, now + self.lease_seconds, shard_id))
+            else:
+                conn.execute("DELETE FROM shards WHERE id = ?", (shard_id,))
+            if sent or failed:
+                conn.execute("UPDATE queue_jobs SET sent = sent + ?, failed = failed + ?, updated_at = ? "
+                             "WHERE job_id = ?", (sent, failed, now, job_id))
+            return True
+        return self._transaction(work)
+
+    def renew(self, shard_id, worker_id):
+        """Extend the lease on a claimed shard, returns False if the worker lost it"""
+        def work(conn):
+            cursor = conn.execute("UPDATE shards SET lease_until = ? WHERE id = ? AND status = 'claimed' AND worker = ?",
+                                  (time.time() + self.lease_seconds, shard_id, worker_id))
+            return cursor.rowcount == 1
+        return self._transaction(work)
+
+    def defer(self, job_id, unit, attempt, delay):
+        """Queue one unit again after a transient failure, available in `delay` seconds"""
+        self._execute("INSERT INTO shards (job_id, units, attempt, available_at) VALUES (?, ?, ?, ?)",
+                      (job_id, json.dumps([unit]), attempt, time.time() + delay))
+
+    def job_status(self, job_id):
+        """Queue status of a job, or None"""
+        rows = self._execute("SELECT status FROM queue_jobs WHERE job_id = ?", (job_id,))
+        return rows[0][0] if rows else None
+
+    def add_events(self, entries):
+        """Queue log entries for the dashboard"""
+        if not entries:
+            return
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO events (entry) VALUES (?)",
+                                   [(json.dumps(entry),) for entry in entries])
+            self._conn.execute("COMMIT")